@@ -10,6 +10,26 @@ class Settings(BaseSettings):
     # Database paths
     database_path: Path = Path.home() / "BirdNET-Pi" / "scripts" / "birds.db"
     duckdb_path: Path = Path.home() / "BirdNET-Pi" / "scripts" / "birds.duckdb"
+    archive_path: Path = Path.home() / "BirdNET-Pi" / "scripts" / "detections_archive"
+
+    # Read-only SQLite connections shared by the request handlers
+    db_readers: int = 4
+
+    # Seconds a cached response of the polled endpoints is kept at most, when
+    # no detection event invalidates it first
+    response_cache_seconds: float = 60.0
+    system_cache_seconds: float = 5.0
+
+    # Seconds between the checks of today's in-memory view against the rollup
+    today_check_seconds: float = 300.0
+
+    # Optional NumPy copy of the detections for /api/detections/aggregate
+    columnar_cache: bool = False
+    columnar_refresh_seconds: float = 5.0
+
+    # DuckDB sync from the SQLite change feed
+    duckdb_sync_seconds: float = 5.0
+    changes_retention_days: int = 7
 
     # Server settings
     api_host: str = "0.0.0.0"
@@ -5,6 +5,11 @@
 #MX:"""
 
 
+import asyncio
+import logging
+import sqlite3
+
+import duckdb
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -14,6 +19,12 @@ import os
 
 
 from api.routers import detections, species, system, classifiers, settings_router, events, audio, spectrogram, location_weather
+from api.config import settings
+from api.services.database import database
+from api.services.duckdb_sync import duckdb_sync
+from api.services.columnar_cache import columnar_cache
+from api.services.response_cache import response_cache
+from api.services.today_view import today_view
 
 
 # App configuration
@@ -30,6 +41,11 @@ app = FastAPI(
 )
 
 
+# ETags and cached bodies for the polled read endpoints. Registered before CORS,
+# so CORS wraps it and adds its headers to cached responses and 304s too.
+app.middleware("http")(response_cache.middleware)
+
+
 # CORS middleware for frontend access
 app.add_middleware(
     CORSMiddleware,
@@ -156,8 +172,37 @@ async def startup_event():
         print(f"[INFO] Serving React PWA from: {FRONTEND_DIST}")
         print(f"[INFO] Static assets mounted at: /assets")
 
+    # Today's detections in memory for the dashboard endpoints
+    try:
+        await today_view.load()
+    except sqlite3.Error as exc:
+        logging.warning("Today's view not loaded: %s", exc)
+    app.state.today_view_task = asyncio.create_task(today_view.run(settings.today_check_seconds))
+
+    # Optional NumPy copy of the detections, loaded in the background
+    if columnar_cache is not None:
+        app.state.columnar_cache_task = asyncio.create_task(columnar_cache.run(settings.columnar_refresh_seconds))
+
+    # Keep birds.duckdb in step with the SQLite detections
+    try:
+        await asyncio.to_thread(duckdb_sync.open)
+    except duckdb.Error as exc:
+        logging.warning("DuckDB sync disabled: %s", exc)
+    else:
+        app.state.duckdb_sync_task = asyncio.create_task(duckdb_sync.run(settings.duckdb_sync_seconds))
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
     print("[INFO] API server shutting down")
+    for name in ("duckdb_sync_task", "today_view_task", "columnar_cache_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    duckdb_sync.close()
+    database.close()
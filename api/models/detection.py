@@ -54,3 +54,57 @@ class SpeciesDetectionHistory(BaseModel):
     com_name: str
     days: int
     data: list[SpeciesDetectionCount]
+
+
+class AggregateResponse(BaseModel):
+    """Response for /api/detections/aggregate.
+
+    counts has one dimension per entry of by, in that order; axes holds the
+    labels along each: species as {species_id, sci_name, com_name}, hours
+    0-23, days as YYYY-MM-DD and the lower bound of each confidence bin.
+    """
+
+    by: list[str]
+    axes: dict[str, list]
+    counts: list
+    total: int
+    rows: int
+    elapsed_ms: float
+
+
+class TimeSeries(BaseModel):
+    """Detection counts of one species, or of all of them, per bucket."""
+
+    name: str
+    counts: list[int]
+
+
+class TimeSeriesResponse(BaseModel):
+    """Response for /api/detections/timeseries.
+
+    buckets labels the counts of every series: YYYY-MM-DDTHH for hours,
+    YYYY-MM-DD for days and for weeks (their Monday), YYYY-MM for months.
+    """
+
+    bucket: str
+    start: str
+    end: str
+    buckets: list[str]
+    series: list[TimeSeries]
+
+
+class DetectionChangesResponse(BaseModel):
+    """Response for /api/detections/changes.
+
+    upserted holds the detections inserted or updated after the cursor as
+    arrays of the values in columns; deleted the ids of the ones deleted.
+    reset means the changes since the cursor are no longer known and the
+    client should load its list again, then continue from cursor.
+    """
+
+    cursor: int
+    reset: bool = False
+    has_more: bool = False
+    columns: list[str]
+    upserted: list[list]
+    deleted: list[int]
@@ -41,3 +41,19 @@ class SpeciesStatsResponse(BaseModel):
     species: list[SpeciesStats]
     total_species: int
     generated_at: str
+
+
+class SpeciesMatch(BaseModel):
+    """A species found by name."""
+
+    sci_name: str
+    com_name: str  # as recorded in the detections
+    name: str  # the name that matched
+    lang: str  # language of name, "sci" for the scientific name
+
+
+class SpeciesSearchResponse(BaseModel):
+    """Response for /api/species/search."""
+
+    query: str
+    matches: list[SpeciesMatch]
@@ -1,24 +1,52 @@
 """Detection-related API endpoints."""
 
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
 from typing import Optional
-import itertools
+import base64
+import calendar
+import sqlite3
+import time
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
-from api.services.database import get_connection, get_duckdb_connection
+from api.services import queries
+from api.services.columnar_cache import DIMENSIONS, columnar_cache
+from api.services.database import database, get_duckdb_connection, is_archived
+from api.services.duckdb_sync import date_filter, duckdb_sync
 from api.models.detection import (
+    AggregateResponse,
     Detection,
+    DetectionChangesResponse,
     TodaySummaryResponse,
     TopSpecies,
     SpeciesDetectionHistory,
     SpeciesDetectionCount,
+    TimeSeries,
+    TimeSeriesResponse,
 )
-from api.services.eventbus import DetectionEvent, event_bus
+from api.services.today_view import today_view
+from api.services.eventbus import DetectionDeletedEvent, DetectionEvent, MediaReadyEvent, event_bus
 
 router = APIRouter()
 
+# Seconds the count of a filtered detection log is reused by its next pages
+TOTAL_CACHE_SECONDS = 30
+
+# (table, where clause, params) -> (monotonic time, count)
+_totals: dict[tuple, tuple[float, int]] = {}
+
+# Fields of the detections in /detections/changes, in the order of CHANGES_SELECT
+CHANGE_COLUMNS = ["id", "date", "time", "sci_name", "com_name", "confidence", "lat", "lon", "cutoff", "week", "sens",
+                  "overlap", "file_name"]
+CHANGES_SELECT = ("SELECT ROWID, Date, Time, Sci_Name, Com_Name, Confidence, Lat, Lon, Cutoff, Week, Sens, Overlap, "
+                  "File_Name FROM detections")
+
+BUCKETS = ("hour", "day", "week", "month")
+
+# Counts per series of /detections/timeseries, e.g. 20000 hours is 2 years and 3 months
+MAX_BUCKETS = 20000
+
 
 class DetectionsResponse(BaseModel):
     """Paginated response for detections list."""
@@ -28,6 +56,7 @@ class DetectionsResponse(BaseModel):
     page: int
     limit: int
     has_more: bool
+    next_cursor: Optional[str] = None
 
 
 class DeleteDetectionRequest(BaseModel):
@@ -46,180 +75,206 @@ async def get_detections(
         None, ge=0.0, le=1.0, description="Minimum confidence threshold"
     ),
     species: Optional[str] = Query(
-        None, description="Filter by species name (common name)"
+        None, description="Filter by species name (common name in any language, or scientific name)"
     ),
     page: int = Query(1, ge=1, description="Page number (1-indexed)"),
     limit: int = Query(50, ge=1, le=500, description="Results per page"),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor of the previous page, replaces page"
+    ),
+    exact_total: bool = Query(
+        False, description="Count the detections now instead of reusing a recent count"
+    ),
 ):
     """Get paginated detection log with optional filtering.
 
     Query SQLite for detection records with support for filtering by date,
     classifier, minimum confidence, and species name.
 
+    Pages are newest first. Following next_cursor takes the same time however
+    deep into the log the page is, unlike page numbers, which skip every row
+    before the page. total is counted once and reused for
+    TOTAL_CACHE_SECONDS, so it can lag a little behind new detections.
+
     Note: Currently uses SQLite until DuckDB migration is complete.
     Classifier filtering is not available in SQLite schema.
     """
-    conn = None
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Build query with filters using SQLite column names (Capital_Snake_Case)
-        conditions = []
-        params = []
-
-        if date_param:
-            conditions.append("Date = ?")
-            # Resolve "today" to current date
-            if date_param.lower() == "today":
-                params.append(date.today().isoformat())
-            else:
-                params.append(date_param)
+    # Resolve "today" to current date
+    day = None
+    if date_param:
+        day = date.today().isoformat() if date_param.lower() == "today" else date_param
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
-        # Note: classifier column doesn't exist in SQLite schema yet
-        # This filter will be ignored for now until DuckDB migration
-
-        if min_confidence is not None:
-            conditions.append("Confidence >= ?")
-            params.append(min_confidence)
-
-        if species:
-            conditions.append("Com_Name LIKE ?")
-            params.append(f"%{species}%")
-
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
+    try:
+        return await database.read(_query_detections, day, min_confidence, species, page, limit, after,
+                                   exact_total)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-        # Get total count
-        count_query = f"SELECT COUNT(*) FROM detections WHERE {where_clause}"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
 
+def encode_cursor(ts: int, detection_id: int) -> str:
+    """The cursor of the page after the detection (ts, id)."""
+    return base64.urlsafe_b64encode(f"{ts}:{detection_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(value: str) -> tuple[int, int]:
+    """(ts, id) of a cursor; raises ValueError if it isn't one."""
+    ts, detection_id = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode().split(":")
+    return int(ts), int(detection_id)
+
+
+def _count(cursor, table, where_clause, params, exact):
+    key = (table, where_clause, tuple(params))
+    cached = _totals.get(key)
+    if not exact and cached and time.monotonic() - cached[0] < TOTAL_CACHE_SECONDS:
+        return cached[1]
+    total = cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {where_clause}", params).fetchone()[0]
+    if len(_totals) > 256:
+        _totals.clear()
+    _totals[key] = (time.monotonic(), total)
+    return total
+
+
+def _query_detections(conn, day, min_confidence, species, page, limit, after, exact_total):
+    if species:
+        try:
+            # the species with a matching name, so the detections are found by index
+            species = queries.species_keys(conn, species)
+        except sqlite3.OperationalError:
+            # not upgraded to schema version 5 yet: match the common names
+            pass
+
+    if day and duckdb_sync.is_open and is_archived(conn, day):
+        # Only in the Parquet archive: read it through DuckDB, whose
+        # identifiers are case-insensitive, so the query stays the same
+        duck = get_duckdb_connection()
+        try:
+            condition, params = date_filter(day, day)
+            return _detections_page(duck, "all_detections", "id", [condition], params,
+                                    min_confidence, species, page, limit, after, exact_total)
+        finally:
+            duck.close()
+
+    conditions, params = [], []
+    if day:
+        conditions.append("Date = ?")
+        params.append(day)
+    return _detections_page(conn, "detections", "ROWID", conditions, params, min_confidence, species, page, limit,
+                            after, exact_total)
+
+
+def _detections_page(cursor, table, id_column, conditions, params, min_confidence, species, page, limit, after,
+                     exact_total):
+    # Build query with filters using SQLite column names (Capital_Snake_Case)
+
+    # Note: classifier column doesn't exist in SQLite schema yet
+    # This filter will be ignored for now until DuckDB migration
+
+    if min_confidence is not None:
+        conditions.append("Confidence >= ?")
+        params.append(min_confidence)
+
+    if isinstance(species, list):
+        conditions.append(f"Sci_Name IN ({', '.join('?' * len(species))})" if species else "0 = 1")
+        params.extend(species)
+    elif species:
+        conditions.append("Com_Name LIKE ?")
+        params.append(f"%{species}%")
+
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+    total = _count(cursor, table, where_clause, params, exact_total)
+
+    offset = 0
+    if after is not None:
+        # (ts, id) < (?, ?) is a range on the ts index, the rowid being part of it
+        where_clause += f" AND (ts, {id_column}) < (?, ?)"
+        params = params + list(after)
+    else:
         # Calculate pagination
         offset = (page - 1) * limit
 
-        # Get paginated results using SQLite column names
-        # SQLite schema: Date, Time, Sci_Name, Com_Name, Confidence, Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name
-        data_query = f"""
-            SELECT ROWID, Date, Time, Sci_Name, Com_Name, Confidence, 
-                   Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name
-            FROM detections
-            WHERE {where_clause}
-            ORDER BY Date DESC, Time DESC
-            LIMIT ? OFFSET ?
-        """
-        params_with_pagination = params + [limit, offset]
-        cursor.execute(data_query, params_with_pagination)
-        rows = cursor.fetchall()
-
-        # Convert to Detection models
-        detections = [
-            Detection(
-                id=row[0],  # ROWID
-                date=row[1],
-                time=row[2],
-                iso8601=None,  # Not in SQLite schema
-                sci_name=row[3],
-                com_name=row[4],
-                confidence=row[5],
-                lat=row[6],
-                lon=row[7],
-                cutoff=row[8],
-                week=row[9],
-                sens=row[10],
-                overlap=row[11],
-                file_name=row[12],
-                classifier="birdnet",  # Default until classifier column exists
-            )
-            for row in rows
-        ]
-
-        return DetectionsResponse(
-            detections=detections,
-            total=total,
-            page=page,
-            limit=limit,
-            has_more=(offset + limit) < total,
+    # Get paginated results using SQLite column names, one extra row tells
+    # whether there is a next page
+    # SQLite schema: Date, Time, Sci_Name, Com_Name, Confidence, Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name
+    data_query = f"""
+        SELECT {id_column}, Date, Time, Sci_Name, Com_Name, Confidence,
+               Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name, ts
+        FROM {table}
+        WHERE {where_clause}
+        ORDER BY ts DESC, {id_column} DESC
+        LIMIT ? OFFSET ?
+    """
+    rows = cursor.execute(data_query, params + [limit + 1, offset]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Convert to Detection models
+    detections = [
+        Detection(
+            id=row[0],  # ROWID
+            date=row[1],
+            time=row[2],
+            iso8601=None,  # Not in SQLite schema
+            sci_name=row[3],
+            com_name=row[4],
+            confidence=row[5],
+            lat=row[6],
+            lon=row[7],
+            cutoff=row[8],
+            week=row[9],
+            sens=row[10],
+            overlap=row[11],
+            file_name=row[12],
+            classifier="birdnet",  # Default until classifier column exists
         )
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+        for row in rows
+    ]
+
+    return DetectionsResponse(
+        detections=detections,
+        total=total,
+        page=page,
+        limit=limit,
+        has_more=has_more,
+        next_cursor=encode_cursor(rows[-1][13], rows[-1][0]) if has_more else None,
+    )
 
 
 @router.get("/detections/today/summary", response_model=TodaySummaryResponse)
 async def get_today_summary():
     """Get summary of today's detections.
 
-    Returns total count, species count, top species, and hourly breakdown.
+    Returns total count, species count, top species, and hourly breakdown,
+    from the in-memory view of today kept up to date by detection events.
     """
-    today = date.today().isoformat()
-
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Total detections today
-        cursor.execute("SELECT COUNT(*) FROM detections WHERE Date = ?", [today])
-        total = cursor.fetchone()[0]
-
-        # Species count today
-        cursor.execute(
-            "SELECT COUNT(DISTINCT Com_Name) FROM detections WHERE Date = ?", [today]
-        )
-        species_count = cursor.fetchone()[0]
-
-        # Top 5 species
-        cursor.execute(
-            """
-            SELECT Com_Name, COUNT(*) as count
-            FROM detections
-            WHERE Date = ?
-            GROUP BY Com_Name
-            ORDER BY count DESC
-            LIMIT 5
-        """,
-            [today],
-        )
-        top_species_rows = cursor.fetchall()
-
-        top_species = [
-            TopSpecies(com_name=row[0], count=row[1]) for row in top_species_rows
-        ]
-
-        # Hourly counts (24-element array)
-        # SQLite uses substr() to extract characters
-        cursor.execute(
-            """
-            SELECT CAST(substr(Time, 1, 2) AS INTEGER) as hour, COUNT(*) as count
-            FROM detections
-            WHERE Date = ?
-            GROUP BY hour
-        """,
-            [today],
-        )
-        hourly_rows = cursor.fetchall()
-
-        hourly_counts = [0] * 24
-        for hour, count in hourly_rows:
-            if hour is not None and 0 <= hour < 24:
-                hourly_counts[hour] = count
-
-        return TodaySummaryResponse(
-            total_detections=total,
-            species_count=species_count,
-            top_species=top_species,
-            hourly_counts=hourly_counts,
-            generated_at=datetime.now().isoformat(),
-        )
-
+        view = await today_view.current()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+
+    # The same common name can come with more than one scientific name
+    counts: dict[str, int] = {}
+    for species in view.species_seen():
+        counts[species.com_name] = counts.get(species.com_name, 0) + species.count
+    top_species = [
+        TopSpecies(com_name=com_name, count=count)
+        for com_name, count in sorted(counts.items(), key=lambda item: -item[1])[:5]
+    ]
+
+    return TodaySummaryResponse(
+        total_detections=view.total,
+        species_count=len(counts),
+        top_species=top_species,
+        hourly_counts=list(view.hourly_counts),
+        generated_at=datetime.now().isoformat(),
+    )
 
 
 class DetectionNotifyRequest(BaseModel):
@@ -230,28 +285,39 @@ class DetectionNotifyRequest(BaseModel):
     confidence: float
     classifier: str = "birdnet"
     file_name: str = ""
+    id: Optional[int] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+    iso8601: Optional[str] = None
 
 
-# Counter for generating detection event IDs within this process
-_notify_id_counter = itertools.count(1)
+class MediaReadyRequest(BaseModel):
+    """Request body for POST /detections/media-ready."""
+
+    com_name: str
+    file_name: str
+    spectrogram: str = ""
+    id: Optional[int] = None
 
 
 @router.post("/detections/notify")
 async def notify_detection(req: DetectionNotifyRequest):
     """Publish a detection event to all SSE subscribers.
 
-    Called by the analysis pipeline after write_to_db() commits.
-    Constructs a DetectionEvent and publishes it through the EventBus.
+    Called by the analysis pipeline as soon as write_to_db() commits, before
+    the audio clip has been extracted. The pipeline passes the row id and the
+    recording timestamp; the current time is used when the timestamp is
+    missing. Without a row id the event has none, it is never made up.
     """
     now = datetime.now()
     event = DetectionEvent(
-        id=next(_notify_id_counter),
+        id=req.id,
         com_name=req.com_name,
         sci_name=req.sci_name,
         confidence=req.confidence,
-        date=now.strftime("%Y-%m-%d"),
-        time=now.strftime("%H:%M:%S"),
-        iso8601=now.isoformat(),
+        date=req.date or now.strftime("%Y-%m-%d"),
+        time=req.time or now.strftime("%H:%M:%S"),
+        iso8601=req.iso8601 or now.isoformat(),
         file_name=req.file_name,
         classifier=req.classifier,
     )
@@ -259,6 +325,235 @@ async def notify_detection(req: DetectionNotifyRequest):
     return {"status": "published", "subscribers_notified": delivered}
 
 
+@router.post("/detections/media-ready")
+async def media_ready(req: MediaReadyRequest):
+    """Tell SSE subscribers that the clip and spectrogram of a detection exist.
+
+    Called by the analysis pipeline after extraction, following the earlier
+    /detections/notify for the same detection.
+    """
+    event = MediaReadyEvent(
+        id=req.id,
+        com_name=req.com_name,
+        file_name=req.file_name,
+        spectrogram=req.spectrogram,
+    )
+    delivered = await event_bus.publish(event)
+    return {"status": "published", "subscribers_notified": delivered}
+
+
+@router.get("/detections/changes", response_model=DetectionChangesResponse)
+async def get_detection_changes(
+    since: Optional[int] = Query(None, ge=0, description="cursor of the previous response"),
+    limit: int = Query(500, ge=1, le=5000, description="Changes read per request"),
+):
+    """Detections inserted, updated or deleted after a cursor, to patch a list loaded before.
+
+    Without since, only the current cursor is returned: take it before
+    loading the full list, then poll with it. A detection changed several
+    times is returned once, as it is now; applying a response twice is
+    harmless. The change feed keeps FIELD_STATION_CHANGES_RETENTION_DAYS of
+    changes, a cursor older than that gets reset.
+    """
+    try:
+        return await database.read(_detection_changes, since, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+def _detection_changes(conn, since, limit):
+    last = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'detections_changes'"
+                        ).fetchone()[0]
+    response = DetectionChangesResponse(cursor=last, columns=CHANGE_COLUMNS, upserted=[], deleted=[])
+    if since is None:
+        return response
+    oldest = conn.execute("SELECT MIN(Seq) FROM detections_changes").fetchone()[0]
+    # a new database, or changes pruned before the client saw them
+    if since > last or (oldest if oldest is not None else last + 1) > since + 1:
+        response.reset = True
+        return response
+
+    changes = conn.execute("SELECT Seq, Detection_Id FROM detections_changes WHERE Seq > ? ORDER BY Seq LIMIT ?",
+                           [since, limit + 1]).fetchall()
+    response.has_more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        response.cursor = since
+        return response
+    ids = sorted({detection_id for _, detection_id in changes})
+    rows = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows += conn.execute(f"{CHANGES_SELECT} WHERE ROWID IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+    response.cursor = changes[-1][0]
+    response.upserted = [list(row) for row in rows]
+    response.deleted = sorted(set(ids) - {row[0] for row in rows})
+    return response
+
+
+def _day_ts(day: str) -> int:
+    # ts holds the local date and time as if it were UTC
+    return calendar.timegm(date.fromisoformat(day).timetuple())
+
+
+@router.get("/detections/aggregate", response_model=AggregateResponse)
+async def get_detections_aggregate(
+    by: list[str] = Query(["species", "hour"], description=f"One or two of {', '.join(DIMENSIONS)}"),
+    start: Optional[str] = Query(None, description="First day (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Last day (YYYY-MM-DD)"),
+    species: Optional[list[str]] = Query(None, description="Scientific or common names, all species if omitted"),
+    bins: int = Query(10, ge=1, le=100, description="Number of confidence bins"),
+):
+    """Count detections by species, hour, day or confidence, or a pair of them.
+
+    For heatmaps and histograms over any date range, e.g. by=species&by=hour.
+    Served from the columnar cache, enabled with FIELD_STATION_COLUMNAR_CACHE;
+    the archived months aren't included.
+    """
+    if columnar_cache is None:
+        raise HTTPException(status_code=503, detail="Columnar cache disabled, set FIELD_STATION_COLUMNAR_CACHE=true "
+                                                    "and install numpy")
+    if not columnar_cache.is_loaded:
+        raise HTTPException(status_code=503, detail="Columnar cache still loading")
+    try:
+        start_ts = _day_ts(start) if start else None
+        end_ts = _day_ts(end) + 86400 if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+
+    t0 = time.perf_counter()
+    try:
+        ids = await database.read(queries.species_ids, species) if species else None
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    try:
+        labels, counts = columnar_cache.aggregate(by, start_ts, end_ts, ids, bins)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    axes = {}
+    for dimension, values in labels.items():
+        if dimension == "species":
+            try:
+                names = await database.read(queries.species_by_id, values.tolist())
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            axes[dimension] = [
+                {"species_id": species_id, "sci_name": names.get(species_id, ("", ""))[0],
+                 "com_name": names.get(species_id, ("", ""))[1]}
+                for species_id in values.tolist()
+            ]
+        elif dimension == "day":
+            axes[dimension] = [datetime.fromtimestamp(day, timezone.utc).date().isoformat() for day in values.tolist()]
+        else:
+            axes[dimension] = values.tolist()
+
+    return AggregateResponse(
+        by=by,
+        axes=axes,
+        counts=counts.tolist(),
+        total=int(counts.sum()),
+        rows=columnar_cache.metrics()["rows"],
+        elapsed_ms=round((time.perf_counter() - t0) * 1000, 3),
+    )
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _bucket_index(day: date, hour: Optional[int], first: date, bucket: str) -> int:
+    """Position of a day, or an hour of it, among the buckets starting at first."""
+    if bucket == "hour":
+        return (day - first).days * 24 + hour
+    if bucket == "month":
+        return (day.year - first.year) * 12 + day.month - first.month
+    return (day - first).days // (7 if bucket == "week" else 1)
+
+
+def _bucket_labels(first: date, bucket: str, count: int) -> list[str]:
+    """Labels of the count buckets starting at first."""
+    labels, day = [], first
+    while True:
+        if bucket == "hour":
+            labels += [f"{day.isoformat()}T{hour:02d}" for hour in range(24)]
+        elif bucket == "month":
+            labels.append(day.strftime("%Y-%m"))
+        else:
+            labels.append(day.isoformat())
+        # the day after the last bucket may be past date.max
+        if len(labels) >= count:
+            return labels
+        if bucket == "month":
+            day = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            day += timedelta(days=7 if bucket == "week" else 1)
+
+
+@router.get("/detections/timeseries", response_model=TimeSeriesResponse)
+async def get_detections_timeseries(
+    bucket: str = Query("day", description=f"One of {', '.join(BUCKETS)}"),
+    start: Optional[str] = Query(None, description="First day (YYYY-MM-DD), 29 days before end by default"),
+    end: Optional[str] = Query(None, description="Last day (YYYY-MM-DD), today by default"),
+    species: Optional[list[str]] = Query(
+        None, description="Common or scientific names, one series each; a single series of all species if omitted"
+    ),
+):
+    """Detection counts per hour, day, week or month, as dense arrays.
+
+    Every series has a count for each label in buckets, zero included, so
+    several species can be overlaid from one request. Counted from the
+    daily_species and hourly_species rollups, which keep the archived months.
+    """
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    try:
+        last_day = date.fromisoformat(end) if end else date.today()
+        # no earlier than date.min
+        first_day = date.fromisoformat(start) if start else max(last_day, date.min + timedelta(days=29)) - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+    if first_day > last_day:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    first = _bucket_start(first_day, bucket)
+    # counted before any label is made, a range of centuries in hours would take seconds
+    count = _bucket_index(_bucket_start(last_day, bucket), 23, first, bucket) + 1
+    if count > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"More than {MAX_BUCKETS} {bucket}s, use a larger bucket")
+    labels = _bucket_labels(first, bucket, count)
+
+    try:
+        rows = await database.read(queries.species_counts, first_day.isoformat(), last_day.isoformat(),
+                                   bucket == "hour", species)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    names = species or ["all"]
+    counts = {name: [0] * len(labels) for name in names}
+    for row in rows:
+        day, hour = date.fromisoformat(row[0]), row[1] if bucket == "hour" else None
+        index = _bucket_index(day, hour, first, bucket)
+        if species is None:
+            counts["all"][index] += row[-1]
+            continue
+        # a name can be the common name of one species and the scientific name of none
+        for name in {row[-3], row[-2]} & counts.keys():
+            counts[name][index] += row[-1]
+
+    return TimeSeriesResponse(
+        bucket=bucket,
+        start=first_day.isoformat(),
+        end=last_day.isoformat(),
+        buckets=labels,
+        series=[TimeSeries(name=name, counts=counts[name]) for name in names],
+    )
+
+
 @router.get("/detections/species/history", response_model=SpeciesDetectionHistory)
 async def get_species_detection_history(
     com_name: str = Query(..., description="Common name of species"),
@@ -267,55 +562,46 @@ async def get_species_detection_history(
     """Get detection history for a species over a date range.
 
     Returns daily detection counts for the specified species within the given
-    number of days, matching the legacy todays_detections.php endpoint.
+    number of days, matching the legacy todays_detections.php endpoint. For
+    charts, /detections/timeseries returns dense arrays in larger buckets
+    and several species at once.
     """
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
+        rows = await database.read(_species_history, com_name, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-        query = """
-            SELECT Date, COUNT(*) AS count
-            FROM detections
-            WHERE Com_Name = ?
-            AND Date BETWEEN DATE('now', '-' || ? || ' days') AND DATE('now')
-            GROUP BY Date
-            ORDER BY Date
-        """
+    data = [SpeciesDetectionCount(date=row[0], count=row[1]) for row in rows]
 
-        cursor.execute(query, [com_name, days])
-        rows = cursor.fetchall()
+    return SpeciesDetectionHistory(com_name=com_name, days=days, data=data)
 
-        data = [SpeciesDetectionCount(date=row[0], count=row[1]) for row in rows]
 
-        return SpeciesDetectionHistory(com_name=com_name, days=days, data=data)
+def _species_history(conn, com_name, days):
+    query = """
+        SELECT r.Date, SUM(r.Count) AS count
+        FROM species s JOIN daily_species r ON r.Species_Id = s.Species_Id
+        WHERE s.Com_Name = ?
+        AND r.Date BETWEEN DATE('now', '-' || ? || ' days') AND DATE('now')
+        GROUP BY r.Date
+        ORDER BY r.Date
+    """
+    return conn.execute(query, [com_name, days]).fetchall()
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 @router.delete("/detections/{detection_id}", response_model=dict)
 async def delete_detection(detection_id: int):
-    """Delete a detection by ID."""
-    conn = None
+    """Delete a detection by ID and send a 'delete' event to SSE subscribers."""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM detections WHERE ROWID = ?", [detection_id])
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail=f"Detection {detection_id} not found")
-        
-        conn.commit()
-        
-        return {"success": True, "message": f"Detection {detection_id} deleted"}
-        
+        deleted = await database.write(_delete_detection, detection_id)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Detection {detection_id} not found")
+
+    await event_bus.publish(DetectionDeletedEvent(id=detection_id))
+    return {"success": True, "message": f"Detection {detection_id} deleted"}
+
+
+def _delete_detection(conn, detection_id):
+    return conn.execute("DELETE FROM detections WHERE ROWID = ?", [detection_id]).rowcount
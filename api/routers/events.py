@@ -17,7 +17,10 @@ HEARTBEAT_INTERVAL_SECONDS = 15.0
 async def event_stream():
     """Server-Sent Events stream for real-time detection events.
 
-    Clients can connect to receive detection events as they happen.
+    Clients can connect to receive detection events as they happen. A
+    'detection' event is sent as soon as a detection is stored, and a 'media'
+    event once its audio clip and spectrogram are ready, and a 'delete' event
+    when a detection is deleted through the API.
     Heartbeat comments are sent every 15 seconds to keep connections alive.
     """
 
@@ -36,7 +39,7 @@ async def event_stream():
                     event = await asyncio.wait_for(queue.get(), timeout=20.0)
                     if event is None:
                         break
-                    yield f"event: detection\ndata: {event.to_sse_data()}\n\n"
+                    yield f"event: {event.event_type}\ndata: {event.to_sse_data()}\n\n"
                 except asyncio.TimeoutError:
                     # Send heartbeat on timeout (every ~15-20 seconds)
                     yield ": heartbeat\n\n"
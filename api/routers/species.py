@@ -1,12 +1,16 @@
 """Species-related API endpoints."""
 
-from datetime import date, datetime
+from datetime import datetime
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
-from api.services.database import get_connection
+from api.services import queries
+from api.services.database import database
 from api.services.flickr_service import FlickrService
+from api.services.today_view import today_view
 from api.models.species import (
+    SpeciesMatch,
+    SpeciesSearchResponse,
     SpeciesSummary,
     SpeciesTodayResponse,
     SpeciesStats,
@@ -43,6 +47,26 @@ async def get_species_image(com_name: str):
     )
 
 
+@router.get("/species/search", response_model=SpeciesSearchResponse)
+async def search_species(
+    q: str = Query(..., min_length=1, description="Part of a common name in any language or of a scientific name"),
+    limit: int = Query(10, ge=1, le=50, description="Number of species"),
+):
+    """Species with a matching name, best matches first, for typeahead."""
+    try:
+        matches = await database.read(queries.search_species, q, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    return SpeciesSearchResponse(
+        query=q,
+        matches=[
+            SpeciesMatch(sci_name=sci_name, com_name=com_name, name=name, lang=lang)
+            for sci_name, com_name, name, lang in matches
+        ],
+    )
+
+
 @router.get("/species/stats", response_model=SpeciesStatsResponse)
 async def get_species_stats():
     """Get full statistics for all species ever detected.
@@ -50,153 +74,70 @@ async def get_species_stats():
     Returns species with best recording information (highest confidence
     detection) and total counts across all time.
     """
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT
-                Com_Name,
-                Sci_Name,
-                COUNT(*) as detection_count,
-                MAX(Confidence) as max_confidence
-            FROM detections
-            GROUP BY Com_Name, Sci_Name
-            ORDER BY detection_count DESC
-        """)
-        species_rows = cursor.fetchall()
-
-        species_list = []
-        for row in species_rows:
-            com_name, sci_name, detection_count, max_confidence = row
-
-            cursor.execute(
-                """
-                SELECT Date, Time, File_Name
-                FROM detections
-                WHERE Com_Name = ? AND Confidence = ?
-                ORDER BY Date DESC, Time DESC
-                LIMIT 1
-            """,
-                [com_name, max_confidence],
-            )
-            best_row = cursor.fetchone()
-
-            if best_row:
-                best_date, best_time, best_file_name = best_row
-            else:
-                best_date, best_time, best_file_name = "", "", ""
-
-            species_list.append(
-                SpeciesStats(
-                    com_name=com_name,
-                    sci_name=sci_name,
-                    detection_count=detection_count,
-                    max_confidence=max_confidence,
-                    best_date=best_date,
-                    best_time=best_time,
-                    best_file_name=best_file_name,
-                )
-            )
-
-        return SpeciesStatsResponse(
-            species=species_list,
-            total_species=len(species_list),
-            generated_at=datetime.now().isoformat(),
-        )
-
+        return await database.read(_species_stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+
+
+def _species_stats(conn):
+    species_list = [
+        SpeciesStats(
+            com_name=com_name,
+            sci_name=sci_name,
+            detection_count=detection_count,
+            max_confidence=max_confidence,
+            best_date=best_date or "",
+            best_time=best_time or "",
+            best_file_name=best_file_name or "",
+        )
+        for com_name, sci_name, detection_count, max_confidence, best_date, best_time, best_file_name
+        in queries.species_stats(conn)
+    ]
+
+    return SpeciesStatsResponse(
+        species=species_list,
+        total_species=len(species_list),
+        generated_at=datetime.now().isoformat(),
+    )
 
 
 @router.get("/species/today", response_model=SpeciesTodayResponse)
 async def get_species_today():
     """Get all species detected today with counts and hourly breakdown."""
-    today = date.today().isoformat()
-
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get all species with aggregations
-        cursor.execute(
-            """
-            SELECT
-                Com_Name,
-                Sci_Name,
-                COUNT(*) as detection_count,
-                MAX(Confidence) as max_confidence,
-                MAX(Time) as last_seen
-            FROM detections
-            WHERE Date = ?
-            GROUP BY Com_Name, Sci_Name
-            ORDER BY detection_count DESC
-        """,
-            [today],
-        )
-        species_rows = cursor.fetchall()
-
-        species_list = []
-
-        # Get current hour for "is_new" calculation
-        current_hour = datetime.now().hour
-
-        for row in species_rows:
-            com_name, sci_name, detection_count, max_confidence, last_seen = row
+        view = await today_view.current()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-            # Get hourly counts for this species
-            cursor.execute(
-                """
-                SELECT CAST(substr(Time, 1, 2) AS INTEGER) as hour, COUNT(*) as count
-                FROM detections
-                WHERE Date = ? AND Com_Name = ?
-                GROUP BY hour
-            """,
-                [today, com_name],
-            )
-            hourly_rows = cursor.fetchall()
-
-            hourly_counts = [0] * 24
-            first_detection_hour = None
-            for hour, count in hourly_rows:
-                if hour is not None and 0 <= hour < 24:
-                    hourly_counts[hour] = count
-                    if first_detection_hour is None or hour < first_detection_hour:
-                        first_detection_hour = hour
-
-            # Determine if species is "new" (first detection within last 2 hours)
-            is_new = False
-            if first_detection_hour is not None:
-                hours_since_first = current_hour - first_detection_hour
-                is_new = 0 <= hours_since_first <= 2
-
-            species_list.append(
-                SpeciesSummary(
-                    com_name=com_name,
-                    sci_name=sci_name,
-                    detection_count=detection_count,
-                    max_confidence=max_confidence,
-                    last_seen=last_seen,
-                    hourly_counts=hourly_counts,
-                    is_new=is_new,
-                )
+    # Get current hour for "is_new" calculation
+    current_hour = datetime.now().hour
+
+    species_list = []
+    for species in view.species_seen():
+        # Determine if species is "new" (first detection within last 2 hours)
+        is_new = False
+        if species.first_hour is not None:
+            hours_since_first = current_hour - species.first_hour
+            is_new = 0 <= hours_since_first <= 2
+
+        species_list.append(
+            SpeciesSummary(
+                com_name=species.com_name,
+                sci_name=species.sci_name,
+                detection_count=species.count,
+                max_confidence=species.max_confidence,
+                last_seen=species.last_time,
+                hourly_counts=list(species.hourly_counts),
+                is_new=is_new,
             )
-
-        return SpeciesTodayResponse(
-            species=species_list,
-            generated_at=datetime.now().isoformat(),
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+    return SpeciesTodayResponse(
+        species=species_list,
+        generated_at=datetime.now().isoformat(),
+    )
+
 
 @router.post("/flickr/blacklist", response_model=BlacklistResponse)
 async def blacklist_flickr_image(req: BlacklistRequest):
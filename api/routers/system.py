@@ -8,7 +8,12 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
 from api.models.system import SystemResponse
+from api.services.columnar_cache import columnar_cache
+from api.services.database import database
+from api.services.duckdb_sync import duckdb_sync
 from api.services.eventbus import event_bus
+from api.services.response_cache import response_cache
+from api.services.today_view import today_view
 from api.services.system_info import (
     get_cpu_percent,
     get_temperature,
@@ -53,6 +58,28 @@ async def get_system():
     )
 
 
+@router.get("/system/metrics")
+async def get_metrics():
+    """Database pool, response cache, today's view, columnar cache and DuckDB sync metrics.
+
+    Acquire wait and query time are in milliseconds since the server started;
+    a growing acquire wait means the reader pool is too small for the load.
+    Cache hits include the 304 responses, which ran no query at all.
+    """
+    return {
+        "database": database.metrics(),
+        "response_cache": response_cache.metrics(),
+        "today_view": today_view.metrics(),
+        "columnar_cache": columnar_cache.metrics() if columnar_cache is not None else {"enabled": False},
+        "duckdb_sync": {
+            "open": duckdb_sync.is_open,
+            "cursor": duckdb_sync.get_cursor() if duckdb_sync.is_open else None,
+            "last_sync": duckdb_sync.last_sync,
+        },
+        "generated_at": datetime.now().isoformat(),
+    }
+
+
 class RestartRequest(BaseModel):
     """Request body for POST /system/restart."""
 
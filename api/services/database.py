@@ -1,11 +1,26 @@
 """Database connection and query utilities."""
 
-import duckdb
+import asyncio
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from typing import Any, Callable
+
+import duckdb
 
 from api.config import settings
 
+# Read connections: never write, map the database file instead of copying
+# pages into the heap, and keep a bigger page cache than the 2 MB default
+READ_PRAGMAS = [
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -16384",
+]
+
 
 def get_duckdb_connection(read_only: bool = True) -> duckdb.DuckDBPyConnection:
     """Get a DuckDB connection to the bird database.
@@ -19,6 +34,11 @@ def get_duckdb_connection(read_only: bool = True) -> duckdb.DuckDBPyConnection:
     Note:
         Caller is responsible for closing the connection.
     """
+    # The sync worker owns the DuckDB file while the API runs: share its database
+    from api.services.duckdb_sync import duckdb_sync
+    if duckdb_sync.is_open:
+        return duckdb_sync.cursor()
+
     db_path = settings.duckdb_path
 
     # Fall back to SQLite path if DuckDB doesn't exist yet
@@ -36,11 +56,160 @@ def get_connection() -> sqlite3.Connection:
 
     Note:
         Caller is responsible for closing the connection.
-        Prefer get_duckdb_connection() for new code.
+        Request handlers should use database.read() and database.write().
     """
     return sqlite3.connect(str(settings.database_path))
 
 
+class Timings:
+    """Count, total and maximum of a series of durations, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class ConnectionPool:
+    """Up to size SQLite connections, each used by one thread at a time.
+
+    Connections are opened on demand and reused; acquire() blocks while all
+    of them are in use.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int):
+        self.size = size
+        self._connect = connect
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self.waits = Timings()
+        self.queries = Timings()
+
+    @contextmanager
+    def acquire(self, timeout: float | None = None):
+        t0 = time.perf_counter()
+        conn = None
+        with self._lock:
+            if self._idle.empty() and self._opened < self.size:
+                self._opened += 1
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        if conn is None:
+            try:
+                conn = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No database connection free after {timeout}s") from None
+        with self._lock:
+            self.waits.add(time.perf_counter() - t0)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def run(self, fn: Callable, *args, commit: bool = False) -> Any:
+        """Call fn(conn, *args) with a pooled connection."""
+        with self.acquire() as conn:
+            t0 = time.perf_counter()
+            try:
+                result = fn(conn, *args)
+                if commit:
+                    conn.commit()
+                return result
+            finally:
+                with self._lock:
+                    self.queries.add(time.perf_counter() - t0)
+
+    def close(self) -> None:
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get_nowait().close()
+                self._opened -= 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._opened - self._idle.qsize(),
+                "acquire_wait": self.waits.as_dict(),
+                "query_time": self.queries.as_dict(),
+            }
+
+
+class Database:
+    """The SQLite database, queried off the event loop.
+
+    Reads go to a pool of read-only connections, writes to a single writer
+    connection, both on a thread executor so a slow query doesn't hold up
+    other requests or the SSE streams.
+    """
+
+    def __init__(self, readers: int = 4):
+        self.readers = ConnectionPool(self._connect_reader, readers)
+        self.writer = ConnectionPool(self._connect_writer, 1)
+        self._executor = ThreadPoolExecutor(max_workers=readers + 1, thread_name_prefix="db")
+
+    @staticmethod
+    def _connect_reader() -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{settings.database_path}?mode=ro", uri=True, timeout=10,
+                               check_same_thread=False)
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @staticmethod
+    def _connect_writer() -> sqlite3.Connection:
+        return sqlite3.connect(str(settings.database_path), timeout=30, check_same_thread=False)
+
+    async def read(self, fn: Callable, *args) -> Any:
+        """Run fn(conn, *args) with a read-only connection and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self.readers.run(fn, *args))
+
+    async def write(self, fn: Callable, *args) -> Any:
+        """Run fn(conn, *args) with the writer connection and commit."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self.writer.run(fn, *args, commit=True))
+
+    def close(self) -> None:
+        self.readers.close()
+        self.writer.close()
+
+    def metrics(self) -> dict:
+        return {"readers": self.readers.metrics(), "writer": self.writer.metrics()}
+
+
+# Global database instance
+database = Database(readers=settings.db_readers)
+
+
+def is_archived(conn: sqlite3.Connection, day: str) -> bool:
+    """Whether the month of day (YYYY-MM-DD) was moved to the Parquet archive."""
+    try:
+        return conn.execute("SELECT 1 FROM archived_months WHERE Month = ?", [day[:7]]).fetchone() is not None
+    except sqlite3.OperationalError:
+        # not upgraded to schema version 4 yet
+        return False
+
+
 @contextmanager
 def duckdb_cursor(read_only: bool = True):
     """Context manager for DuckDB cursor.
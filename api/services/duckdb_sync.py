@@ -0,0 +1,328 @@
+"""Keep birds.duckdb in step with the SQLite detections through the change feed.
+
+SQLite stays the write path. Triggers on its detections table log every insert,
+update and delete to detections_changes with an increasing Seq (schema version 3,
+see scripts/utils/schema.py). The sync worker tails that table and applies each
+batch to DuckDB in one transaction together with its cursor, the last Seq applied.
+
+A batch is applied by replacing the DuckDB rows of the detections it touches with
+their current SQLite version (or nothing, if they are gone), so applying a batch
+twice, or changes that are already superseded, leaves the same result.
+
+all_detections is the synced detections plus the Parquet archive of the closed
+months (scripts/archive_detections.py). Filter it with date_filter() so DuckDB only
+opens the partitions of the months asked for.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+
+from api.config import settings
+from api.services.database import init_duckdb_schema
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# SQLite limits the number of host parameters of a statement
+CHUNK_SIZE = 500
+
+PRUNE_SECONDS = 3600
+
+# the SQLite detections in the column order of the DuckDB detections
+SQLITE_SELECT = """
+    SELECT ROWID, Date, Time, CASE WHEN Date IS NOT NULL AND Time IS NOT NULL THEN Date || 'T' || Time END,
+           Com_Name, Sci_Name, Confidence, File_Name, 'birdnet', Lat, Lon, Cutoff, Week, Sens, Overlap
+    FROM detections
+"""
+
+ARROW_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("date", pa.string()),
+    ("time", pa.string()),
+    ("iso8601", pa.string()),
+    ("com_name", pa.string()),
+    ("sci_name", pa.string()),
+    ("confidence", pa.float64()),
+    ("file_name", pa.string()),
+    ("classifier", pa.string()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("cutoff", pa.float64()),
+    ("week", pa.int64()),
+    ("sens", pa.float64()),
+    ("overlap", pa.float64()),
+])
+
+# Detections read from SQLite per Arrow batch of the full copy
+COPY_BATCH_SIZE = 50000
+
+# ts orders like the ts column of the SQLite detections: the wall-clock time
+# as if it were UTC, in seconds
+TS_COLUMN = "CAST(epoch(TRY_CAST(date || ' ' || time AS TIMESTAMP)) AS BIGINT) AS ts"
+
+HOT_SELECT = """
+    SELECT id, date, time, sci_name, com_name, confidence, lat, lon, cutoff, week, sens, overlap, file_name,
+           CAST(substr(date, 1, 4) AS INTEGER) AS year, CAST(substr(date, 6, 2) AS INTEGER) AS month, {ts}
+    FROM detections
+""".format(ts=TS_COLUMN)
+
+ARCHIVE_SELECT = """
+    SELECT Id AS id, Date AS date, Time AS time, Sci_Name AS sci_name, Com_Name AS com_name,
+           Confidence AS confidence, Lat AS lat, Lon AS lon, Cutoff AS cutoff, Week AS week,
+           Sens AS sens, Overlap AS overlap, File_Name AS file_name, year, month, {ts}
+    FROM read_parquet('{pattern}', hive_partitioning = true, hive_types = {{'year': INTEGER, 'month': INTEGER}})
+"""
+
+CREATE_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    seq BIGINT NOT NULL
+)
+"""
+
+
+def date_filter(start: str, end: str) -> tuple[str, list]:
+    """A condition on all_detections for the dates start to end (YYYY-MM-DD) and its parameters.
+
+    The year and month terms are what let DuckDB skip the archived partitions
+    outside the range, a condition on date alone opens all of them.
+    """
+    condition = "year BETWEEN ? AND ? AND date BETWEEN ? AND ?"
+    params = [int(start[:4]), int(end[:4]), start, end]
+    if start[:7] == end[:7]:
+        condition += " AND month = ?"
+        params.append(int(start[5:7]))
+    return condition, params
+
+
+class DuckDBSync:
+    """Applies the SQLite change feed to a DuckDB database.
+
+    The worker holds the only read-write connection to the DuckDB file; readers
+    in the same process get their own connection to it from cursor().
+    """
+
+    def __init__(
+        self,
+        sqlite_path: Path | str | None = None,
+        duckdb_path: Path | str | None = None,
+        archive_path: Path | str | None = None,
+        batch_size: int = BATCH_SIZE,
+    ):
+        self.sqlite_path = sqlite_path
+        self.duckdb_path = duckdb_path
+        self.archive_path = archive_path
+        self.batch_size = batch_size
+        self.last_sync = None
+        self._db: duckdb.DuckDBPyConnection | None = None
+        self._conn: duckdb.DuckDBPyConnection | None = None
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._archived = None
+
+    def open(self) -> None:
+        """Open the DuckDB database, creating its tables if needed."""
+        self.sqlite_path = Path(self.sqlite_path or settings.database_path)
+        self.duckdb_path = Path(self.duckdb_path or settings.duckdb_path)
+        self.archive_path = Path(self.archive_path or settings.archive_path)
+        self._db = duckdb.connect(str(self.duckdb_path))
+        # the worker writes through its own connection, _db only hands out new ones
+        self._conn = self._db.cursor()
+        init_duckdb_schema(self._conn)
+        self._conn.execute(CREATE_STATE_SQL)
+        self.update_view()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._conn.close()
+            self._db.close()
+            self._db = self._conn = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._db is not None
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """A new connection to the synced database, for use by one thread."""
+        with self._lock:
+            return self._db.cursor()
+
+    def update_view(self) -> None:
+        """(Re)create all_detections once the archive appears.
+
+        The Parquet files are globbed on every query, but read_parquet fails on
+        a glob without matches, so the view only includes the archive once there
+        is one.
+        """
+        pattern = self.archive_path / "*" / "*" / "*.parquet"
+        archived = any(self.archive_path.glob("*/*/*.parquet"))
+        if archived == self._archived:
+            return
+        sql = HOT_SELECT
+        if archived:
+            sql += " UNION ALL " + ARCHIVE_SELECT.format(pattern=str(pattern).replace("'", "''"), ts=TS_COLUMN)
+        self._conn.execute(f"CREATE OR REPLACE VIEW all_detections AS {sql}")
+        self._archived = archived
+
+    def get_cursor(self) -> int | None:
+        """The last Seq applied, None before the first full copy."""
+        row = self._conn.execute("SELECT seq FROM sync_state WHERE name = 'detections'").fetchone()
+        return row[0] if row else None
+
+    def _sqlite(self) -> sqlite3.Connection:
+        con = sqlite3.connect(f"file:{self.sqlite_path}?mode=ro", uri=True, isolation_level=None)
+        # one snapshot for the changes and the rows they point at
+        con.execute("BEGIN")
+        return con
+
+    def _set_cursor(self, seq: int) -> None:
+        self._conn.execute(
+            "INSERT INTO sync_state VALUES ('detections', ?) ON CONFLICT (name) DO UPDATE SET seq = excluded.seq",
+            [seq],
+        )
+
+    def _copy_all(self, con: sqlite3.Connection) -> int:
+        """Replace the DuckDB detections with a full copy; returns the number of rows."""
+        last_seq = con.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'detections_changes'"
+                               ).fetchone()[0]
+        cursor = con.execute(SQLITE_SELECT)
+        total = 0
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute("DELETE FROM detections")
+            while rows := cursor.fetchmany(COPY_BATCH_SIZE):
+                self._append(rows)
+                total += len(rows)
+            self._set_cursor(last_seq)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        log.info("Copied %d detections to %s", total, self.duckdb_path)
+        return total
+
+    def _append(self, rows: list[tuple], replace: bool = False) -> None:
+        """Insert rows of SQLITE_SELECT with one statement, through an Arrow table."""
+        columns = [pa.array(column, type=field.type) for column, field in zip(zip(*rows), ARROW_SCHEMA)]
+        self._conn.register("sync_batch", pa.Table.from_arrays(columns, schema=ARROW_SCHEMA))
+        try:
+            self._conn.execute(f"INSERT {'OR REPLACE ' if replace else ''}INTO detections "
+                               f"({', '.join(ARROW_SCHEMA.names)}) SELECT * FROM sync_batch")
+        finally:
+            self._conn.unregister("sync_batch")
+
+    def _needs_copy(self, con: sqlite3.Connection, cursor: int) -> bool:
+        """Whether the feed can't bring DuckDB up to date from cursor."""
+        last = con.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence "
+                           "WHERE name = 'detections_changes'").fetchone()[0]
+        if last < cursor:
+            # a new database, e.g. after clear_all_data.sh
+            return True
+        oldest = con.execute("SELECT MIN(Seq) FROM detections_changes").fetchone()[0]
+        # changes after cursor were pruned before they were applied
+        return (oldest if oldest is not None else last + 1) > cursor + 1
+
+    def sync_once(self) -> int:
+        """Apply the next batch of changes; returns how many were applied.
+
+        The first run, or a run that finds the feed can't continue from its
+        cursor, copies all the detections instead.
+        """
+        con = self._sqlite()
+        try:
+            # fails until the database is upgraded to schema version 3
+            con.execute("SELECT 1 FROM detections_changes LIMIT 1")
+            cursor = self.get_cursor()
+            if cursor is None or self._needs_copy(con, cursor):
+                self._copy_all(con)
+                self.last_sync = time.time()
+                return 0
+
+            changes = con.execute(
+                "SELECT Seq, Detection_Id FROM detections_changes WHERE Seq > ? ORDER BY Seq LIMIT ?",
+                [cursor, self.batch_size],
+            ).fetchall()
+            if not changes:
+                self.last_sync = time.time()
+                return 0
+
+            ids = sorted({detection_id for _, detection_id in changes})
+            rows = []
+            for i in range(0, len(ids), CHUNK_SIZE):
+                chunk = ids[i:i + CHUNK_SIZE]
+                rows += con.execute(f"{SQLITE_SELECT} WHERE ROWID IN ({', '.join('?' * len(chunk))})",
+                                    chunk).fetchall()
+        finally:
+            con.close()
+
+        self._conn.execute("BEGIN")
+        try:
+            # the rows still there are replaced, the others deleted
+            gone = sorted(set(ids) - {row[0] for row in rows})
+            if gone:
+                self._conn.execute("DELETE FROM detections WHERE id IN (SELECT unnest(?))", [gone])
+            if rows:
+                self._append(rows, replace=True)
+            self._set_cursor(changes[-1][0])
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self.last_sync = time.time()
+        return len(changes)
+
+    def prune(self, retention_days: int) -> int:
+        """Delete the applied changes older than retention_days from the feed."""
+        cursor = self.get_cursor()
+        if cursor is None:
+            return 0
+        con = sqlite3.connect(str(self.sqlite_path), timeout=30)
+        try:
+            with con:
+                pruned = con.execute(
+                    "DELETE FROM detections_changes WHERE Seq <= ? "
+                    "AND Changed_At < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+                    [cursor, retention_days * 86400],
+                ).rowcount
+        finally:
+            con.close()
+        return pruned
+
+    def catch_up(self) -> int:
+        """Apply batches until the feed is drained; returns the changes applied."""
+        total = 0
+        while applied := self.sync_once():
+            total += applied
+        self.update_view()
+        if time.monotonic() - self._last_prune > PRUNE_SECONDS:
+            self._last_prune = time.monotonic()
+            pruned = self.prune(settings.changes_retention_days)
+            if pruned:
+                log.info("Pruned %d changes from the change feed", pruned)
+        return total
+
+    async def run(self, interval: float) -> None:
+        """Catch up every interval seconds until cancelled."""
+        last_error = None
+        while True:
+            try:
+                await asyncio.to_thread(self.catch_up)
+                last_error = None
+            except (sqlite3.Error, duckdb.Error) as exc:
+                # only log when the error changes, it's retried every interval
+                if str(exc) != last_error:
+                    log.warning("DuckDB sync failed: %s", exc)
+                    last_error = str(exc)
+            await asyncio.sleep(interval)
+
+
+# Global sync worker, opened by the application on startup
+duckdb_sync = DuckDBSync()
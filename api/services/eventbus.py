@@ -3,14 +3,17 @@
 import asyncio
 import json
 from dataclasses import dataclass, asdict
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable, ClassVar, Optional
 
 
 @dataclass
 class DetectionEvent:
     """Event fired when a new detection is made."""
 
-    id: int
+    event_type: ClassVar[str] = "detection"
+
+    # ROWID of the detection, None when the sender didn't give it
+    id: Optional[int]
     com_name: str
     sci_name: str
     confidence: float
@@ -25,15 +28,58 @@ class DetectionEvent:
         return json.dumps(asdict(self))
 
 
+@dataclass
+class MediaReadyEvent:
+    """Event fired once the audio clip and spectrogram of a detection have been written."""
+
+    event_type: ClassVar[str] = "media"
+
+    id: Optional[int]
+    com_name: str
+    file_name: str
+    spectrogram: str
+
+    def to_sse_data(self) -> str:
+        """Convert to SSE data format (JSON-encoded)."""
+        return json.dumps(asdict(self))
+
+
+@dataclass
+class DetectionDeletedEvent:
+    """Event fired when a detection is deleted through the API."""
+
+    event_type: ClassVar[str] = "delete"
+
+    id: int
+
+    def to_sse_data(self) -> str:
+        """Convert to SSE data format (JSON-encoded)."""
+        return json.dumps(asdict(self))
+
+
+Event = DetectionEvent | MediaReadyEvent | DetectionDeletedEvent
+
+
 class EventBus:
     """Async pub/sub event bus for detection events.
 
     Allows multiple SSE subscribers to receive real-time detection events.
     Uses asyncio.Queue for each subscriber to handle backpressure.
+    Listeners are called with every event as it is published, e.g. to
+    invalidate caches.
     """
 
     def __init__(self):
         self._subscribers: list[asyncio.Queue] = []
+        self._listeners: list[Callable[[Event], None]] = []
+
+    def add_listener(self, listener: Callable[[Event], None]) -> None:
+        """Call listener(event) for every event published.
+
+        Args:
+            listener: Synchronous callable, run on the event loop.
+        """
+        self._listeners.append(listener)
 
     def subscribe(self) -> asyncio.Queue:
         """Subscribe to detection events.
@@ -56,8 +102,8 @@ class EventBus:
         except ValueError:
             pass
 
-    async def publish(self, event: DetectionEvent) -> int:
-        """Publish a detection event to all subscribers.
+    async def publish(self, event: Event) -> int:
+        """Publish an event to all subscribers.
 
         Args:
             event: The detection event to publish.
@@ -65,6 +111,8 @@ class EventBus:
         Returns:
             Number of subscribers that received the event.
         """
+        for listener in self._listeners:
+            listener(event)
         delivered = 0
         for queue in list(self._subscribers):  # snapshot copy
             try:
@@ -90,7 +138,7 @@ class EventBus:
                 if event is None:
                     # Shutdown signal
                     break
-                yield f"data: {event.to_sse_data()}\n\n"
+                yield f"event: {event.event_type}\ndata: {event.to_sse_data()}\n\n"
         finally:
             self.unsubscribe(queue)
 
@@ -0,0 +1,173 @@
+"""Set-based queries behind the species endpoints.
+
+Each endpoint is served by one statement, however many species there are,
+instead of an aggregate followed by a query per species.
+"""
+
+import sqlite3
+from typing import Optional
+
+# Totals from the rollup, then the best recording of each species: the
+# detections at the species' highest confidence are found through the
+# detections_Species_Id_Confidence index and ROW_NUMBER() keeps the latest of them
+SPECIES_STATS_SQL = """
+WITH totals AS (
+    SELECT Species_Id, SUM(Count) AS detection_count, MAX(Max_Confidence) AS max_confidence
+    FROM daily_species
+    GROUP BY Species_Id
+),
+best AS (
+    SELECT d.Species_Id, d.Date, d.Time, d.File_Name,
+           ROW_NUMBER() OVER (PARTITION BY d.Species_Id ORDER BY d.ts DESC) AS rn
+    FROM totals t
+    JOIN detections d ON d.Species_Id = t.Species_Id AND d.Confidence = t.max_confidence
+)
+SELECT s.Com_Name, s.Sci_Name, t.detection_count, t.max_confidence, b.Date, b.Time, b.File_Name
+FROM totals t
+JOIN species s ON s.Species_Id = t.Species_Id
+LEFT JOIN best b ON b.Species_Id = t.Species_Id AND b.rn = 1
+ORDER BY t.detection_count DESC
+"""
+
+# One row per species with its 24 hourly counts as columns h0 to h23
+HOURLY_COLUMNS = ", ".join(f"SUM(CASE WHEN Hour = {hour} THEN Count ELSE 0 END) AS h{hour}" for hour in range(24))
+
+SPECIES_TODAY_SQL = f"""
+SELECT s.Com_Name, s.Sci_Name, d.Count AS detection_count, d.Max_Confidence AS max_confidence,
+       d.Last_Time AS last_seen, h.*
+FROM daily_species d
+JOIN species s ON s.Species_Id = d.Species_Id
+LEFT JOIN (
+    SELECT Species_Id AS h_species_id, {HOURLY_COLUMNS}
+    FROM hourly_species
+    WHERE Date = :day
+    GROUP BY Species_Id
+) h ON h.h_species_id = d.Species_Id
+WHERE d.Date = :day
+ORDER BY detection_count DESC
+"""
+
+
+def species_stats(conn: sqlite3.Connection) -> list[tuple]:
+    """(Com_Name, Sci_Name, count, max confidence, best Date, Time, File_Name) of every species.
+
+    The best recording is None when the species' best detection was archived.
+    """
+    return conn.execute(SPECIES_STATS_SQL).fetchall()
+
+
+def species_today(conn: sqlite3.Connection, day: str) -> list[tuple]:
+    """(Com_Name, Sci_Name, count, max confidence, last time, hourly counts) of the species seen on day."""
+    return [
+        (*row[:5], [count or 0 for count in row[6:]])
+        for row in conn.execute(SPECIES_TODAY_SQL, {"day": day})
+    ]
+
+
+# Names containing the text: the trigram index of species_search serves LIKE
+# patterns with 3 or more characters in a row, shorter ones scan the names
+SPECIES_SEARCH_SQL = """
+SELECT s.Species_Id, s.Sci_Name, s.Com_Name, n.Name, n.Lang
+FROM species_search f
+JOIN species_names n ON n.rowid = f.rowid
+JOIN species s ON s.Species_Id = n.Species_Id
+WHERE f.Name LIKE :contains
+ORDER BY n.Name LIKE :prefix DESC, n.Name LIKE :word DESC, length(n.Name), n.Name
+"""
+
+# Names starting with the text, a range of the species_names_Name index
+SPECIES_PREFIX_SQL = """
+SELECT s.Species_Id, s.Sci_Name, s.Com_Name, n.Name, n.Lang
+FROM species_names n
+JOIN species s ON s.Species_Id = n.Species_Id
+WHERE n.Name LIKE :prefix
+ORDER BY length(n.Name), n.Name
+"""
+
+
+def _search_params(text: str) -> dict:
+    # LIKE wildcards in the text would match anything
+    text = text.replace("%", "").replace("_", "").strip()
+    return {"contains": f"%{text}%", "prefix": f"{text}%", "word": f"% {text}%"}
+
+
+def search_species(conn: sqlite3.Connection, text: str, limit: int) -> list[tuple]:
+    """(Sci_Name, Com_Name, matching name, its language) of the species with a name containing text.
+
+    Names in any language of the label files and the scientific names are
+    searched, case-insensitively. Species whose name starts with text come
+    first, then those with a word starting with it, closer matches first.
+    Text shorter than 3 characters only matches the start of the names.
+    """
+    params = _search_params(text)
+    if params["contains"] == "%%":
+        return []
+    sql = SPECIES_SEARCH_SQL if len(params["contains"]) > 4 else SPECIES_PREFIX_SQL
+    matches, seen = [], set()
+    for species_id, sci_name, com_name, name, lang in conn.execute(sql, params):
+        if species_id in seen:
+            continue
+        seen.add(species_id)
+        matches.append((sci_name, com_name, name, lang))
+        if len(matches) == limit:
+            break
+    return matches
+
+
+def species_keys(conn: sqlite3.Connection, text: str) -> list[str]:
+    """Sci_Name of every species with a name containing text; raises OperationalError before schema version 5."""
+    return [row[0] for row in conn.execute(
+        """
+        SELECT DISTINCT s.Sci_Name
+        FROM species_search f
+        JOIN species_names n ON n.rowid = f.rowid
+        JOIN species s ON s.Species_Id = n.Species_Id
+        WHERE f.Name LIKE ?
+        """,
+        [_search_params(text)["contains"]],
+    )]
+
+
+def species_ids(conn: sqlite3.Connection, names: list[str]) -> list[int]:
+    """Species_Id of the species with one of names as scientific or common name."""
+    marks = ", ".join("?" * len(names))
+    return [row[0] for row in conn.execute(
+        f"SELECT Species_Id FROM species WHERE Sci_Name IN ({marks}) OR Com_Name IN ({marks})", [*names, *names]
+    )]
+
+
+def species_by_id(conn: sqlite3.Connection, ids: list[int]) -> dict[int, tuple[str, str]]:
+    """{Species_Id: (Sci_Name, Com_Name)} of the species ids."""
+    names = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        names.update((species_id, (sci_name, com_name)) for species_id, sci_name, com_name in conn.execute(
+            f"SELECT Species_Id, Sci_Name, Com_Name FROM species WHERE Species_Id IN ({', '.join('?' * len(chunk))})",
+            chunk,
+        ))
+    return names
+
+
+def species_counts(conn: sqlite3.Connection, start: str, end: str, hourly: bool,
+                   names: Optional[list[str]] = None) -> list[tuple]:
+    """Detections per day, or per day and hour, between start and end from the rollups.
+
+    (Date[, Hour], count) over all species, or (Date[, Hour], Com_Name,
+    Sci_Name, count) of the species with one of names as common or
+    scientific name.
+    """
+    table, keys = ("hourly_species", ["Date", "Hour"]) if hourly else ("daily_species", ["Date"])
+    if names is None:
+        return conn.execute(
+            f"SELECT {', '.join(keys)}, SUM(Count) FROM {table} WHERE Date BETWEEN ? AND ? GROUP BY {', '.join(keys)}",
+            [start, end],
+        ).fetchall()
+    marks = ", ".join("?" * len(names))
+    return conn.execute(
+        f"""
+        SELECT {', '.join(f'r.{key}' for key in keys)}, s.Com_Name, s.Sci_Name, r.Count
+        FROM species s JOIN {table} r ON r.Species_Id = s.Species_Id
+        WHERE (s.Com_Name IN ({marks}) OR s.Sci_Name IN ({marks})) AND r.Date BETWEEN ? AND ?
+        """,
+        [*names, *names, start, end],
+    ).fetchall()
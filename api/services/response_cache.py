@@ -0,0 +1,139 @@
+"""Response cache with strong ETags for the polled read endpoints.
+
+Dashboards poll the same few routes over and over. The body of each GET is
+kept, keyed by path, query string and day, until a detection is published or
+deleted on the event bus, or its max age runs out. The max age covers writes
+that don't go through the API, like deletions in the PHP pages. A request
+whose If-None-Match matches the cached ETag gets 304 Not Modified without
+running its handler. Concurrent misses of the same request share one run of
+the handler, and the misses of each route run a few at a time.
+"""
+
+import hashlib
+import time
+from datetime import date
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from api.config import settings
+from api.services.eventbus import event_bus
+from api.services.single_flight import SingleFlight
+
+# events that change what the cached routes return
+INVALIDATING_EVENTS = ("detection", "delete")
+
+
+class ResponseCache:
+    """Cached GET responses of routes, each with its max age in seconds.
+
+    limits is the number of misses of a route rendered at a time, 1 by default.
+    """
+
+    def __init__(self, routes: dict[str, float], limits: Optional[dict[str, int]] = None):
+        self.routes = routes
+        self.single_flight = SingleFlight({path: (limits or {}).get(path, 1) for path in routes})
+        # (path, query, day) -> (monotonic time, ETag, body, media type)
+        self._entries: dict[tuple, tuple[float, str, bytes, Optional[str]]] = {}
+        # bumped by every invalidation, a response computed across one isn't kept
+        self._generation = 0
+        self._invalidations = 0
+        self._counts = {path: {"hits": 0, "misses": 0, "not_modified": 0} for path in routes}
+
+    def invalidate(self) -> None:
+        """Forget every cached response."""
+        self._generation += 1
+        self._invalidations += 1
+        self._entries.clear()
+
+    def on_event(self, event) -> None:
+        """Event bus listener: a detection was published or deleted."""
+        if event.event_type in INVALIDATING_EVENTS:
+            self.invalidate()
+
+    def _lookup(self, key: tuple, max_age: float):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > max_age:
+            del self._entries[key]
+            return None
+        return entry
+
+    async def middleware(self, request: Request, call_next):
+        """HTTP middleware serving the cached routes from the cache."""
+        path = request.url.path
+        if request.method != "GET" or path not in self.routes:
+            return await call_next(request)
+
+        counts = self._counts[path]
+        key = (path, str(request.query_params), date.today().isoformat())
+        if_none_match = request.headers.get("if-none-match")
+        entry = self._lookup(key, self.routes[path])
+        if entry is not None:
+            counts["hits"] += 1
+            _, etag, body, media_type = entry
+            if if_none_match == etag:
+                counts["not_modified"] += 1
+                return _not_modified(etag)
+            return _response(body, etag, media_type)
+
+        counts["misses"] += 1
+        # concurrent misses of the same key share one run of the handler
+        status, etag, body, media_type = await self.single_flight.do(
+            path, key, lambda: self._render(key, request, call_next))
+        if etag is None:
+            return Response(body, status_code=status, media_type=media_type)
+        # the data changed, the body didn't
+        if if_none_match == etag:
+            counts["not_modified"] += 1
+            return _not_modified(etag)
+        return _response(body, etag, media_type)
+
+    async def _render(self, key: tuple, request: Request, call_next) -> tuple:
+        generation = self._generation
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        media_type = response.headers.get("content-type")
+        if response.status_code != 200:
+            return response.status_code, None, body, media_type
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic(), etag, body, media_type)
+        return 200, etag, body, media_type
+
+    def metrics(self) -> dict:
+        """Hits, misses, 304s and coalesced misses per route since the server started."""
+        hits = sum(counts["hits"] for counts in self._counts.values())
+        misses = sum(counts["misses"] for counts in self._counts.values())
+        flights = self.single_flight.metrics()
+        return {
+            "entries": len(self._entries),
+            "invalidations": self._invalidations,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            "coalesced": sum(flight["coalesced"] for flight in flights.values()),
+            "routes": {path: {**counts, **flights[path]} for path, counts in self._counts.items()},
+        }
+
+
+def _response(body: bytes, etag: str, media_type: Optional[str]) -> Response:
+    # no-cache: browsers keep the body but ask again with If-None-Match every time
+    return Response(body, media_type=media_type, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+response_cache = ResponseCache({
+    "/api/detections/today/summary": settings.response_cache_seconds,
+    "/api/species/today": settings.response_cache_seconds,
+    "/api/species/stats": settings.response_cache_seconds,
+    # CPU and temperature change without any detection
+    "/api/system": settings.system_cache_seconds,
+}, limits={
+    "/api/detections/today/summary": 2,
+    "/api/species/today": 2,
+})
+event_bus.add_listener(response_cache.on_event)
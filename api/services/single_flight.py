@@ -0,0 +1,69 @@
+"""Single-flight execution with a concurrency limit per route.
+
+When several dashboards open at once they send the same requests at the same
+time. Calls with the same key that overlap share the run of the first one
+instead of each running the same aggregation, and each route runs at most
+its limit of calls at a time; the others wait their turn, leaving the CPU to
+the analysis.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key, limit the calls running per route."""
+
+    def __init__(self, limits: dict[str, int]):
+        self._semaphores = {route: asyncio.Semaphore(limit) for route, limit in limits.items()}
+        self._limits = dict(limits)
+        # key -> future of the call in flight
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self._counts = {route: {"runs": 0, "coalesced": 0, "running": 0, "waiting": 0} for route in limits}
+
+    async def do(self, route: str, key: tuple, fn: Callable[[], Awaitable[T]]) -> T:
+        """Result of fn(), or of the call with the same key already in flight.
+
+        If the call in flight fails, the calls that joined it run fn()
+        themselves, so one cancelled or failed request doesn't fail the others.
+        """
+        counts = self._counts[route]
+        flight = self._in_flight.get(key)
+        if flight is not None:
+            counts["coalesced"] += 1
+            try:
+                return await asyncio.shield(flight)
+            except Exception:
+                pass
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            counts["waiting"] += 1
+            try:
+                await self._semaphores[route].acquire()
+            finally:
+                counts["waiting"] -= 1
+            counts["running"] += 1
+            counts["runs"] += 1
+            try:
+                result = await fn()
+            finally:
+                counts["running"] -= 1
+                self._semaphores[route].release()
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc if isinstance(exc, Exception) else RuntimeError("call in flight cancelled"))
+            # marks the exception as retrieved when no call joined this one
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def metrics(self) -> dict:
+        """Limit, runs, coalesced calls and the calls running and waiting now, per route."""
+        return {route: {"limit": self._limits[route], **counts} for route, counts in self._counts.items()}
@@ -0,0 +1,243 @@
+"""Today's detections, kept in memory for the "today" endpoints.
+
+The detections of the day are loaded once into columns (row id, second of
+the day, confidence, species), with counters per species and per hour kept
+next to them. Detection and delete events from the event bus update them, so
+the endpoints answer without a query. The view is reloaded when the day
+changes, and compared with the daily_species rollup every few minutes to
+catch the writes that never reach the event bus, like deletions in the PHP
+pages.
+"""
+
+import asyncio
+import logging
+import sqlite3
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from api.services import queries
+from api.services.database import Database, database
+from api.services.eventbus import event_bus
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class SpeciesToday:
+    """Counts of one species today."""
+
+    com_name: str
+    sci_name: str
+    count: int = 0
+    max_confidence: float = 0.0
+    last_time: str = ""
+    hourly_counts: list[int] = field(default_factory=lambda: [0] * 24)
+
+    @property
+    def first_hour(self) -> Optional[int]:
+        return next((hour for hour, count in enumerate(self.hourly_counts) if count), None)
+
+
+def _seconds(time_text: str) -> int:
+    hours, minutes, seconds = time_text.split(":")[:3]
+    return int(hours) * 3600 + int(minutes) * 60 + int(float(seconds))
+
+
+def _time_text(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _today_rows(conn: sqlite3.Connection, day: str) -> tuple[dict[str, str], list[tuple]]:
+    # the names of the species table, in DATABASE_LANG, whatever the detections were recorded with
+    names = dict(conn.execute("SELECT Sci_Name, Com_Name FROM species"))
+    rows = conn.execute(
+        "SELECT ROWID, Time, Com_Name, Sci_Name, Confidence FROM detections WHERE Date = ? ORDER BY ROWID",
+        [day],
+    ).fetchall()
+    return names, rows
+
+
+class TodayView:
+    """The detections of one day, in columns, with their counts per species and per hour."""
+
+    def __init__(self, db: Database):
+        self._db = db
+        self.day: Optional[str] = None
+        self._stale = True
+        # events published while the view is being loaded, applied after it
+        self._pending: Optional[list] = None
+        self._lock = asyncio.Lock()
+        self._clear()
+        self._loads = 0
+        self._repairs = 0
+        self._events = 0
+        self._last_check: Optional[str] = None
+
+    def _clear(self) -> None:
+        self.ids = array("q")
+        self.seconds = array("l")
+        self.confidences = array("d")
+        self.species_index = array("l")
+        self._positions: dict[int, int] = {}
+        self.species: list[SpeciesToday] = []
+        # species are keyed by Sci_Name and named as in the species table, like queries.species_today()
+        self._species_keys: dict[str, int] = {}
+        self._names: dict[str, str] = {}
+        self.hourly_counts = [0] * 24
+
+    @property
+    def total(self) -> int:
+        return len(self.ids)
+
+    def species_seen(self) -> list[SpeciesToday]:
+        """The species detected today, most detected first."""
+        return sorted((species for species in self.species if species.count), key=lambda species: -species.count)
+
+    def _add(self, row_id: int, time_text: str, com_name: str, sci_name: str, confidence: float) -> None:
+        if row_id in self._positions:
+            return
+        index = self._species_keys.get(sci_name)
+        if index is None:
+            index = self._species_keys[sci_name] = len(self.species)
+            self.species.append(SpeciesToday(self._names.get(sci_name, com_name), sci_name))
+        seconds = _seconds(time_text)
+        self._positions[row_id] = len(self.ids)
+        self.ids.append(row_id)
+        self.seconds.append(seconds)
+        self.confidences.append(confidence)
+        self.species_index.append(index)
+
+        species = self.species[index]
+        species.count += 1
+        species.max_confidence = max(species.max_confidence, confidence)
+        species.last_time = max(species.last_time, time_text)
+        species.hourly_counts[seconds // 3600] += 1
+        self.hourly_counts[seconds // 3600] += 1
+
+    def _remove(self, row_id: int) -> None:
+        position = self._positions.pop(row_id, None)
+        if position is None:
+            return
+        index = self.species_index[position]
+        self.hourly_counts[self.seconds[position] // 3600] -= 1
+        for column in (self.ids, self.seconds, self.confidences, self.species_index):
+            del column[position]
+        for later in self.ids[position:]:
+            self._positions[later] -= 1
+
+        # the maximum and the last time may have been the removed detection's
+        species = self.species[index] = SpeciesToday(self.species[index].com_name, self.species[index].sci_name)
+        for seconds, confidence, other in zip(self.seconds, self.confidences, self.species_index):
+            if other == index:
+                species.count += 1
+                species.max_confidence = max(species.max_confidence, confidence)
+                species.last_time = max(species.last_time, _time_text(seconds))
+                species.hourly_counts[seconds // 3600] += 1
+
+    def on_event(self, event) -> None:
+        """Event bus listener: apply a detection or a deletion."""
+        if event.event_type not in ("detection", "delete"):
+            return
+        self._events += 1
+        if self._pending is not None:
+            self._pending.append(event)
+        elif not self._stale:
+            self._apply(event)
+
+    def _apply(self, event) -> None:
+        if event.id is None:
+            # not a row the database confirmed, the checks will count it if it is one
+            return
+        if event.event_type == "delete":
+            self._remove(event.id)
+        elif event.date == self.day:
+            self._add(event.id, event.time, event.com_name, event.sci_name, event.confidence)
+        elif event.date > self.day:
+            # the first detection of a new day
+            self._stale = True
+
+    async def load(self) -> None:
+        """Read the detections of today from the database."""
+        day = date.today().isoformat()
+        self._pending = []
+        try:
+            names, rows = await self._db.read(_today_rows, day)
+            self._clear()
+            self._names = names
+            self.day = day
+            for row in rows:
+                self._add(*row)
+            for event in self._pending:
+                self._apply(event)
+            self._stale = False
+            self._loads += 1
+        finally:
+            self._pending = None
+
+    async def current(self) -> "TodayView":
+        """The view of today, (re)loaded first when the day changed or it went stale."""
+        if self._stale or self.day != date.today().isoformat():
+            async with self._lock:
+                if self._stale or self.day != date.today().isoformat():
+                    await self.load()
+        return self
+
+    def rows(self) -> set[tuple]:
+        """The species as queries.species_today() returns them."""
+        return {
+            (species.com_name, species.sci_name, species.count, species.max_confidence, species.last_time,
+             tuple(species.hourly_counts))
+            for species in self.species if species.count
+        }
+
+    async def check(self) -> bool:
+        """Compare the species with the rollups, reload when they differ; True when they matched."""
+        await self.current()
+        events = self._events
+        rows = await self._db.read(queries.species_today, self.day)
+        self._last_check = datetime.now().isoformat()
+        expected = {(*row[:5], tuple(row[5])) for row in rows}
+        actual = self.rows()
+        # an event in the meantime may be in one and not the other, the next check will tell
+        if actual == expected or self._events != events:
+            return True
+        log.warning("Today's view was out of step with the database, reloading it")
+        self._repairs += 1
+        self._stale = True
+        await self.current()
+        return False
+
+    async def run(self, interval: float) -> None:
+        """Check the view every interval seconds, and reload it at midnight, until cancelled."""
+        last_error = None
+        while True:
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep(min(interval, (midnight - now).total_seconds() + 1))
+            try:
+                await self.check()
+                last_error = None
+            except sqlite3.Error as exc:
+                # only log when the error changes, it's retried every interval
+                if str(exc) != last_error:
+                    log.warning("Today's view check failed: %s", exc)
+                    last_error = str(exc)
+
+    def metrics(self) -> dict:
+        """Size of the view, loads, events applied and repairs since the server started."""
+        return {
+            "day": self.day,
+            "detections": self.total,
+            "species": sum(1 for species in self.species if species.count),
+            "loads": self._loads,
+            "events": self._events,
+            "repairs": self._repairs,
+            "last_check": self._last_check,
+        }
+
+
+# Global view of today, loaded by the application on startup
+today_view = TodayView(database)
+event_bus.add_listener(today_view.on_event)
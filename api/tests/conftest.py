@@ -0,0 +1,55 @@
+"""Shared fixtures: a birds.db as the installer creates it, upgraded to the current schema."""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from api.config import settings
+from api.services.database import Database
+from scripts.utils.schema import DETECTION_COLUMNS, upgrade
+
+CREATEDB_SH = Path(__file__).resolve().parents[2] / "scripts" / "createdb.sh"
+
+# the columns a test doesn't care about get the same values everywhere
+INSERT_SQL = (f"INSERT INTO detections ({', '.join(DETECTION_COLUMNS)}) "
+              "VALUES (?, ?, ?, ?, ?, 50, 5, 0.7, 18, 1.25, 0.0, ?)")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Path of an empty birds.db, created with the SQL of scripts/createdb.sh and upgraded."""
+    path = tmp_path / "birds.db"
+    script = CREATEDB_SH.read_text()
+    con = sqlite3.connect(path, isolation_level=None)
+    con.executescript(script.split("<< EOF\n", 1)[1].split("\nEOF", 1)[0])
+    upgrade(con)
+    con.close()
+    return path
+
+
+@pytest.fixture
+def con(db_path):
+    """An autocommit connection to db_path."""
+    con = sqlite3.connect(db_path, isolation_level=None)
+    yield con
+    con.close()
+
+
+@pytest.fixture
+def insert_detection(con):
+    """insert_detection(day, time, sci_name, com_name, confidence, file_name) inserts a detection as
+    the analysis writes it, through con; returns its ROWID."""
+    def insert(day: str, time: str, sci_name: str = "Genus species", com_name: str = "Blue Jay",
+               confidence: float = 0.8, file_name: str = "x.mp3") -> int:
+        return con.execute(INSERT_SQL, [day, time, sci_name, com_name, confidence, file_name]).lastrowid
+    return insert
+
+
+@pytest.fixture
+def api_database(db_path, monkeypatch):
+    """A Database on db_path, the one settings point the API to."""
+    monkeypatch.setattr(settings, "database_path", db_path)
+    database = Database(readers=1)
+    yield database
+    database.close()
@@ -4,6 +4,7 @@ import pytest
 from fastapi.testclient import TestClient
 
 from api.main import app
+from api.services.eventbus import event_bus
 
 
 @pytest.fixture
@@ -77,6 +78,16 @@ class TestSystemEndpoints:
         assert "sse_subscribers" in data
         assert "generated_at" in data
 
+    def test_system_cached_responses_keep_cors_headers(self, client):
+        """Test /api/system answers cross-origin requests from the cache and on 304s."""
+        origin = {"Origin": "http://example.com"}
+        first = client.get("/api/system", headers=origin)
+        cached = client.get("/api/system", headers=origin)
+        not_modified = client.get("/api/system", headers={**origin, "If-None-Match": cached.headers["etag"]})
+        assert not_modified.status_code in (200, 304)
+        for response in (first, cached, not_modified):
+            assert response.headers["access-control-allow-origin"] in ("*", "http://example.com")
+
 
 class TestClassifiersEndpoints:
     """Tests for classifier endpoints."""
@@ -173,6 +184,60 @@ class TestDetectionNotify:
         })
         assert response.status_code == 200
 
+    def test_notify_keeps_pipeline_id_and_time(self, client):
+        """POST /api/detections/notify should publish the row id and recording time it is given."""
+        queue = event_bus.subscribe()
+        try:
+            response = client.post("/api/detections/notify", json={
+                "id": 4242,
+                "com_name": "Blue Jay",
+                "sci_name": "Cyanocitta cristata",
+                "confidence": 0.85,
+                "date": "2024-05-01",
+                "time": "06:15:03",
+                "iso8601": "2024-05-01T06:15:03-04:00",
+            })
+            assert response.status_code == 200
+            event = queue.get_nowait()
+        finally:
+            event_bus.unsubscribe(queue)
+        assert event.event_type == "detection"
+        assert event.id == 4242
+        assert event.time == "06:15:03"
+
+    def test_notify_without_id_makes_none_up(self, client):
+        """POST /api/detections/notify without a row id should publish an event without one."""
+        queue = event_bus.subscribe()
+        try:
+            response = client.post("/api/detections/notify", json={
+                "com_name": "Blue Jay",
+                "sci_name": "Cyanocitta cristata",
+                "confidence": 0.85,
+            })
+            assert response.status_code == 200
+            event = queue.get_nowait()
+        finally:
+            event_bus.unsubscribe(queue)
+        assert event.id is None
+
+    def test_media_ready_publishes_media_event(self, client):
+        """POST /api/detections/media-ready should publish a 'media' event."""
+        queue = event_bus.subscribe()
+        try:
+            response = client.post("/api/detections/media-ready", json={
+                "id": 4242,
+                "com_name": "Blue Jay",
+                "file_name": "Blue_Jay-85-2024-05-01-birdnet-06:15:03.mp3",
+                "spectrogram": "Blue_Jay-85-2024-05-01-birdnet-06:15:03.mp3.png",
+            })
+            assert response.status_code == 200
+            event = queue.get_nowait()
+        finally:
+            event_bus.unsubscribe(queue)
+        assert event.event_type == "media"
+        assert event.id == 4242
+        assert '"spectrogram"' in event.to_sse_data()
+
 
 
 class TestAudioEndpoints:
@@ -0,0 +1,73 @@
+"""Tests for the NumPy columnar copy of the detections."""
+
+import calendar
+from datetime import date
+
+import pytest
+
+from api.services.columnar_cache import ColumnarCache
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def insert(insert_detection):
+    return lambda day, time, sci_name, confidence=0.8: insert_detection(day, time, sci_name, sci_name.split()[1], confidence)
+
+
+def _ts(day):
+    return calendar.timegm(date.fromisoformat(day).timetuple())
+
+
+@pytest.fixture
+def cache(db_path, insert):
+    insert("2024-05-01", "06:10:00", "Genus jay", 0.95)
+    insert("2024-05-01", "06:20:00", "Genus robin", 0.55)
+    insert("2024-05-03", "07:00:00", "Genus jay", 0.75)
+    cache = ColumnarCache(db_path)
+    cache.refresh()
+    return cache
+
+
+def test_aggregates(cache):
+    labels, counts = cache.aggregate(["species", "hour"])
+    assert labels["species"].tolist() == [1, 2]
+    assert counts[:, 6:8].tolist() == [[1, 1], [1, 0]]
+
+    labels, counts = cache.aggregate(["day"], start=_ts("2024-05-01"), end=_ts("2024-05-04"))
+    assert labels["day"].tolist() == [_ts("2024-05-01"), _ts("2024-05-02"), _ts("2024-05-03")]
+    assert counts.tolist() == [2, 0, 1]
+
+    labels, counts = cache.aggregate(["confidence"], species=[1, 2], bins=4)
+    assert labels["confidence"].tolist() == [0.0, 0.25, 0.5, 0.75]
+    assert counts.tolist() == [0, 0, 1, 2]
+    # the end is exclusive
+    assert cache.aggregate(["species"], end=_ts("2024-05-03"))[1].tolist() == [1, 1]
+
+    with pytest.raises(ValueError):
+        cache.aggregate(["hour", "hour"])
+
+
+def test_refresh_follows_the_change_feed(con, insert, cache):
+    insert("2024-05-04", "05:00:00", "Genus owl")
+    # older than the latest detection
+    insert("2024-05-02", "05:00:00", "Genus owl")
+    con.execute("DELETE FROM detections WHERE ROWID = 2")
+    con.execute("UPDATE detections SET Time = '08:00:00' WHERE ROWID = 3")
+    assert cache.refresh() == 4
+    assert cache.metrics()["loads"] == 1
+
+    *columns, size = cache._columns
+    assert columns[0][:size].tolist() == [1, 5, 3, 4]
+    assert np.all(np.diff(columns[1][:size]) >= 0)
+    labels, counts = cache.aggregate(["species", "hour"])
+    assert labels["species"].tolist() == [1, 3]
+    assert counts[:, 5:9].tolist() == [[0, 1, 0, 1], [2, 0, 0, 0]]
+
+
+def test_pruned_changes_reload(con, insert, cache):
+    insert("2024-05-04", "05:00:00", "Genus owl")
+    con.execute("DELETE FROM detections_changes")
+    cache.refresh()
+    assert cache.metrics()["loads"] == 2
+    assert cache.metrics()["rows"] == 4
@@ -0,0 +1,71 @@
+"""Tests for the pooled SQLite access of the API."""
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from api.config import settings
+from api.services.database import ConnectionPool, Database
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "birds.db"
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE detections (Date DATE, Com_Name VARCHAR(100))")
+    con.execute("INSERT INTO detections VALUES ('2024-05-01', 'Blue Jay')")
+    con.commit()
+    con.close()
+    monkeypatch.setattr(settings, "database_path", path)
+    return path
+
+
+def test_pool_reuses_connections(db_path):
+    pool = ConnectionPool(lambda: sqlite3.connect(db_path, check_same_thread=False), 2)
+    with pool.acquire() as first:
+        pass
+    with pool.acquire() as second:
+        assert second is first
+    assert pool.metrics()["open"] == 1
+    pool.close()
+
+
+def test_pool_blocks_when_all_in_use(db_path):
+    pool = ConnectionPool(lambda: sqlite3.connect(db_path, check_same_thread=False), 1)
+    with pool.acquire():
+        with pytest.raises(TimeoutError):
+            with pool.acquire(timeout=0.05):
+                pass
+        assert pool.metrics()["in_use"] == 1
+    assert pool.metrics()["in_use"] == 0
+    pool.close()
+
+
+def test_read_and_write_off_the_event_loop(db_path):
+    database = Database(readers=2)
+    loop_thread = threading.get_ident()
+
+    def count(conn):
+        assert threading.get_ident() != loop_thread
+        return conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def insert(conn):
+        conn.execute("INSERT INTO detections VALUES ('2024-05-01', 'American Robin')")
+
+    async def main():
+        assert await database.read(count) == 1
+        await database.write(insert)
+        return await asyncio.gather(*(database.read(count) for _ in range(5)))
+
+    try:
+        assert asyncio.run(main()) == [2] * 5
+        with pytest.raises(sqlite3.OperationalError):
+            asyncio.run(database.read(insert))
+        metrics = database.metrics()
+        assert metrics["readers"]["query_time"]["count"] == 7
+        assert metrics["readers"]["open"] <= 2
+        assert metrics["writer"]["query_time"]["count"] == 1
+    finally:
+        database.close()
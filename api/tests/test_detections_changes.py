@@ -0,0 +1,65 @@
+"""Tests for the incremental refresh of /api/detections/changes."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.routers import detections
+
+
+@pytest.fixture
+def insert(insert_detection):
+    return lambda time, file_name: insert_detection("2024-05-01", time, "Cyanocitta cristata", "Blue Jay", 0.8, file_name)
+
+
+@pytest.fixture
+def client(api_database, insert, monkeypatch):
+    insert("06:00:00", "a.mp3")
+    monkeypatch.setattr(detections, "database", api_database)
+    return TestClient(app)
+
+
+def test_changes_since_cursor(client, con, insert):
+    cursor = client.get("/api/detections/changes").json()["cursor"]
+    assert cursor == 1
+
+    insert("07:00:00", "b.mp3")
+    con.execute("UPDATE detections SET Confidence = 0.95 WHERE ROWID = 1")
+    insert("08:00:00", "c.mp3")
+    con.execute("DELETE FROM detections WHERE ROWID = 3")
+
+    data = client.get("/api/detections/changes", params={"since": cursor}).json()
+    assert data["reset"] is False and data["has_more"] is False
+    assert data["cursor"] == 5
+    rows = [dict(zip(data["columns"], row)) for row in data["upserted"]]
+    assert [(row["id"], row["time"], row["confidence"], row["file_name"]) for row in rows] == [
+        (1, "06:00:00", 0.95, "a.mp3"),
+        (2, "07:00:00", 0.8, "b.mp3"),
+    ]
+    assert data["deleted"] == [3]
+
+    # nothing new
+    data = client.get("/api/detections/changes", params={"since": 5}).json()
+    assert (data["cursor"], data["upserted"], data["deleted"]) == (5, [], [])
+
+
+def test_paging(client, insert):
+    for i in range(5):
+        insert("07:00:00", f"{i}.mp3")
+    data = client.get("/api/detections/changes", params={"since": 1, "limit": 3}).json()
+    assert data["has_more"] is True
+    assert [row[0] for row in data["upserted"]] == [2, 3, 4]
+    data = client.get("/api/detections/changes", params={"since": data["cursor"], "limit": 3}).json()
+    assert data["has_more"] is False
+    assert [row[0] for row in data["upserted"]] == [5, 6]
+
+
+def test_reset_when_changes_are_gone(client, con, insert):
+    insert("07:00:00", "b.mp3")
+    con.execute("DELETE FROM detections_changes WHERE Seq <= 2")
+    # pruned before the client saw them
+    data = client.get("/api/detections/changes", params={"since": 1}).json()
+    assert (data["reset"], data["cursor"]) == (True, 2)
+    # a cursor from another database
+    data = client.get("/api/detections/changes", params={"since": 10}).json()
+    assert (data["reset"], data["cursor"]) == (True, 2)
@@ -0,0 +1,57 @@
+"""Tests for the cursor pagination of /api/detections."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.routers import detections
+
+
+@pytest.fixture
+def client(api_database, insert_detection, monkeypatch):
+    # two detections in the same second, the rowid breaks the tie
+    for day, time in [("2024-05-01", "06:00:00"), ("2024-05-02", "06:00:00"), ("2024-05-02", "06:00:00"),
+                      ("2024-05-01", "07:00:00"), ("2024-05-03", "05:00:00"), ("2024-05-02", "08:00:00"),
+                      ("2024-05-01", "05:00:00")]:
+        insert_detection(day, time)
+    monkeypatch.setattr(detections, "database", api_database)
+    monkeypatch.setattr(detections, "_totals", {})
+    return TestClient(app)
+
+
+def test_following_the_cursor_visits_every_detection_once(client):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        data = client.get("/api/detections", params=params).json()
+        assert data["total"] == 7
+        ids += [detection["id"] for detection in data["detections"]]
+        cursor = data["next_cursor"]
+        assert data["has_more"] == (cursor is not None)
+        if cursor is None:
+            break
+    assert ids == [5, 6, 3, 2, 4, 1, 7]
+
+    # page numbers give the same order
+    data = client.get("/api/detections", params={"limit": 3, "page": 2}).json()
+    assert [detection["id"] for detection in data["detections"]] == [2, 4, 1]
+
+
+def test_total_is_reused_unless_exact(client, insert_detection):
+    assert client.get("/api/detections", params={"date_param": "2024-05-02"}).json()["total"] == 3
+    insert_detection("2024-05-02", "09:00:00")
+
+    data = client.get("/api/detections", params={"date_param": "2024-05-02"}).json()
+    assert data["total"] == 3
+    assert len(data["detections"]) == 4
+    assert client.get("/api/detections", params={"date_param": "2024-05-02", "exact_total": True}).json()["total"] == 4
+
+
+def test_invalid_cursor(client):
+    assert client.get("/api/detections", params={"cursor": "not a cursor"}).status_code == 400
+
+
+def test_species_filter(client):
+    assert client.get("/api/detections", params={"species": "blue"}).json()["total"] == 7
+    assert client.get("/api/detections", params={"species": "species"}).json()["total"] == 7
+    assert client.get("/api/detections", params={"species": "robin"}).json()["total"] == 0
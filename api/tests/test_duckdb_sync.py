@@ -0,0 +1,108 @@
+"""Tests for the SQLite change feed → DuckDB sync worker."""
+
+import pytest
+
+from api.services.duckdb_sync import DuckDBSync, date_filter
+from scripts.utils.archive import archive_month
+
+
+@pytest.fixture
+def insert(insert_detection):
+    return lambda time, com_name, confidence=0.8: insert_detection("2024-05-01", time, "Genus species", com_name, confidence)
+
+
+@pytest.fixture
+def sqlite_path(db_path, insert):
+    insert("06:00:00", "Blue Jay")
+    return db_path
+
+
+@pytest.fixture
+def sync(sqlite_path, tmp_path):
+    sync = DuckDBSync(sqlite_path, tmp_path / "birds.duckdb")
+    sync.open()
+    yield sync
+    sync.close()
+
+
+def _duckdb_rows(sync):
+    cur = sync.cursor()
+    try:
+        return cur.execute("SELECT id, time, com_name FROM detections ORDER BY id").fetchall()
+    finally:
+        cur.close()
+
+
+def test_initial_copy_then_changes(sync, con, insert):
+    sync.catch_up()
+    assert _duckdb_rows(sync) == [(1, "06:00:00", "Blue Jay")]
+
+    insert("06:05:00", "American Robin")
+    insert("06:10:00", "Northern Cardinal")
+    con.execute("UPDATE detections SET Com_Name = 'Steller''s Jay' WHERE ROWID = 1")
+    con.execute("DELETE FROM detections WHERE ROWID = 3")
+
+    assert sync.catch_up() == 4
+    assert _duckdb_rows(sync) == [(1, "06:00:00", "Steller's Jay"), (2, "06:05:00", "American Robin")]
+    assert sync.get_cursor() == 5
+    # nothing left to apply
+    assert sync.catch_up() == 0
+
+
+def test_replaying_a_batch_is_harmless(sync, insert):
+    sync.catch_up()
+    insert("06:05:00", "American Robin")
+    sync.catch_up()
+
+    # as if the cursor had not been saved
+    sync._set_cursor(0)
+    sync.catch_up()
+    assert _duckdb_rows(sync) == [(1, "06:00:00", "Blue Jay"), (2, "06:05:00", "American Robin")]
+
+
+def test_pruned_changes_trigger_a_full_copy(sync, con, insert):
+    sync.catch_up()
+    cursor = sync.get_cursor()
+    insert("06:05:00", "American Robin")
+    insert("06:10:00", "Northern Cardinal")
+    # pruned before the worker saw them
+    con.execute("DELETE FROM detections_changes")
+
+    sync.catch_up()
+    assert [row[2] for row in _duckdb_rows(sync)] == ["Blue Jay", "American Robin", "Northern Cardinal"]
+    assert sync.get_cursor() == cursor + 2
+
+
+def test_prune_keeps_unapplied_changes(sync, con, insert):
+    sync.catch_up()
+    insert("06:05:00", "American Robin")
+    con.execute("UPDATE detections_changes SET Changed_At = Changed_At - 30 * 86400")
+
+    # only the applied changes older than the retention
+    assert sync.prune(7) == 1
+    assert con.execute("SELECT COUNT(*) FROM detections_changes").fetchone()[0] == 1
+    sync.catch_up()
+    assert sync.prune(7) == 1
+    assert con.execute("SELECT COUNT(*) FROM detections_changes").fetchone()[0] == 0
+
+
+def test_all_detections_includes_the_archive(sqlite_path, con, insert, tmp_path):
+    archive_dir = tmp_path / "detections_archive"
+    insert("07:00:00", "American Robin")
+    con.execute("UPDATE detections SET Date = '2024-04-30' WHERE ROWID = 1")
+    archive_month(con, "2024-04", str(archive_dir))
+
+    sync = DuckDBSync(sqlite_path, tmp_path / "birds.duckdb", archive_dir)
+    sync.open()
+    try:
+        sync.catch_up()
+        cur = sync.cursor()
+        rows = cur.execute("SELECT id, date, com_name FROM all_detections ORDER BY id").fetchall()
+        assert rows == [(1, "2024-04-30", "Blue Jay"), (2, "2024-05-01", "American Robin")]
+
+        condition, params = date_filter("2024-04-30", "2024-04-30")
+        rows = cur.execute(f"SELECT id FROM all_detections WHERE {condition}", params).fetchall()
+        assert rows == [(1,)]
+        cur.close()
+    finally:
+        sync.close()
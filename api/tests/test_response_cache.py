@@ -0,0 +1,81 @@
+"""Tests for the ETag response cache of the polled endpoints."""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.services.eventbus import DetectionDeletedEvent, EventBus, MediaReadyEvent
+from api.services.response_cache import ResponseCache
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.cache = ResponseCache({"/counts": 60.0, "/short": 0.0})
+
+    @app.get("/counts")
+    async def counts(species: str = ""):
+        app.state.calls += 1
+        return {"species": species, "count": app.state.value}
+
+    @app.get("/short")
+    async def short():
+        app.state.calls += 1
+        return {}
+
+    app.state.value = 1
+    app.middleware("http")(app.state.cache.middleware)
+    return app
+
+
+def test_unchanged_polls_get_304_without_running_the_handler(app):
+    client = TestClient(app)
+    first = client.get("/counts")
+    etag = first.headers["etag"]
+    assert first.json() == {"species": "", "count": 1}
+
+    response = client.get("/counts", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert client.get("/counts").json() == first.json()
+    # the query string is part of the key
+    assert client.get("/counts", params={"species": "jay"}).json()["species"] == "jay"
+    assert app.state.calls == 2
+
+    metrics = app.state.cache.metrics()
+    assert metrics["routes"]["/counts"] == {"hits": 2, "misses": 2, "not_modified": 1, "limit": 1,
+                                            "runs": 2, "coalesced": 0, "running": 0, "waiting": 0}
+    assert metrics["hit_ratio"] == 0.5
+
+
+def test_events_invalidate(app):
+    bus = EventBus()
+    bus.add_listener(app.state.cache.on_event)
+    client = TestClient(app)
+    etag = client.get("/counts").headers["etag"]
+
+    # the media of a detection changes no counts
+    asyncio.run(bus.publish(MediaReadyEvent(id=1, com_name="Blue Jay", file_name="x.mp3", spectrogram="x.png")))
+    assert client.get("/counts", headers={"If-None-Match": etag}).status_code == 304
+
+    # the query runs again, but the same body keeps its ETag
+    asyncio.run(bus.publish(DetectionDeletedEvent(id=1)))
+    assert client.get("/counts", headers={"If-None-Match": etag}).status_code == 304
+    assert app.state.calls == 2
+
+    app.state.value = 2
+    app.state.cache.invalidate()
+    response = client.get("/counts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert app.state.cache.metrics()["invalidations"] == 2
+
+
+def test_max_age(app):
+    client = TestClient(app)
+    client.get("/short")
+    client.get("/short")
+    assert app.state.calls == 2
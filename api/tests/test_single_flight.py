@@ -0,0 +1,86 @@
+"""Tests for the coalescing of concurrent identical requests."""
+
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from api.services.response_cache import ResponseCache
+from api.services.single_flight import SingleFlight
+
+
+def test_concurrent_requests_share_one_run():
+    app = FastAPI()
+    cache = ResponseCache({"/stats": 60.0, "/today": 60.0}, limits={"/today": 2})
+    app.middleware("http")(cache.middleware)
+    calls = []
+
+    @app.get("/stats")
+    async def get_stats():
+        calls.append("stats")
+        await asyncio.sleep(0.05)
+        return {"count": len(calls)}
+
+    @app.get("/today")
+    async def get_today(day: str):
+        calls.append(day)
+        await asyncio.sleep(0.05)
+        return {"day": day}
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            stats = await asyncio.gather(*(client.get("/stats") for _ in range(5)))
+            days = await asyncio.gather(*(client.get("/today", params={"day": day}) for day in "abcab"))
+        return stats, days
+
+    stats, days = asyncio.run(main())
+    assert [response.json() for response in stats] == [{"count": 1}] * 5
+    assert len({response.headers["etag"] for response in stats}) == 1
+    assert [response.json()["day"] for response in days] == list("abcab")
+    assert calls == ["stats", "a", "b", "c"]
+
+    metrics = cache.metrics()
+    assert metrics["coalesced"] == 6
+    assert metrics["routes"]["/stats"]["runs"] == 1
+    assert metrics["routes"]["/today"] == {"hits": 0, "misses": 5, "not_modified": 0, "limit": 2,
+                                           "runs": 3, "coalesced": 2, "running": 0, "waiting": 0}
+
+
+def test_routes_run_up_to_their_limit():
+    flight = SingleFlight({"/stats": 2})
+    running, peak = 0, 0
+
+    async def run():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def main():
+        await asyncio.gather(*(flight.do("/stats", (n,), run) for n in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert flight.metrics()["/stats"]["runs"] == 6
+
+
+def test_a_failed_run_is_retried_by_the_coalesced_calls():
+    flight = SingleFlight({"/stats": 1})
+    results = iter([ValueError("database is locked"), "ok"])
+
+    async def run():
+        await asyncio.sleep(0.01)
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def main():
+        return await asyncio.gather(flight.do("/stats", (), run), flight.do("/stats", (), run),
+                                    return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, ValueError)
+    assert second == "ok"
@@ -0,0 +1,58 @@
+"""Tests for the set-based species queries."""
+
+import pytest
+
+from api.services.queries import search_species, species_keys, species_stats, species_today
+
+
+@pytest.fixture
+def conn(con, insert_detection):
+    for day, time, com_name, confidence, file_name in [
+        ("2024-05-01", "06:10:00", "Blue Jay", 0.9, "a.mp3"),
+        ("2024-05-02", "05:00:00", "Blue Jay", 0.9, "b.mp3"),
+        ("2024-05-02", "06:30:00", "Blue Jay", 0.7, "c.mp3"),
+        ("2024-05-02", "07:00:00", "American Robin", 0.8, "d.mp3"),
+    ]:
+        insert_detection(day, time, f"Genus {com_name}", com_name, confidence, file_name)
+    return con
+
+
+@pytest.fixture
+def statements(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_species_stats(conn, statements):
+    assert species_stats(conn) == [
+        # the latest of the two best recordings
+        ("Blue Jay", "Genus Blue Jay", 3, 0.9, "2024-05-02", "05:00:00", "b.mp3"),
+        ("American Robin", "Genus American Robin", 1, 0.8, "2024-05-02", "07:00:00", "d.mp3"),
+    ]
+    assert len(statements) == 1
+
+
+def test_species_today(conn, statements):
+    assert species_today(conn, "2024-05-02") == [
+        ("Blue Jay", "Genus Blue Jay", 2, 0.9, "06:30:00", [0] * 5 + [1, 1] + [0] * 17),
+        ("American Robin", "Genus American Robin", 1, 0.8, "07:00:00", [0] * 7 + [1] + [0] * 16),
+    ]
+    assert species_today(conn, "2024-05-03") == []
+    assert len(statements) == 2
+
+
+def test_search_species(conn, insert_detection):
+    insert_detection("2024-05-02", "08:00:00", "Garrulus glandarius", "Eurasian Jay", 0.8, "e.mp3")
+    # names with a word starting with the text, shortest first
+    assert search_species(conn, "jay", 10) == [
+        ("Genus Blue Jay", "Blue Jay", "Blue Jay", ""),
+        ("Garrulus glandarius", "Eurasian Jay", "Eurasian Jay", ""),
+    ]
+    assert search_species(conn, "garr", 10) == [("Garrulus glandarius", "Eurasian Jay", "Garrulus glandarius", "sci")]
+    # too short for the trigrams, matches the start of the names
+    assert search_species(conn, "Am", 10) == [
+        ("Genus American Robin", "American Robin", "American Robin", ""),
+    ]
+    assert search_species(conn, "%", 10) == []
+    assert species_keys(conn, "ROBIN") == ["Genus American Robin"]
@@ -0,0 +1,71 @@
+"""Tests for the bucketed detection counts of /api/detections/timeseries."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.routers import detections
+
+
+@pytest.fixture
+def client(api_database, insert_detection, monkeypatch):
+    for day, time, sci_name, com_name in [
+        ("2024-04-29", "06:00:00", "Cyanocitta cristata", "Blue Jay"),
+        ("2024-05-01", "06:30:00", "Cyanocitta cristata", "Blue Jay"),
+        ("2024-05-01", "07:00:00", "Turdus migratorius", "American Robin"),
+        ("2024-05-06", "05:00:00", "Turdus migratorius", "American Robin"),
+    ]:
+        insert_detection(day, time, sci_name, com_name)
+    monkeypatch.setattr(detections, "database", api_database)
+    return TestClient(app)
+
+
+def test_day_buckets_of_all_species(client):
+    data = client.get("/api/detections/timeseries", params={"start": "2024-04-30", "end": "2024-05-02"}).json()
+    assert data["buckets"] == ["2024-04-30", "2024-05-01", "2024-05-02"]
+    assert data["series"] == [{"name": "all", "counts": [0, 2, 0]}]
+
+
+def test_species_overlays(client):
+    params = [("bucket", "week"), ("start", "2024-04-30"), ("end", "2024-05-12"),
+              ("species", "Blue Jay"), ("species", "Turdus migratorius"), ("species", "Strix varia")]
+    data = client.get("/api/detections/timeseries", params=params).json()
+    # whole weeks, from the Monday of start
+    assert data["buckets"] == ["2024-04-29", "2024-05-06"]
+    assert data["series"] == [
+        {"name": "Blue Jay", "counts": [1, 0]},
+        {"name": "Turdus migratorius", "counts": [1, 1]},
+        {"name": "Strix varia", "counts": [0, 0]},
+    ]
+
+
+def test_hour_and_month_buckets(client):
+    data = client.get("/api/detections/timeseries",
+                      params={"bucket": "hour", "start": "2024-05-01", "end": "2024-05-01"}).json()
+    assert len(data["buckets"]) == 24
+    assert data["buckets"][6] == "2024-05-01T06"
+    assert data["series"][0]["counts"][6:8] == [1, 1]
+
+    data = client.get("/api/detections/timeseries",
+                      params={"bucket": "month", "start": "2024-04-01", "end": "2024-05-31"}).json()
+    assert data["buckets"] == ["2024-04", "2024-05"]
+    assert data["series"][0]["counts"] == [1, 3]
+
+
+def test_invalid_requests(client):
+    assert client.get("/api/detections/timeseries", params={"bucket": "year"}).status_code == 400
+    assert client.get("/api/detections/timeseries", params={"start": "2024-05-02", "end": "2024-05-01"}).status_code == 400
+    assert client.get("/api/detections/timeseries",
+                      params={"bucket": "hour", "start": "2020-01-01", "end": "2024-01-01"}).status_code == 400
+
+
+def test_the_ends_of_the_calendar(client):
+    # rejected before any label is made
+    assert client.get("/api/detections/timeseries",
+                      params={"bucket": "hour", "start": "0001-01-01", "end": "9999-12-31"}).status_code == 400
+    for bucket, last in [("day", "9999-12-31"), ("week", "9999-12-27"), ("month", "9999-12")]:
+        response = client.get("/api/detections/timeseries",
+                              params={"bucket": bucket, "start": "9999-12-01", "end": "9999-12-31"})
+        assert response.status_code == 200
+        assert response.json()["buckets"][-1] == last
+    assert client.get("/api/detections/timeseries", params={"end": "0001-01-02"}).json()["start"] == "0001-01-01"
@@ -0,0 +1,104 @@
+"""Tests for the in-memory view of today's detections."""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from api.services.eventbus import DetectionDeletedEvent, DetectionEvent
+from api.services.today_view import TodayView
+
+TODAY = date.today().isoformat()
+
+
+@pytest.fixture
+def insert(insert_detection):
+    return lambda time, com_name, confidence: insert_detection(TODAY, time, f"Genus {com_name}", com_name, confidence)
+
+
+def _event(row_id, time, com_name, confidence, day=TODAY):
+    return DetectionEvent(id=row_id, com_name=com_name, sci_name=f"Genus {com_name}", confidence=confidence,
+                          date=day, time=time, iso8601=f"{day}T{time}", file_name="x.mp3", classifier="birdnet")
+
+
+@pytest.fixture
+def view(api_database, insert):
+    insert("05:10:00", "Blue Jay", 0.9)
+    insert("06:20:00", "American Robin", 0.8)
+    return TodayView(api_database)
+
+
+def test_events_update_the_view(con, insert, view):
+    async def main():
+        await view.load()
+        row_id = insert("06:40:00", "Blue Jay", 0.95)
+        view.on_event(_event(row_id, "06:40:00", "Blue Jay", 0.95))
+        # the same detection twice
+        view.on_event(_event(row_id, "06:40:00", "Blue Jay", 0.95))
+        assert view.total == 3
+        assert view.hourly_counts[5:7] == [1, 2]
+        blue_jay = view.species_seen()[0]
+        assert (blue_jay.count, blue_jay.max_confidence, blue_jay.last_time, blue_jay.first_hour) == (2, 0.95, "06:40:00", 5)
+        assert await view.check()
+
+        con.execute("DELETE FROM detections WHERE ROWID = ?", [row_id])
+        view.on_event(DetectionDeletedEvent(id=row_id))
+        blue_jay = view.species_seen()[0]
+        assert (blue_jay.count, blue_jay.max_confidence, blue_jay.last_time) == (1, 0.9, "05:10:00")
+        assert view.hourly_counts[5:7] == [1, 1]
+        assert await view.check()
+
+    asyncio.run(main())
+    assert view.metrics()["repairs"] == 0
+
+
+def test_check_repairs_writes_missed_by_the_events(con, view):
+    async def main():
+        await view.current()
+        # deleted in the PHP pages, no event
+        con.execute("DELETE FROM detections WHERE Com_Name = 'American Robin'")
+        assert not await view.check()
+        assert [species.com_name for species in view.species_seen()] == ["Blue Jay"]
+        assert await view.check()
+
+    asyncio.run(main())
+    assert view.metrics()["loads"] == 2
+    assert view.metrics()["repairs"] == 1
+
+
+def test_a_detection_of_the_next_day_reloads(view):
+    async def main():
+        await view.load()
+        view.on_event(_event(99, "00:00:01", "Blue Jay", 0.9, day="9999-12-31"))
+        await view.current()
+
+    asyncio.run(main())
+    assert view.metrics()["loads"] == 2
+    assert view.total == 2
+
+
+def test_species_are_named_as_in_the_species_table(insert_detection, view):
+    # the language was changed in the settings: the same species recorded under another name
+    insert_detection(TODAY, "07:00:00", "Genus Blue Jay", "Geai bleu", 0.7)
+
+    async def main():
+        await view.load()
+        row_id = insert_detection(TODAY, "07:30:00", "Genus Blue Jay", "Geai bleu", 0.6)
+        view.on_event(DetectionEvent(id=row_id, com_name="Geai bleu", sci_name="Genus Blue Jay", confidence=0.6,
+                                     date=TODAY, time="07:30:00", iso8601=f"{TODAY}T07:30:00", file_name="x.mp3",
+                                     classifier="birdnet"))
+        assert await view.check()
+
+    asyncio.run(main())
+    assert [(species.com_name, species.count) for species in view.species_seen()] == [("Blue Jay", 3), ("American Robin", 1)]
+    assert view.metrics()["repairs"] == 0
+
+
+def test_events_without_a_row_id_are_ignored(view):
+    async def main():
+        await view.load()
+        view.on_event(_event(None, "06:40:00", "Blue Jay", 0.95))
+        assert await view.check()
+
+    asyncio.run(main())
+    assert view.total == 2
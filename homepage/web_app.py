@@ -171,8 +171,8 @@ def get_hourly_detections() -> dict:
         con = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
         today = datetime.now().strftime("%Y-%m-%d")
         cur = con.execute(
-            "SELECT CAST(strftime('%H', Time) AS INTEGER) as hour, COUNT(*) "
-            "FROM detections WHERE Date = ? GROUP BY hour",
+            "SELECT Hour, SUM(Count) "
+            "FROM hourly_species WHERE Date = ? GROUP BY Hour",
             (today,)
         )
         rows = cur.fetchall()
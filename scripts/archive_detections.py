@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Move the detections of closed months from birds.db to a Parquet archive.
+
+A month is archived once it is more than ARCHIVE_AFTER_MONTHS months in the past
+(0 disables archiving). Its detections are written to
+ARCHIVE_DIR/year=YYYY/month=MM/part-<first id>-<last id>.parquet, sorted by species
+and time so the row group statistics let readers skip what they don't need, and
+then deleted from birds.db in the same transaction that records the month in
+archived_months. The daily and hourly rollups keep counting the archived months.
+
+Usage:
+    python scripts/archive_detections.py [--months N] [--db DB_PATH] [--archive-dir DIR] [--dry-run]
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+
+from utils.archive import archive_month, months_to_archive
+from utils.helpers import ARCHIVE_DIR, DB_PATH, get_settings
+
+
+def main(argv: list[str] | None = None) -> None:
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Archive the detections of closed months to Parquet.")
+    parser.add_argument("--months", type=int,
+                        help="Months to keep in the database (default: ARCHIVE_AFTER_MONTHS, 0 disables)")
+    parser.add_argument("--db", default=DB_PATH, help=f"Path to SQLite database (default: {DB_PATH})")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help=f"Archive directory (default: {ARCHIVE_DIR})")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the months to archive")
+    args = parser.parse_args(argv)
+
+    keep_months = args.months
+    if keep_months is None:
+        keep_months = get_settings().getint("ARCHIVE_AFTER_MONTHS", fallback=0)
+    if keep_months <= 0:
+        print("Archiving is disabled")
+        return
+
+    con = sqlite3.connect(args.db, timeout=60, isolation_level=None)
+    try:
+        months = months_to_archive(con, keep_months)
+        if args.dry_run:
+            print("\n".join(months) or "Nothing to archive")
+            return
+        for month in months:
+            t0 = time.monotonic()
+            count = archive_month(con, month, args.archive_dir)
+            print(f"Archived {count} detections of {month} in {time.monotonic() - t0:.2f}s")
+    except (sqlite3.Error, OSError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
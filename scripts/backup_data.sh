@@ -58,7 +58,7 @@ backup() {
   log "Starting backup, this might take a while"
   CMD='tar --create -f "$ARCHIVE"'
   for obj in  "${optional[@]}";do
-    [ -f $obj ] && CMD="$CMD -C $(dirname "$obj") $(basename "$obj")"
+    [ -e $obj ] && CMD="$CMD -C $(dirname "$obj") $(basename "$obj")"
   done
   for obj in  "${required[@]}";do
     CMD="$CMD -C $(dirname "$obj") $(basename "$obj")"
@@ -70,7 +70,7 @@ backup() {
 estimated_backup_size() {
   CMD='du -s -c -b '
   for obj in  "${optional[@]}";do
-    [ -f $obj ] && CMD="$CMD $obj"
+    [ -e $obj ] && CMD="$CMD $obj"
   done
   for obj in  "${required[@]}";do
     CMD="$CMD $obj"
@@ -135,7 +135,8 @@ restore() {
   done
   log "Trying to restore optional files"
   for obj in  "${optional[@]}";do
-    if [ -f "${UNPACK}/$(basename "$obj")" ] ; then
+    if [ -e "${UNPACK}/$(basename "$obj")" ] ; then
+      [ -d "$obj" ] && rm -rf "$obj"
       mv "${UNPACK}/$(basename "$obj")" "$(dirname "$obj")/"
     else
       echo No $(basename "$obj") found, moving on
@@ -172,7 +173,8 @@ optional=("/home/$BIRDNET_USER/BirdNET-Pi/apprise.txt"
 "/home/$BIRDNET_USER/BirdNET-Pi/scripts/disk_check_exclude.txt"
 "/home/$BIRDNET_USER/BirdNET-Pi/exclude_species_list.txt"
 "/home/$BIRDNET_USER/BirdNET-Pi/confirmed_species_list.txt"
-"/home/$BIRDNET_USER/BirdNET-Pi/include_species_list.txt")
+"/home/$BIRDNET_USER/BirdNET-Pi/include_species_list.txt"
+"/home/$BIRDNET_USER/BirdNET-Pi/scripts/detections_archive")
 
 [ $ACTION == "backup" ] && backup_check
 [ $ACTION == "restore" ] && restore_check
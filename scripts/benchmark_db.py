@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Time the queries behind the /api endpoints on a synthetic detections database.
+
+Builds a database with the schema of createdb.sh, times every query, upgrades the schema with
+db_upgrade and times them again. The species endpoints are also timed as a whole, with the number
+of statements each one runs: a query per species before, one set-based query after, timed with
+the functions of api/services/queries.py, so the API requirements must be installed.
+
+Usage:
+    python scripts/benchmark_db.py [--rows N] [--days N] [--species N] [--db PATH]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from utils.schema import get_version, upgrade
+from utils.species_names import fill_species_ids
+
+# the endpoints are timed with the queries they run, from the API package next to scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services import queries  # noqa: E402
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS detections (
+  Date DATE,
+  Time TIME,
+  Sci_Name VARCHAR(100) NOT NULL,
+  Com_Name VARCHAR(100) NOT NULL,
+  Confidence FLOAT,
+  Lat FLOAT,
+  Lon FLOAT,
+  Cutoff FLOAT,
+  Week INT,
+  Sens FLOAT,
+  Overlap FLOAT,
+  File_Name VARCHAR(100) NOT NULL);
+CREATE INDEX "detections_Com_Name" ON "detections" ("Com_Name");
+CREATE INDEX "detections_Sci_Name" ON "detections" ("Sci_Name");
+CREATE INDEX "detections_Date_Time" ON "detections" ("Date" DESC, "Time" DESC);
+"""
+
+# endpoint: (query before the upgrade, query after the upgrade)
+QUERIES = {
+    "GET /api/detections (count for a date)": (
+        "SELECT COUNT(*) FROM detections WHERE Date = :today",
+        "SELECT COUNT(*) FROM detections WHERE Date = :today",
+    ),
+    "GET /api/detections (page 1)": (
+        "SELECT ROWID, * FROM detections ORDER BY Date DESC, Time DESC LIMIT 50",
+        "SELECT ROWID, * FROM detections ORDER BY ts DESC, ROWID DESC LIMIT 51",
+    ),
+    "GET /api/detections (page in the middle of the log)": (
+        "SELECT ROWID, * FROM detections ORDER BY Date DESC, Time DESC LIMIT 50 OFFSET :offset",
+        "SELECT ROWID, * FROM detections WHERE (ts, ROWID) < (:ts, :rowid) ORDER BY ts DESC, ROWID DESC LIMIT 50",
+    ),
+    "GET /api/detections/today/summary (top species)": (
+        "SELECT Com_Name, COUNT(*) AS count FROM detections WHERE Date = :today GROUP BY Com_Name ORDER BY count DESC LIMIT 5",
+        "SELECT s.Com_Name, r.Count FROM daily_species r JOIN species s ON s.Species_Id = r.Species_Id "
+        "WHERE r.Date = :today ORDER BY r.Count DESC LIMIT 5",
+    ),
+    "GET /api/detections/today/summary (hourly)": (
+        "SELECT CAST(substr(Time, 1, 2) AS INTEGER) AS hour, COUNT(*) FROM detections WHERE Date = :today GROUP BY hour",
+        "SELECT Hour, SUM(Count) FROM hourly_species WHERE Date = :today GROUP BY Hour",
+    ),
+    "GET /api/detections/species/history": (
+        "SELECT Date, COUNT(*) FROM detections WHERE Com_Name = :com_name "
+        "AND Date BETWEEN DATE(:today, '-1080 days') AND :today GROUP BY Date ORDER BY Date",
+        "SELECT r.Date, SUM(r.Count) FROM species s JOIN daily_species r ON r.Species_Id = s.Species_Id "
+        "WHERE s.Com_Name = :com_name AND r.Date BETWEEN DATE(:today, '-1080 days') AND :today GROUP BY r.Date ORDER BY r.Date",
+    ),
+    "GET /api/species/stats (all species)": (
+        "SELECT Com_Name, Sci_Name, COUNT(*), MAX(Confidence) FROM detections GROUP BY Com_Name, Sci_Name",
+        "SELECT Species_Id, SUM(Count), MAX(Max_Confidence) FROM daily_species GROUP BY Species_Id",
+    ),
+    "GET /api/species/stats (best recording, per species)": (
+        "SELECT Date, Time, File_Name FROM detections WHERE Com_Name = :com_name AND Confidence = :confidence "
+        "ORDER BY Date DESC, Time DESC LIMIT 1",
+        "SELECT Date, Time, File_Name FROM detections WHERE Species_Id = :species_id AND Confidence = :confidence "
+        "ORDER BY ts DESC LIMIT 1",
+    ),
+    "GET /api/species/today": (
+        "SELECT Com_Name, Sci_Name, COUNT(*), MAX(Confidence), MAX(Time) FROM detections WHERE Date = :today "
+        "GROUP BY Com_Name, Sci_Name",
+        "SELECT Species_Id, Count, Max_Confidence, Last_Time FROM daily_species WHERE Date = :today",
+    ),
+    "GET /api/species/today (hourly)": (
+        "SELECT Com_Name, CAST(substr(Time, 1, 2) AS INTEGER) AS hour, COUNT(*) FROM detections WHERE Date = :today "
+        "GROUP BY Com_Name, hour",
+        "SELECT Species_Id, Hour, Count FROM hourly_species WHERE Date = :today",
+    ),
+}
+
+
+def stats_per_species(conn: sqlite3.Connection, params: dict) -> None:
+    """GET /api/species/stats as it was: the totals, then the best recording of each species."""
+    rows = conn.execute("SELECT Com_Name, Sci_Name, COUNT(*), MAX(Confidence) FROM detections "
+                        "GROUP BY Com_Name, Sci_Name").fetchall()
+    for com_name, _, _, confidence in rows:
+        conn.execute("SELECT Date, Time, File_Name FROM detections WHERE Com_Name = ? AND Confidence = ? "
+                     "ORDER BY Date DESC, Time DESC LIMIT 1", [com_name, confidence]).fetchone()
+
+
+def today_per_species(conn: sqlite3.Connection, params: dict) -> None:
+    """GET /api/species/today as it was: the species seen today, then the hourly counts of each."""
+    rows = conn.execute("SELECT Com_Name, Sci_Name, COUNT(*), MAX(Confidence), MAX(Time) FROM detections "
+                        "WHERE Date = :today GROUP BY Com_Name, Sci_Name", params).fetchall()
+    for com_name, *_ in rows:
+        conn.execute("SELECT CAST(substr(Time, 1, 2) AS INTEGER) AS hour, COUNT(*) FROM detections "
+                     "WHERE Date = ? AND Com_Name = ? GROUP BY hour", [params["today"], com_name]).fetchall()
+
+
+# endpoint: (implementation before the upgrade, implementation after the upgrade)
+ENDPOINTS = {
+    "GET /api/species/stats": (
+        stats_per_species,
+        lambda conn, params: queries.species_stats(conn),
+    ),
+    "GET /api/species/today": (
+        today_per_species,
+        lambda conn, params: queries.species_today(conn, params["today"]),
+    ),
+}
+
+
+def build(db_path: str, rows: int, days: int, species: int) -> None:
+    """Fill db_path with `rows` random detections over the last `days` days."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(CREATE_SQL)
+    rng = random.Random(42)
+    names = [(f"Genus species{i}", f"Common Bird {i}") for i in range(species)]
+    # a few species make up most detections, like in real data
+    weights = [1 / (i + 1) for i in range(species)]
+    today = date.today()
+    batch = []
+    for _ in range(rows):
+        sci_name, com_name = rng.choices(names, weights)[0]
+        day = (today - timedelta(days=rng.randrange(days))).isoformat()
+        seconds = rng.randrange(86400)
+        time_of_day = f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        confidence = round(rng.uniform(0.7, 1.0), 4)
+        batch.append((day, time_of_day, sci_name, com_name, confidence, 50.0, 5.0, 0.7, 1, 1.25, 0.0,
+                      f"{com_name.replace(' ', '_')}-{int(confidence * 100)}-{day}-birdnet-{time_of_day}.mp3"))
+        if len(batch) == 10000:
+            conn.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    conn.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def time_queries(conn: sqlite3.Connection, which: int, repeat: int) -> dict[str, float]:
+    """Best-of-`repeat` milliseconds for every query."""
+    com_name, sci_name, confidence = conn.execute(
+        "SELECT Com_Name, Sci_Name, MAX(Confidence) FROM detections GROUP BY Com_Name ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+    offset = conn.execute("SELECT COUNT(*) FROM detections").fetchone()[0] // 2
+    # the cursor of the page at offset
+    ts, rowid = conn.execute("SELECT CAST(strftime('%s', Date || ' ' || Time) AS INTEGER), ROWID FROM detections "
+                             "ORDER BY Date DESC, Time DESC LIMIT 1 OFFSET ?", [offset]).fetchone()
+    # the species table comes with the upgrade
+    species_id = conn.execute("SELECT Species_Id FROM species WHERE Sci_Name = ?", [sci_name]).fetchone()[0] if which else None
+    params = {"today": date.today().isoformat(), "com_name": com_name, "species_id": species_id, "confidence": confidence,
+              "offset": offset, "ts": ts, "rowid": rowid}
+    results = {}
+    for name, sql in QUERIES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            conn.execute(sql[which], params).fetchall()
+            best = min(best, time.perf_counter() - t0)
+        results[name] = best * 1000
+    return results
+
+
+def time_endpoints(conn: sqlite3.Connection, which: int, repeat: int) -> dict[str, tuple[int, float]]:
+    """Statements run and best-of-`repeat` milliseconds for every endpoint."""
+    params = {"today": date.today().isoformat()}
+    statements = []
+    results = {}
+    for name, implementations in ENDPOINTS.items():
+        best = float("inf")
+        for _ in range(repeat):
+            statements.clear()
+            conn.set_trace_callback(statements.append)
+            t0 = time.perf_counter()
+            implementations[which](conn, params)
+            best = min(best, time.perf_counter() - t0)
+            conn.set_trace_callback(None)
+        results[name] = (len(statements), best * 1000)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the API queries before and after the schema upgrade.")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Number of detections (default: 2000000)")
+    parser.add_argument("--days", type=int, default=1080, help="Days of detections (default: 1080)")
+    parser.add_argument("--species", type=int, default=250, help="Number of species (default: 250)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query, the best is reported (default: 3)")
+    parser.add_argument("--db", help="Keep the synthetic database at this path")
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    db_path = args.db
+    if db_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, "birds.db")
+    elif os.path.exists(db_path):
+        print(f"Error: {db_path} exists", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        t0 = time.monotonic()
+        build(db_path, args.rows, args.days, args.species)
+        print(f"Built {args.rows} detections in {time.monotonic() - t0:.1f}s")
+
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        before = time_queries(conn, 0, args.repeat)
+        endpoints_before = time_endpoints(conn, 0, args.repeat)
+        t0 = time.monotonic()
+        upgrade(conn)
+        fill_species_ids(conn)
+        conn.execute("ANALYZE")
+        print(f"Upgraded to schema version {get_version(conn)} in {time.monotonic() - t0:.1f}s")
+        after = time_queries(conn, 1, args.repeat)
+        endpoints_after = time_endpoints(conn, 1, args.repeat)
+        conn.close()
+
+        width = max(len(name) for name in QUERIES)
+        print(f"{'query':<{width}}  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}")
+        for name in QUERIES:
+            speedup = before[name] / after[name] if after[name] else float("inf")
+            print(f"{name:<{width}}  {before[name]:>10.2f}  {after[name]:>10.2f}  {speedup:>7.1f}x")
+
+        print()
+        width = max(len(name) for name in ENDPOINTS)
+        print(f"{'endpoint':<{width}}  {'queries':>7}  {'before ms':>10}  {'queries':>7}  {'after ms':>10}")
+        for name in ENDPOINTS:
+            (queries_before, ms_before), (queries_after, ms_after) = endpoints_before[name], endpoints_after[name]
+            print(f"{name:<{width}}  {queries_before:>7}  {ms_before:>10.2f}  {queries_after:>7}  {ms_after:>10.2f}")
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,133 +1,279 @@
+import asyncio
 import logging
 import os
 import os.path
-import re
 import signal
+import sqlite3
 import sys
 import threading
-from queue import Queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import CalledProcessError
 
 import inotify.adapters
 from inotify.constants import IN_CLOSE_WRITE
 
 from utils.analysis import load_global_model, run_analysis
-from utils.helpers import get_settings, get_wav_files, ANALYZING_NOW
+from utils.control import ControlServer
+from utils.counters import init_species_counts
+from utils.helpers import get_settings, is_recording, BacklogScanner, ANALYZING_NOW, DB_PATH
+from utils.journal import Journal
+from utils.lanes import LaneScheduler
+from utils.notifications import stop_dispatcher
 from utils.classes import ParseFileName
-from utils.reporting import extract_detection, summary, write_to_file, write_to_db, apprise, bird_weather, heartbeat, \
-    update_json_file
-
-shutdown = False
+from utils.schema import upgrade_db
+from utils.reporting import extract_detection, extracted_file_name, summary
+from utils.sinks import SinkManager
+from utils.staging import StagingRing
 
 log = logging.getLogger(__name__)
 
+# seconds between flushes of the buffering sinks; their own flush_interval decides whether they flush
+FLUSH_SECONDS = 10
 
-def sig_handler(sig_num, curr_stack_frame):
-    global shutdown
-    log.info('Caught shutdown signal %d', sig_num)
-    shutdown = True
 
+class AnalysisService:
+    """Analyzes the recordings in StreamData and reports the detections.
 
-def main():
-    load_global_model()
-    conf = get_settings()
-    i = inotify.adapters.Inotify()
-    i.add_watch(os.path.join(conf['RECS_DIR'], 'StreamData'), mask=IN_CLOSE_WRITE)
-
-    backlog = get_wav_files()
-
-    report_queue = Queue()
-    thread = threading.Thread(target=handle_reporting_queue, args=(report_queue, ))
-    thread.start()
-
-    log.info('backlog is %d', len(backlog))
-    for file_name in backlog:
-        process_file(file_name, report_queue)
-        if shutdown:
-            break
-    log.info('backlog done')
-
-    empty_count = 0
-    for event in i.event_gen():
-        if shutdown:
-            break
-
-        if event is None:
-            if empty_count > (conf.getint('RECORDING_LENGTH') * 2 + 30):
-                log.error('no more notifications: restarting...')
+    One event loop drives everything: new segments from inotify (read in a thread), the backlog,
+    periodic sink flushes, a rescan for segments inotify missed and the control socket. Inference
+    runs in a single-thread executor, as the model interpreter is global. Reporting runs in another
+    one, so the next file is analyzed while the previous one is being reported.
+    """
+
+    def __init__(self):
+        self.conf = get_settings()
+        self.stream_dir = os.path.join(self.conf['RECS_DIR'], 'StreamData')
+        self.journal = Journal()
+        self.sinks = SinkManager()
+        self.scheduler = LaneScheduler(lag_warning=self.conf.getint('RECORDING_LENGTH') * 2 + 30)
+        self.scanner = BacklogScanner(self.conf['RECS_DIR'])
+        self.staging = StagingRing(self.conf['RECS_DIR'], self.conf.getint('STAGING_SEGMENTS', fallback=0))
+        self.control = ControlServer({'status': self.status, 'rescan': self.request_rescan})
+        self._inference = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self._reporting = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reporting')
+        # files queued or in progress, so a file inotify and the rescan both found is analyzed once
+        self._known = set()
+        self._analyzing = None
+        self._report_task = None
+        self._started = time.time()
+        self._stopping = False
+        self._loop = None
+        self._wakeup = None
+        self._stop = None
+        self._rescan = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._rescan = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self._loop.add_signal_handler(sig, self.stop, sig)
+
+        # watch before scanning, so nothing finishes unseen in between
+        i = inotify.adapters.Inotify()
+        i.add_watch(self.stream_dir, mask=IN_CLOSE_WRITE)
+        threading.Thread(target=self._watch, args=(i,), name='inotify', daemon=True).start()
+        self.staging.check_mount()
+
+        unfinished = self.journal.unfinished()
+        resumed = {file.file_name for file, _ in unfinished}
+        self._known.update(resumed)
+        backlog = [file_name for file_name in self.scanner.scan() if file_name not in resumed]
+        await self.control.start()
+
+        log.info('resuming reporting for %d files', len(unfinished))
+        for file, detections in unfinished:
+            if not os.path.exists(file.file_name):
+                log.warning('Cannot resume reporting, recording is gone: %s', file.file_name)
+                self.journal.completed(file)
+                self._known.discard(file.file_name)
+                continue
+            await self._report(file, detections)
+
+        log.info('backlog is %d', len(backlog))
+        for file_name in backlog:
+            self.enqueue(file_name)
+
+        timers = [asyncio.create_task(self._flush_timer()), asyncio.create_task(self._rescan_timer())]
+        analyzer = asyncio.create_task(self._analyze_loop())
+        await self._stop.wait()
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        # the file being analyzed is finished and reported first
+        await analyzer
+        if self._report_task is not None:
+            await self._report_task
+        await self._loop.run_in_executor(self._reporting, self.sinks.close)
+        await self.control.stop()
+        log.info('lanes: %s', self.scheduler.get_stats())
+        self._inference.shutdown()
+        self._reporting.shutdown()
+        stop_dispatcher(timeout=30)
+
+    def stop(self, sig_num=None):
+        if sig_num is not None:
+            log.info('Caught shutdown signal %d', sig_num)
+        self._stopping = True
+        self._stop.set()
+        self._wakeup.set()
+
+    def enqueue(self, file_name):
+        if file_name in self._known:
+            return
+        self._known.add(file_name)
+        if self.staging.is_staged(file_name) and self.staging.is_full(sum(map(self.staging.is_staged, self._known)) - 1):
+            asyncio.create_task(self._spill(file_name))
+            return
+        self.scheduler.put(file_name)
+        self._wakeup.set()
+
+    async def _spill(self, file_name):
+        try:
+            new_name = await self._loop.run_in_executor(None, self.staging.spill, file_name)
+        except OSError as e:
+            log.error('Cannot spill %s, analyzing it from StreamData: %s', file_name, e)
+            self.scheduler.put(file_name)
+            self._wakeup.set()
+            return
+        self._known.discard(file_name)
+        self.enqueue(new_name)
+
+    def _watch(self, i):
+        for event in i.event_gen():
+            if self._stopping:
                 break
-            empty_count += 1
-            continue
+            if event is None:
+                continue
+            (_, type_names, path, file_name) = event
+            if not is_recording(file_name):
+                continue
+            log.debug("PATH=[%s] FILENAME=[%s] EVENT_TYPES=%s", path, file_name, type_names)
+            self._loop.call_soon_threadsafe(self.enqueue, os.path.join(path, file_name))
+
+    async def _analyze_loop(self):
+        while not self._stopping:
+            file_name = self.scheduler.get(timeout=0)
+            if file_name is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._analyzing = file_name
+            start = time.monotonic()
+            try:
+                result = await self._loop.run_in_executor(self._inference, analyze_file, file_name, self.journal)
+            finally:
+                self.scheduler.done(file_name, time.monotonic() - start)
+                self._analyzing = None
+            if result is None:
+                self._known.discard(file_name)
+                continue
+            if self._report_task is not None:
+                if not self._report_task.done():
+                    log.warning('reporting not yet done')
+                # don't let reporting get behind
+                await self._report_task
+            self._report_task = asyncio.create_task(self._report(*result))
+
+    async def _report(self, file, detections):
+        try:
+            await self._loop.run_in_executor(self._reporting, report_file, file, detections, self.sinks, self.journal)
+        finally:
+            self._known.discard(file.file_name)
 
-        (_, type_names, path, file_name) = event
-        if re.search('.wav$', file_name) is None:
-            continue
-        log.debug("PATH=[%s] FILENAME=[%s] EVENT_TYPES=%s", path, file_name, type_names)
+    async def _flush_timer(self):
+        while True:
+            await asyncio.sleep(FLUSH_SECONDS)
+            await self._loop.run_in_executor(self._reporting, self.sinks.flush)
 
-        file_path = os.path.join(path, file_name)
-        if file_path in backlog:
-            # if we're very lucky, the first event could be for the file in the backlog that finished
-            # while running get_wav_files()
-            backlog = []
-            continue
+    async def _rescan_timer(self):
+        # instead of restarting when inotify has been quiet for too long
+        interval = self.conf.getint('RECORDING_LENGTH') * 2 + 30
+        while True:
+            try:
+                await asyncio.wait_for(self._rescan.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._rescan.clear()
+            files = await self._loop.run_in_executor(None, self.scanner.scan)
+            missed = [file_name for file_name in files if file_name not in self._known]
+            # the files whose reporting failed are reported again from their journaled detections,
+            # instead of being analyzed again
+            unfinished = {file.file_name: (file, detections) for file, detections in self.journal.unfinished()}
+            resumed = [file_name for file_name in missed if file_name in unfinished]
+            missed = [file_name for file_name in missed if file_name not in unfinished]
+            if resumed:
+                log.warning('resuming reporting for %d files', len(resumed))
+            if missed:
+                log.warning('found %d recordings inotify missed', len(missed))
+            for file_name in missed:
+                self.enqueue(file_name)
+            for file_name in resumed:
+                self._known.add(file_name)
+                await self._report(*unfinished[file_name])
 
-        process_file(file_path, report_queue)
-        empty_count = 0
+    def request_rescan(self):
+        self._rescan.set()
+        return {'status': 'rescan requested'}
 
-    # we're all done
-    report_queue.put(None)
-    thread.join()
-    report_queue.join()
+    def status(self):
+        return {
+            'uptime': round(time.time() - self._started),
+            'analyzing': self._analyzing,
+            'reporting': self._report_task is not None and not self._report_task.done(),
+            'staged': sum(map(self.staging.is_staged, self._known)),
+            'spilling': self.staging.spilling,
+            'lanes': self.scheduler.get_stats(),
+            'sinks': self.sinks.get_stats(),
+        }
 
 
-def process_file(file_name, report_queue):
+def analyze_file(file_name, journal):
+    """Run inference on a recording; returns (file, detections), or None when there's nothing to report."""
     try:
         if os.path.getsize(file_name) == 0:
             os.remove(file_name)
-            return
+            return None
         log.info('Analyzing %s', file_name)
         with open(ANALYZING_NOW, 'w') as analyzing:
             analyzing.write(file_name)
         file = ParseFileName(file_name)
         detections = run_analysis(file)
-        # we join() to make sure te reporting queue does not get behind
-        if not report_queue.empty():
-            log.warning('reporting queue not yet empty')
-        report_queue.join()
-        report_queue.put((file, detections))
+        journal.analyzed(file, detections)
+        return file, detections
     except BaseException as e:
         stderr = e.stderr.decode('utf-8') if isinstance(e, CalledProcessError) else ""
         log.exception(f'Unexpected error: {stderr}', exc_info=e)
+        return None
 
 
-def handle_reporting_queue(queue):
-    while True:
-        msg = queue.get()
-        # check for signal that we are done
-        if msg is None:
-            break
+def report_file(file, detections, sinks, journal):
+    try:
+        # the database row and the live feed don't need the clip, only its name
+        for detection in detections:
+            detection.file_name_extr = extracted_file_name(file, detection)
+        sinks.on_detections(file, detections, journal)
+        for detection in detections:
+            extract_detection(file, detection)
+            log.info('%s;%s', summary(file, detection), os.path.basename(detection.file_name_extr))
+        sinks.on_file(file, detections, journal)
+        os.remove(file.file_name)
+        journal.completed(file)
+    except BaseException as e:
+        stderr = e.stderr.decode('utf-8') if isinstance(e, CalledProcessError) else ""
+        log.exception(f'Unexpected error: {stderr}', exc_info=e)
+
 
-        file, detections = msg
-        try:
-            update_json_file(file, detections)
-            for detection in detections:
-                detection.file_name_extr = extract_detection(file, detection)
-                log.info('%s;%s', summary(file, detection), os.path.basename(detection.file_name_extr))
-                write_to_file(file, detection)
-                write_to_db(file, detection)
-            apprise(file, detections)
-            bird_weather(file, detections)
-            heartbeat()
-            os.remove(file.file_name)
-        except BaseException as e:
-            stderr = e.stderr.decode('utf-8') if isinstance(e, CalledProcessError) else ""
-            log.exception(f'Unexpected error: {stderr}', exc_info=e)
-
-        queue.task_done()
-
-    # mark the 'None' signal as processed
-    queue.task_done()
-    log.info('handle_reporting_queue done')
+def main():
+    try:
+        upgrade_db(DB_PATH)
+    except sqlite3.Error as e:
+        log.error('Cannot upgrade the database: %s', e)
+    load_global_model()
+    init_species_counts()
+    asyncio.run(AnalysisService().run())
 
 
 def setup_logging():
@@ -142,9 +288,6 @@ def setup_logging():
 
 
 if __name__ == '__main__':
-    signal.signal(signal.SIGINT, sig_handler)
-    signal.signal(signal.SIGTERM, sig_handler)
-
     setup_logging()
 
     main()
@@ -4,7 +4,7 @@ source /etc/birdnet/birdnet.conf
 
 loop_ffmpeg(){
   while true;do
-    if ! ffmpeg -hide_banner -loglevel $LOGGING_LEVEL -nostdin ${1} -i ${2} -vn -map a:0 -acodec pcm_s16le -ac 2 -ar 48000 -f segment -segment_format wav -segment_time ${RECORDING_LENGTH} -strftime 1 ${RECS_DIR}/StreamData/%F-birdnet-RTSP_${3}-%H:%M:%S.wav
+    if ! ffmpeg -hide_banner -loglevel $LOGGING_LEVEL -nostdin ${1} -i ${2} -vn -map a:0 -acodec ${ACODEC} -ac 2 -ar 48000 -f segment -segment_format ${RECORDING_FORMAT} -segment_time ${RECORDING_LENGTH} -strftime 1 ${RECS_DIR}/StreamData/%F-birdnet-RTSP_${3}-%H:%M:%S.${RECORDING_FORMAT}
     then
       sleep 1
     fi
@@ -22,6 +22,7 @@ if [ "$LOGGING_LEVEL" == "info" ] || [ "$LOGGING_LEVEL" == "debug" ];then
 fi
 
 [ -z $RECORDING_LENGTH ] && RECORDING_LENGTH=15
+[ "$RECORDING_FORMAT" == "flac" ] && ACODEC=flac || { RECORDING_FORMAT=wav; ACODEC=pcm_s16le; }
 [ -d $RECS_DIR/StreamData ] || mkdir -p $RECS_DIR/StreamData
 
 if [ -n "${RTSP_STREAM}" ];then
@@ -49,6 +50,12 @@ else
   if ! pulseaudio --check;then pulseaudio --start;fi
   if pgrep arecord &> /dev/null ;then
     echo "Recording"
+  elif [ "$RECORDING_FORMAT" == "flac" ];then
+    # arecord can't write FLAC: let ffmpeg encode and cut the segments
+    [ -z ${REC_CARD} ] && DEVICE_PARAM="" || DEVICE_PARAM="-D ${REC_CARD}"
+    arecord -f S16_LE -c${CHANNELS} -r48000 -t raw ${DEVICE_PARAM} |\
+      ffmpeg -hide_banner -loglevel $LOGGING_LEVEL -nostdin -f s16le -ar 48000 -ac ${CHANNELS} -i - -acodec flac\
+        -f segment -segment_format flac -segment_time ${RECORDING_LENGTH} -strftime 1 ${RECS_DIR}/StreamData/%F-birdnet-%H:%M:%S.flac
   else
     if [ -z ${REC_CARD} ];then
       arecord -f S16_LE -c${CHANNELS} -r48000 -t wav --max-file-time ${RECORDING_LENGTH}\
@@ -15,6 +15,7 @@ echo "Removing all data . . . "
 sudo rm -drf "${RECS_DIR}"
 sudo rm -f "${IDFILE}"
 sudo rm -f $(dirname ${my_dir})/BirdDB.txt
+sudo rm -drf ${my_dir}/detections_archive
 
 echo "Re-creating necessary directories"
 [ -d ${EXTRACTED} ] || sudo -u ${USER} mkdir -p ${EXTRACTED}
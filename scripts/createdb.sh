@@ -2,6 +2,16 @@
 source /etc/birdnet/birdnet.conf
 sqlite3 $HOME/BirdNET-Pi/scripts/birds.db << EOF
 DROP TABLE IF EXISTS detections;
+DROP TABLE IF EXISTS daily_species;
+DROP TABLE IF EXISTS hourly_species;
+DROP TABLE IF EXISTS detections_changes;
+DROP TABLE IF EXISTS archived_months;
+DROP VIEW IF EXISTS species_detections;
+DROP TABLE IF EXISTS species_labels;
+DROP TABLE IF EXISTS species_search;
+DROP TABLE IF EXISTS species_names;
+DROP TABLE IF EXISTS species;
+PRAGMA user_version = 0;
 CREATE TABLE IF NOT EXISTS detections (
   Date DATE,
   Time TIME,
@@ -19,5 +29,6 @@ CREATE INDEX "detections_Com_Name" ON "detections" ("Com_Name");
 CREATE INDEX "detections_Sci_Name" ON "detections" ("Sci_Name");
 CREATE INDEX "detections_Date_Time" ON "detections" ("Date" DESC, "Time" DESC);
 EOF
+$HOME/BirdNET-Pi/birdnet/bin/python3 $HOME/BirdNET-Pi/scripts/db_upgrade.py
 chown $USER:$USER $HOME/BirdNET-Pi/scripts/birds.db
 chmod g+w $HOME/BirdNET-Pi/scripts/birds.db
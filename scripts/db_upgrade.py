@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Upgrade the detections database to the current schema version.
+
+The upgrade also loads the species names and label indexes of the model files into the species
+tables and sets the species keys of the detections from before schema version 6.
+
+Usage:
+    python scripts/db_upgrade.py [--db DB_PATH] [--model-dir DIR] [--check | --verify | --rebuild-rollups]
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from utils.helpers import DB_PATH, MODEL_PATH, get_settings
+from utils.schema import LATEST_VERSION, get_version, rebuild_rollups, upgrade_db, verify_rollups
+from utils.species_names import fill_species_ids, load_labels, load_model_labels
+
+
+def database_lang() -> str:
+    try:
+        return get_settings()['DATABASE_LANG']
+    except (OSError, KeyError):
+        return 'en'
+
+
+def main(argv: list[str] | None = None) -> None:
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Upgrade the BirdNET-Pi detections database.")
+    parser.add_argument("--db", default=DB_PATH, help=f"Path to SQLite database (default: {DB_PATH})")
+    parser.add_argument("--model-dir", default=MODEL_PATH,
+                        help=f"Model label files with the species names (default: {MODEL_PATH})")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true", help="Only print the schema version")
+    group.add_argument("--verify", action="store_true", help="Compare the rollup tables with the detections")
+    group.add_argument("--rebuild-rollups", action="store_true", help="Recount the rollup tables from the detections")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    try:
+        if args.check:
+            con = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+            version = get_version(con)
+            con.close()
+            print(f"Schema version {version} (current is {LATEST_VERSION})")
+            sys.exit(0 if version == LATEST_VERSION else 1)
+
+        if args.verify:
+            con = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+            mismatches = verify_rollups(con)
+            con.close()
+            for table, rows in mismatches.items():
+                print(f"{table}: {len(rows)} rows differ")
+                for row in rows[:10]:
+                    print(f"  {row}")
+            sys.exit(1 if any(mismatches.values()) else 0)
+
+        if args.rebuild_rollups:
+            con = sqlite3.connect(args.db, timeout=60)
+            t0 = time.monotonic()
+            with con:
+                rebuild_rollups(con)
+            con.close()
+            print(f"Rebuilt the rollup tables in {time.monotonic() - t0:.2f}s")
+            sys.exit(0)
+
+        t0 = time.monotonic()
+        applied = upgrade_db(args.db)
+        if applied:
+            print(f"Upgraded to schema version {applied[-1]} in {time.monotonic() - t0:.2f}s")
+        else:
+            print(f"Schema version {LATEST_VERSION} is current")
+
+        t0 = time.monotonic()
+        con = sqlite3.connect(args.db, timeout=60, isolation_level=None)
+        try:
+            added = load_labels(con, os.path.join(args.model_dir, "l18n"), database_lang())
+            models = load_model_labels(con, args.model_dir)
+            filled = fill_species_ids(con)
+        finally:
+            con.close()
+        print(f"Loaded the species names and labels of {models} models, {added} new species, "
+              f"set the species of {filled} detections in {time.monotonic() - t0:.2f}s")
+    except (sqlite3.Error, OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -107,6 +107,9 @@ APPRISE_NOTIFY_NEW_SPECIES_EACH_DAY=0
 APPRISE_MINIMUM_SECONDS_BETWEEN_NOTIFICATIONS_PER_SPECIES=0
 APPRISE_ONLY_NOTIFY_SPECIES_NAMES=""
 APPRISE_ONLY_NOTIFY_SPECIES_NAMES_2=""
+## APPRISE_COALESCE_SECONDS groups the notifications raised within this many
+## seconds into a single message. 0 sends every notification on its own.
+APPRISE_COALESCE_SECONDS=0
 
 #----------------------  Image Provider Configuration ------------------------#
 ## WIKIPEDIA or FLICKR (Flickr requires API key)
@@ -149,6 +152,12 @@ PURGE_THRESHOLD=95
 
 MAX_FILES_SPECIES=0
 
+## ARCHIVE_AFTER_MONTHS moves the detections of months that ended more than this
+## many months ago from the database to a Parquet archive, once a month.
+## They stay in the charts and the species statistics (0 = keep all in the database)
+
+ARCHIVE_AFTER_MONTHS=0
+
 ################################################################################
 #--------------------------------  Defaults  ----------------------------------#
 ################################################################################
@@ -233,6 +242,12 @@ PRIVACY_THRESHOLD=0
 
 RECORDING_LENGTH=15
 
+## RECORDING_FORMAT is the format of the recordings waiting for analysis: wav or
+## flac. FLAC recordings are about half the size, at the cost of some CPU to
+## encode them.
+
+RECORDING_FORMAT=wav
+
 ## EXTRACTION_LENGTH sets the length of the audio extractions that will be made
 ## from each BirdNET-Lite detection. An empty value will use the default of 6
 ## seconds.
@@ -259,6 +274,18 @@ DATABASE_LANG=en
 
 HEARTBEAT_URL=
 
+## FIELD_STATION_API_URL is where the analysis posts new detections for the
+## live feed of the API. Leave empty to not publish detections.
+
+FIELD_STATION_API_URL=http://localhost:8003
+
+## STAGING_SEGMENTS is the number of recordings that may wait for analysis in
+## the RAM disk (StreamData). When the analysis falls behind, newer recordings
+## are moved to $RECS_DIR/Spill on disk and analyzed from there.
+## 0 keeps every waiting recording in RAM.
+
+STAGING_SEGMENTS=0
+
 ## SILENCE_UPDATE_INDICATOR is for quieting the display of how many commits
 ## your installation is behind by, relative to the Github repo. This number
 ## appears next to "Tools" when you're 50 or more commits behind.
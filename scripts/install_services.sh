@@ -423,6 +423,10 @@ install_automatic_update_cron() {
   sed "s/\$USER/$USER/g" $my_dir/templates/automatic_update.cron >> /etc/crontab
 }
 
+install_archive_cron() {
+  sed "s/\$USER/$USER/g" $my_dir/templates/archive_detections.cron >> /etc/crontab
+}
+
 chown_things() {
   chown -R $USER:$USER $HOME/Bird*
 }
@@ -460,6 +464,7 @@ install_services() {
   install_cleanup_cron
   install_weekly_cron
   install_automatic_update_cron
+  install_archive_cron
   increase_caddy_timeout
 
   create_necessary_dirs
@@ -13,7 +13,7 @@ from sqlite3 import Connection
 import plotly.express as px
 from sklearn.preprocessing import normalize
 from suntime import Sun
-from utils.helpers import get_settings
+from utils.helpers import ARCHIVE_DIR, get_settings
 
 profile = False
 debug = False
@@ -73,7 +73,12 @@ def get_todays_count(conn):
 @st.cache_data(ttl=300)
 def get_data(_conn: Connection, flush_cache):
     print_now('** get_data **')
-    df1 = pd.read_sql("SELECT Date, Time, Sci_Name, Com_Name, Confidence, File_Name FROM detections", con=_conn)
+    columns = ['Date', 'Time', 'Sci_Name', 'Com_Name', 'Confidence', 'File_Name']
+    df1 = pd.read_sql(f"SELECT {', '.join(columns)} FROM detections", con=_conn)
+    # the closed months moved to the Parquet archive by archive_detections.py
+    if os.path.isdir(ARCHIVE_DIR) and any(files for _, _, files in os.walk(ARCHIVE_DIR)):
+        archived = pd.read_parquet(ARCHIVE_DIR, columns=columns)
+        df1 = pd.concat([archived.sort_values(['Date', 'Time']), df1], ignore_index=True)
     return df1
 
 
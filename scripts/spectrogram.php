@@ -46,8 +46,8 @@ if(isset($_GET['ajax_csv'])) {
     foreach ($files as $file_idx => $stream_file_name) {
         //Skip the folder hierarchy entries
         if ($stream_file_name != "." && $stream_file_name != "..") {
-            //See if the filename contains the correct RTSP name, also only check .wav.csv files
-            if (stripos($stream_file_name, 'RTSP_' . $RTSP_STREAM_LISTENED_TO) !== false && stripos($stream_file_name, '.wav.json') !== false) {
+            //See if the filename contains the correct RTSP name, also only check .wav.json or .flac.json files
+            if (stripos($stream_file_name, 'RTSP_' . $RTSP_STREAM_LISTENED_TO) !== false && (stripos($stream_file_name, '.wav.json') !== false || stripos($stream_file_name, '.flac.json') !== false)) {
                 //Found a match - set it as the newest file
                 $newest_file = $stream_file_name;
             }
@@ -133,6 +133,26 @@ if ! grep -E '^IMAGE_PROVIDER=' /etc/birdnet/birdnet.conf &>/dev/null;then
   echo "IMAGE_PROVIDER=${PROVIDER}" >> /etc/birdnet/birdnet.conf
 fi
 
+if ! grep -E '^APPRISE_COALESCE_SECONDS=' /etc/birdnet/birdnet.conf &>/dev/null;then
+  echo "APPRISE_COALESCE_SECONDS=0" >> /etc/birdnet/birdnet.conf
+fi
+
+if ! grep -E '^FIELD_STATION_API_URL=' /etc/birdnet/birdnet.conf &>/dev/null;then
+  echo "FIELD_STATION_API_URL=http://localhost:8003" >> /etc/birdnet/birdnet.conf
+fi
+
+if ! grep -E '^STAGING_SEGMENTS=' /etc/birdnet/birdnet.conf &>/dev/null;then
+  echo "STAGING_SEGMENTS=0" >> /etc/birdnet/birdnet.conf
+fi
+
+if ! grep -E '^RECORDING_FORMAT=' /etc/birdnet/birdnet.conf &>/dev/null;then
+  echo "RECORDING_FORMAT=wav" >> /etc/birdnet/birdnet.conf
+fi
+
+if ! grep -E '^ARCHIVE_AFTER_MONTHS=' /etc/birdnet/birdnet.conf &>/dev/null;then
+  echo "ARCHIVE_AFTER_MONTHS=0" >> /etc/birdnet/birdnet.conf
+fi
+
 if grep -E '^DATABASE_LANG=zh$' /etc/birdnet/birdnet.conf &>/dev/null;then
   sed -i --follow-symlinks -E 's/^DATABASE_LANG=zh/DATABASE_LANG=zh_CN/' /etc/birdnet/birdnet.conf
   install_language_label.sh
@@ -246,11 +266,12 @@ if [ -L /usr/local/bin/birdnet_analysis.sh ];then
 fi
 
 # Clean state and update cron if all scripts are not installed
-if [ "$(grep -o "#birdnet" /etc/crontab | wc -l)" -lt 6 ]; then
+if [ "$(grep -o "#birdnet" /etc/crontab | wc -l)" -lt 7 ]; then
   sudo sed -i '/birdnet/,+1d' /etc/crontab
   sed "s/\$USER/$USER/g" "$HOME"/BirdNET-Pi/templates/cleanup.cron >> /etc/crontab
   sed "s/\$USER/$USER/g" "$HOME"/BirdNET-Pi/templates/weekly_report.cron >> /etc/crontab
   sed "s/\$USER/$USER/g" "$HOME"/BirdNET-Pi/templates/automatic_update.cron >> /etc/crontab
+  sed "s/\$USER/$USER/g" "$HOME"/BirdNET-Pi/templates/archive_detections.cron >> /etc/crontab
 fi
 
 set +x
@@ -265,9 +286,7 @@ if [ -L $HOME/BirdNET-Pi/model/labels.txt ]; then
   sudo_with_user install_language_label.sh
 fi
 
-sqlite3 $HOME/BirdNET-Pi/scripts/birds.db << EOF
-CREATE INDEX IF NOT EXISTS "detections_Sci_Name" ON "detections" ("Sci_Name");
-EOF
+sudo -u $USER $HOME/BirdNET-Pi/birdnet/bin/python3 $HOME/BirdNET-Pi/scripts/db_upgrade.py
 
 # update snippets above
 
@@ -0,0 +1,95 @@
+"""The Parquet archive of the detections of closed months.
+
+Each archived month is a hive partition ARCHIVE_DIR/year=YYYY/month=MM holding one or
+more part-<first id>-<last id>.parquet files, sorted by species and time.
+"""
+import os
+import sqlite3
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROW_GROUP_SIZE = 16384
+
+SCHEMA = pa.schema([
+    ("Id", pa.int64()),
+    ("Date", pa.string()),
+    ("Time", pa.string()),
+    ("Sci_Name", pa.string()),
+    ("Com_Name", pa.string()),
+    ("Confidence", pa.float64()),
+    ("Lat", pa.float64()),
+    ("Lon", pa.float64()),
+    ("Cutoff", pa.float64()),
+    ("Week", pa.int64()),
+    ("Sens", pa.float64()),
+    ("Overlap", pa.float64()),
+    ("File_Name", pa.string()),
+])
+
+
+def first_open_month(today: date, keep_months: int) -> str:
+    """The oldest month (YYYY-MM) that is kept in birds.db."""
+    months = today.year * 12 + today.month - 1 - keep_months
+    return f"{months // 12:04d}-{months % 12 + 1:02d}"
+
+
+def months_to_archive(con: sqlite3.Connection, keep_months: int, today: date | None = None) -> list[str]:
+    """The months (YYYY-MM) with detections that are old enough to be archived."""
+    before = first_open_month(today or date.today(), keep_months)
+    rows = con.execute(
+        "SELECT DISTINCT substr(Date, 1, 7) AS Month FROM detections WHERE Date < ? ORDER BY Month",
+        [f"{before}-01"],
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def partition_dir(archive_dir: str, month: str) -> str:
+    year, month_of_year = month.split("-")
+    return os.path.join(archive_dir, f"year={year}", f"month={month_of_year}")
+
+
+def write_parquet(path: str, rows: list[tuple]) -> None:
+    """Write rows atomically: readers never see a partial file."""
+    table = pa.Table.from_pylist([dict(zip(SCHEMA.names, row)) for row in rows], schema=SCHEMA)
+    # hidden until it is complete: readers skip names starting with a dot
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression="zstd", write_page_index=True)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_month(con: sqlite3.Connection, month: str, archive_dir: str) -> int:
+    """Move the detections of month to the archive; returns the number of detections.
+
+    The rows are deleted in the transaction that read them, so nothing written
+    in the meantime is lost. If it is interrupted after the Parquet file is
+    written, the next run writes the same rows to the same file again.
+    """
+    start, end = f"{month}-01", f"{month}-31"
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        rows = con.execute(
+            "SELECT ROWID, Date, Time, Sci_Name, Com_Name, Confidence, Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name "
+            "FROM detections WHERE Date BETWEEN ? AND ? ORDER BY Com_Name, Date, Time",
+            [start, end],
+        ).fetchall()
+        if rows:
+            ids = [row[0] for row in rows]
+            directory = partition_dir(archive_dir, month)
+            os.makedirs(directory, exist_ok=True)
+            write_parquet(os.path.join(directory, f"part-{min(ids)}-{max(ids)}.parquet"), rows)
+            # before the delete: the rollup triggers leave the archived months alone
+            con.execute(
+                "INSERT INTO archived_months (Month, Rows) VALUES (?, ?) "
+                "ON CONFLICT (Month) DO UPDATE SET Rows = Rows + excluded.Rows, Archived_At = excluded.Archived_At",
+                [month, len(rows)],
+            )
+            con.execute("DELETE FROM detections WHERE Date BETWEEN ? AND ?", [start, end])
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    return len(rows)
@@ -21,6 +21,7 @@ class Detection:
         self.common_name = common_name
         self.common_name_safe = self.common_name.replace("'", "").replace(" ", "_")
         self.file_name_extr = None
+        self.row_id = None
 
     def __str__(self):
         return f'Detection({self.species}, {self.common_name}, {self.confidence}, {self.iso8601})'
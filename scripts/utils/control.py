@@ -0,0 +1,53 @@
+import asyncio
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+CONTROL_SOCKET = os.path.expanduser('~/BirdNET-Pi/analysis.sock')
+
+
+class ControlServer:
+    """A local unix socket answering one-line commands with one line of JSON.
+
+    e.g. `echo status | socat - UNIX-CONNECT:$HOME/BirdNET-Pi/analysis.sock`
+    """
+
+    def __init__(self, commands, path=CONTROL_SOCKET):
+        self.commands = commands
+        self.path = path
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            # left behind by a previous run
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            line = await reader.readline()
+            command = line.decode('utf-8', errors='replace').strip()
+            handler = self.commands.get(command)
+            if handler is None:
+                reply = {'error': f'unknown command {command!r}', 'commands': sorted(self.commands)}
+            else:
+                try:
+                    reply = handler()
+                except Exception as e:
+                    log.exception('Control command %s failed', command, exc_info=e)
+                    reply = {'error': str(e)}
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,70 @@
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from .db import get_daily_counts_since
+
+log = logging.getLogger(__name__)
+
+_species_counts = None
+
+
+class SpeciesCounts:
+    """Per-species detection counts per day over a rolling window.
+
+    Seeded from the database once and then kept up to date by the reporting pipeline, so the
+    notification rules can answer 'first today' and 'only N times in 7 days' without a query.
+    Detections deleted from the web UI are not seen until the next restart.
+    """
+
+    def __init__(self, days=7):
+        self.days = days
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def seed(self):
+        with self._lock:
+            self._days = {}
+            for day, sci_name, count in get_daily_counts_since(self.days):
+                self._days.setdefault(day, Counter())[sci_name] += count
+
+    def add(self, day, sci_name, count=1):
+        with self._lock:
+            self._days.setdefault(day, Counter())[sci_name] += count
+            self._prune()
+
+    def today(self, sci_name):
+        with self._lock:
+            return self._days.get(self._today(), Counter())[sci_name]
+
+    def this_week(self, sci_name):
+        with self._lock:
+            self._prune()
+            return sum(counts[sci_name] for counts in self._days.values())
+
+    @staticmethod
+    def _today():
+        return datetime.now().strftime("%Y-%m-%d")
+
+    def _prune(self):
+        # same window as get_this_weeks_count_for(): DATE(today, '-7 day') onwards
+        first = (date.today() - timedelta(days=self.days)).strftime("%Y-%m-%d")
+        for day in [day for day in self._days if day < first]:
+            del self._days[day]
+
+
+def init_species_counts(days=7):
+    global _species_counts
+    counts = SpeciesCounts(days)
+    try:
+        counts.seed()
+    except Exception as e:
+        log.error('Cannot seed species counts, falling back to database queries: %s', e)
+        counts = None
+    _species_counts = counts
+    return counts
+
+
+def get_species_counts():
+    return _species_counts
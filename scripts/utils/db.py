@@ -16,10 +16,10 @@ def get_db():
     return _DB
 
 
-def get_records(select_sql):
+def get_records(select_sql, params=()):
     con = get_db()
     try:
-        cur = con.execute(select_sql)
+        cur = con.execute(select_sql, params)
         records = cur.fetchall()
     except sqlite3.Error as e:
         print(e)
@@ -40,18 +40,26 @@ def get_latest():
 
 def get_todays_count_for(sci_name):
     today = datetime.now().strftime("%Y-%m-%d")
-    select_sql = f"SELECT COUNT(*) FROM detections WHERE Date = DATE('{today}') AND Sci_Name = '{sci_name}'"
-    records = get_records(select_sql)
+    select_sql = "SELECT COUNT(*) FROM detections WHERE Date = DATE(?) AND Sci_Name = ?"
+    records = get_records(select_sql, (today, sci_name))
     return records[0][0] if records else 0
 
 
 def get_this_weeks_count_for(sci_name):
     today = datetime.now().strftime("%Y-%m-%d")
-    select_sql = f"SELECT COUNT(*) FROM detections WHERE Date >= DATE('{today}', '-7 day') AND Sci_Name = '{sci_name}'"
-    records = get_records(select_sql)
+    select_sql = "SELECT COUNT(*) FROM detections WHERE Date >= DATE(?, '-7 day') AND Sci_Name = ?"
+    records = get_records(select_sql, (today, sci_name))
     return records[0][0] if records else 0
 
 
+def get_daily_counts_since(days):
+    today = datetime.now().strftime("%Y-%m-%d")
+    select_sql = ("SELECT Date, Sci_Name, COUNT(*) FROM detections WHERE Date >= DATE(?, ?) "
+                  "GROUP BY Date, Sci_Name")
+    # unlike get_records(), let errors through: an empty result here would silence notifications
+    return get_db().execute(select_sql, (today, f'-{days} day')).fetchall()
+
+
 def get_summary():
     total_count = get_record("SELECT COUNT(*) as total_count FROM detections")
     todays_count = get_record("SELECT COUNT(*) as todays_count FROM detections WHERE Date == DATE('now', 'localtime')")
@@ -1,8 +1,7 @@
-import glob
 import json
 import os
 import re
-import subprocess
+import time
 from collections import OrderedDict
 from configparser import ConfigParser
 from itertools import chain
@@ -11,6 +10,7 @@ _settings = None
 
 BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 DB_PATH = os.path.join(BASE_PATH, 'scripts/birds.db')
+ARCHIVE_DIR = os.path.join(BASE_PATH, 'scripts/detections_archive')
 MODEL_PATH = os.path.join(BASE_PATH, 'model')
 FONT_DIR = os.path.join(BASE_PATH, 'homepage/static')
 ANALYZING_NOW = os.path.expanduser('~/BirdSongs/StreamData/analyzing_now.txt')
@@ -58,26 +58,147 @@ def get_settings(settings_path='/etc/birdnet/birdnet.conf', force_reload=False):
     return settings
 
 
+RECORDER_NAMES = ('arecord', 'ffmpeg')
+RECORDING_EXTENSIONS = ('.wav', '.flac')
+# seconds without a change before a segment nobody is known to hold open counts as finished
+STABLE_SECONDS = 5
+_TIMESTAMP_RE = re.compile(r'([0-9]+-[0-9]+-[0-9]+)-birdnet-(?:RTSP_[0-9]+-)?([0-9]+:[0-9]+:[0-9]+)')
+
+
+def get_recorder_pids():
+    pids = []
+    try:
+        entries = os.scandir('/proc')
+    except OSError:
+        return None
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry.name}/comm') as f:
+                    if f.read().strip() in RECORDER_NAMES:
+                        pids.append(entry.name)
+            except OSError:
+                # gone already
+                continue
+    return pids
+
+
 def get_open_files_in_dir(dir_name):
-    result = subprocess.run(['lsof', '-w', '-Fn', '+D', f'{dir_name}'], check=False, capture_output=True)
-    ret = result.stdout.decode('utf-8')
-    err = result.stderr.decode('utf-8')
-    if err:
-        raise RuntimeError(f'{ret}:\n {err}')
-    names = [line.lstrip('n') for line in ret.splitlines() if line.startswith('n')]
+    """The files in dir_name the recorders have open, or None when /proc can't tell us."""
+    pids = get_recorder_pids()
+    if pids is None:
+        return None
+    dir_name = os.path.join(os.path.realpath(dir_name), '')
+    names = set()
+    for pid in pids:
+        try:
+            with os.scandir(f'/proc/{pid}/fd') as fds:
+                for fd in fds:
+                    try:
+                        target = os.readlink(fd.path)
+                    except OSError:
+                        continue
+                    if target.startswith(dir_name):
+                        names.add(target)
+        except OSError:
+            # exited, or not ours to look at: fall back to the size check for what it was writing
+            return None
     return names
 
 
+def is_recording(file_name):
+    return file_name.endswith(RECORDING_EXTENSIONS)
+
+
+def recording_sort_key(file_name):
+    name = os.path.basename(file_name)
+    match = _TIMESTAMP_RE.search(name)
+    # names without a timestamp go last
+    return (match.group(1), match.group(2), name) if match else ('~', '', name)
+
+
+class BacklogScanner:
+    """Finds the recordings waiting to be analyzed, oldest first.
+
+    Recordings are in RECS_DIR/StreamData, or two levels below RECS_DIR in older installations.
+    Every scan() returns only the files that weren't returned before. Directories whose mtime
+    hasn't changed since the previous scan are not listed again. A segment in StreamData is
+    skipped while a recorder holds it open, or, when /proc can't tell, until its size and mtime
+    have settled.
+    """
+
+    def __init__(self, recs_dir=None):
+        self.recs_dir = recs_dir if recs_dir is not None else get_settings()['RECS_DIR']
+        self.stream_dir = os.path.join(self.recs_dir, 'StreamData')
+        self._dir_mtimes = {}
+        # per directory, the files already returned that are still there
+        self._returned = {}
+        self._sizes = {}
+
+    def _sub_dirs(self, dir_name):
+        try:
+            with os.scandir(dir_name) as entries:
+                return [entry.path for entry in entries if entry.is_dir()]
+        except OSError:
+            return []
+
+    def _new_wav(self, dir_name, force=False):
+        try:
+            mtime = os.stat(dir_name).st_mtime_ns
+            if not force and self._dir_mtimes.get(dir_name) == mtime:
+                return []
+            with os.scandir(dir_name) as entries:
+                files = [entry for entry in entries if is_recording(entry.name) and entry.is_file()]
+        except OSError:
+            return []
+        self._dir_mtimes[dir_name] = mtime
+        present = {entry.path for entry in files}
+        returned = self._returned.setdefault(dir_name, set())
+        returned &= present
+        return [entry for entry in files if entry.path not in returned]
+
+    def _is_finished(self, entry, open_files):
+        if open_files is not None:
+            return os.path.join(self._real_stream_dir, entry.name) not in open_files
+        stat = entry.stat()
+        previous = self._sizes.get(entry.path)
+        self._sizes[entry.path] = stat.st_size
+        return previous == stat.st_size or time.time() - stat.st_mtime > STABLE_SECONDS
+
+    def scan(self):
+        found = []
+        seen = {self.stream_dir}
+        for dir_name in self._sub_dirs(self.recs_dir):
+            for sub_dir in self._sub_dirs(dir_name):
+                seen.add(sub_dir)
+                new = [entry.path for entry in self._new_wav(sub_dir)]
+                # _new_wav() returns [] without a record of a directory it couldn't list
+                self._returned.setdefault(sub_dir, set()).update(new)
+                found.extend(new)
+        # forget the directories removed since, e.g. by the disk cleanup
+        for dir_name in set(self._returned) - seen:
+            del self._returned[dir_name]
+        for dir_name in set(self._dir_mtimes) - seen:
+            del self._dir_mtimes[dir_name]
+
+        # StreamData is listed every time: a segment still being written now is finished next time
+        stream = self._new_wav(self.stream_dir, force=True)
+        if stream:
+            open_files = get_open_files_in_dir(self.stream_dir)
+            self._real_stream_dir = os.path.realpath(self.stream_dir)
+            new = [entry.path for entry in stream if self._is_finished(entry, open_files)]
+            self._returned.setdefault(self.stream_dir, set()).update(new)
+            self._sizes = {path: size for path, size in self._sizes.items() if path not in self._returned[self.stream_dir]}
+            found.extend(new)
+
+        found.sort(key=recording_sort_key)
+        return found
+
+
 def get_wav_files():
-    conf = get_settings()
-    files = (glob.glob(os.path.join(conf['RECS_DIR'], '*/*/*.wav')) +
-             glob.glob(os.path.join(conf['RECS_DIR'], 'StreamData/*.wav')))
-    files.sort()
-    files = [os.path.join(conf['RECS_DIR'], file) for file in files]
-    rec_dir = os.path.join(conf['RECS_DIR'], 'StreamData')
-    open_recs = get_open_files_in_dir(rec_dir)
-    files = [file for file in files if file not in open_recs]
-    return files
+    return BacklogScanner().scan()
 
 
 def get_language(language=None):
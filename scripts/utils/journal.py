@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+
+from .classes import Detection, ParseFileName
+
+log = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.path.expanduser('~/BirdNET-Pi/analysis_journal.jsonl')
+
+
+class Journal:
+    """Write-ahead log of analyzed files and the reporting steps already done for them.
+
+    Every analyzed file gets an 'analyzed' record holding its detections, a 'step' record per
+    batch of reporting steps and a 'complete' record once the recording has been removed. After a
+    crash or restart, unfinished() returns the files whose reporting has to be resumed, so they are not
+    decoded and analyzed again.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a record cut short by the crash we are recovering from
+                        log.warning('Skipping damaged journal record: %r', line)
+                        continue
+                    self._apply(record)
+        self._compact()
+
+    def _apply(self, record):
+        file_name = record['file']
+        if record['op'] == 'analyzed':
+            # analyzed again: the steps done before, like inserting its rows, aren't done twice
+            entry = self._pending.get(file_name)
+            self._pending[file_name] = {'detections': record['detections'], 'done': entry['done'] if entry else set()}
+        elif record['op'] == 'step' and file_name in self._pending:
+            self._pending[file_name]['done'].update(record['steps'])
+        elif record['op'] == 'complete':
+            self._pending.pop(file_name, None)
+
+    def _compact(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            for file_name, entry in self._pending.items():
+                f.write(json.dumps({'op': 'analyzed', 'file': file_name, 'detections': entry['detections']}) + '\n')
+                if entry['done']:
+                    f.write(json.dumps({'op': 'step', 'file': file_name, 'steps': sorted(entry['done'])}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _write(self, record):
+        with self._lock:
+            self._apply(record)
+            if not self._pending:
+                # nothing left to recover: start over instead of growing the file forever
+                open(self.path, 'w').close()
+                return
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def analyzed(self, file: ParseFileName, detections: [Detection]):
+        dets = [{'start': det.start, 'stop': det.stop, 'sci_name': det.scientific_name, 'com_name': det.common_name,
+                 'confidence': det.confidence} for det in detections]
+        self._write({'op': 'analyzed', 'file': file.file_name, 'detections': dets})
+
+    def steps_done(self, file: ParseFileName, steps):
+        self._write({'op': 'step', 'file': file.file_name, 'steps': list(steps)})
+
+    def is_done(self, file: ParseFileName, step):
+        with self._lock:
+            entry = self._pending.get(file.file_name)
+            return entry is not None and step in entry['done']
+
+    def completed(self, file: ParseFileName):
+        self._write({'op': 'complete', 'file': file.file_name})
+
+    def unfinished(self):
+        """Return (file, detections) for every file that was analyzed but not fully reported."""
+        with self._lock:
+            pending = list(self._pending.items())
+        ret = []
+        for file_name, entry in pending:
+            file = ParseFileName(file_name)
+            detections = [Detection(file.file_date, det['start'], det['stop'], det['sci_name'], det['com_name'], det['confidence'])
+                          for det in entry['detections']]
+            ret.append((file, detections))
+        return ret
@@ -0,0 +1,104 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from .classes import ParseFileName
+
+log = logging.getLogger(__name__)
+
+
+def get_lane_name(file_name):
+    # same as ParseFileName.RTSP_id; the sound card gets the unnamed lane
+    match = re.search("RTSP_[0-9]+-", file_name)
+    return match.group() if match is not None else ""
+
+
+class Lane:
+    """The segments of one stream waiting for analysis, and how far behind that stream is."""
+
+    def __init__(self, name):
+        self.name = name
+        self.files = deque()
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.lagging = False
+
+    def as_dict(self):
+        return {'queued': len(self.files), 'processed': self.processed, 'lag': round(self.lag, 1),
+                'max_lag': round(self.max_lag, 1),
+                'seconds_per_file': round(self.busy_seconds / self.processed, 2) if self.processed else None}
+
+
+class LaneScheduler:
+    """Per-stream queues of recordings, served round-robin.
+
+    Every RTSP stream (and the sound card) gets its own lane. get() takes the oldest segment of the
+    next lane that has one, so a stream with a burst of segments can't hold up the others. The lag
+    of a lane is how long ago its segment was recorded when its analysis starts.
+    """
+
+    def __init__(self, lag_warning=None):
+        self.lag_warning = lag_warning
+        self.lanes = {}
+        self._order = deque()
+        self._queued = set()
+        self._cond = threading.Condition()
+
+    def put(self, file_name):
+        with self._cond:
+            if file_name in self._queued:
+                return
+            name = get_lane_name(file_name)
+            lane = self.lanes.get(name)
+            if lane is None:
+                lane = self.lanes[name] = Lane(name)
+                self._order.append(lane)
+            lane.files.append(file_name)
+            self._queued.add(file_name)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """The next segment to analyze, or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queued, timeout):
+                return None
+            while not self._order[0].files:
+                self._order.rotate(-1)
+            lane = self._order[0]
+            # the next get() starts at the lane after this one
+            self._order.rotate(-1)
+            file_name = lane.files.popleft()
+            self._queued.discard(file_name)
+        self._update_lag(lane, file_name)
+        return file_name
+
+    def done(self, file_name, seconds):
+        with self._cond:
+            lane = self.lanes[get_lane_name(file_name)]
+            lane.processed += 1
+            lane.busy_seconds += seconds
+
+    def get_stats(self):
+        with self._cond:
+            return {lane.name or 'local': lane.as_dict() for lane in self._order}
+
+    def _update_lag(self, lane, file_name):
+        try:
+            lag = time.time() - ParseFileName(file_name).file_date.timestamp()
+        except (AttributeError, ValueError):
+            # no timestamp in the name
+            return
+        lane.lag = lag
+        lane.max_lag = max(lane.max_lag, lag)
+        if self.lag_warning is None:
+            return
+        if lag > self.lag_warning and not lane.lagging:
+            log.warning('%s stream is %.0fs behind (%d segments queued)', lane.name or 'local', lag, len(lane.files))
+            lane.lagging = True
+        elif lag <= self.lag_warning and lane.lagging:
+            log.info('%s stream caught up', lane.name or 'local')
+            lane.lagging = False
@@ -1,20 +1,97 @@
 import apprise
 import os
+import re
 import socket
+import sqlite3
 import requests
 import html
+import logging
+import threading
 import time
+from functools import lru_cache
+from queue import Queue, Empty
 
+from .counters import get_species_counts
 from .db import get_todays_count_for, get_this_weeks_count_for
-from .helpers import get_settings
+from .helpers import get_settings, BASE_PATH
+
+log = logging.getLogger(__name__)
 
 userDir = os.path.expanduser('~')
 APPRISE_CONFIG = userDir + '/BirdNET-Pi/apprise.txt'
 APPRISE_BODY = userDir + '/BirdNET-Pi/body.txt'
+IMAGE_CACHE_DBS = {
+    'FLICKR': os.path.join(BASE_PATH, 'scripts/flickr.db'),
+    'WIKIPEDIA': os.path.join(BASE_PATH, 'scripts/wikipedia.db'),
+}
+
+TEMPLATE_KEYS = ['sciname', 'comname', 'confidencepct', 'confidence', 'listenurl', 'friendlyurl', 'date', 'time', 'week',
+                 'latitude', 'longitude', 'cutoff', 'sens', 'flickrimage', 'image', 'overlap', 'reason']
+# longest names first, so $confidencepct is not matched as $confidence followed by 'pct'
+_TEMPLATE_RE = re.compile(r'\$(' + '|'.join(sorted(TEMPLATE_KEYS, key=len, reverse=True)) + ')')
 
 apobj = None
 images = {}
 species_last_notified = {}
+_body_cache = {}
+_dispatcher = None
+
+
+class Template:
+    """A notification template split once into literal text and $placeholders."""
+
+    def __init__(self, text):
+        self.text = text
+        # re.split() with a capture group alternates literal, key, literal, key, ...
+        self.parts = _TEMPLATE_RE.split(text)
+
+    def render(self, values):
+        parts = list(self.parts)
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=32)
+def compile_template(text):
+    return Template(text)
+
+
+def get_body_template():
+    mtime = os.path.getmtime(APPRISE_BODY)
+    cached = _body_cache.get(APPRISE_BODY)
+    if cached is None or cached[0] != mtime:
+        with open(APPRISE_BODY, 'r') as f:
+            cached = (mtime, Template(f.read()))
+        _body_cache[APPRISE_BODY] = cached
+    return cached[1]
+
+
+def get_image_url(sci_name, com_name):
+    if com_name in images:
+        return images[com_name]
+    provider = get_settings().get('IMAGE_PROVIDER')
+    db_path = IMAGE_CACHE_DBS.get(provider)
+    if db_path is not None and os.path.exists(db_path):
+        try:
+            con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                row = con.execute("SELECT image_url FROM images WHERE sci_name = ?", (sci_name,)).fetchone()
+            finally:
+                con.close()
+            if row:
+                images[com_name] = row[0]
+        except sqlite3.Error as e:
+            log.warning('Image cache lookup failed: %s', e)
+    if com_name not in images:
+        # not cached yet: let the web UI fetch (and cache) it for us
+        try:
+            url = f"http://localhost/api/v1/image/{sci_name}"
+            resp = requests.get(url=url, timeout=10).json()
+            images[com_name] = resp['data']['image_url']
+        except Exception as e:
+            log.warning("IMAGE API ERROR: %s", e)
+    return images.get(com_name, "")
 
 
 def notify(body, title, attached=""):
@@ -44,78 +121,93 @@ def notify(body, title, attached=""):
         )
 
 
-def sendAppriseNotifications(sci_name, com_name, confidence, confidencepct, path, date, time_of_day, week, latitude, longitude, cutoff, sens, overlap):
-    def render_template(template, reason=""):
-        ret = template.replace("$sciname", sci_name) \
-            .replace("$comname", com_name) \
-            .replace("$confidencepct", str(confidencepct)) \
-            .replace("$confidence", str(confidence)) \
-            .replace("$listenurl", listenurl) \
-            .replace("$friendlyurl", friendlyurl) \
-            .replace("$date", str(date)) \
-            .replace("$time", str(time_of_day)) \
-            .replace("$week", str(week)) \
-            .replace("$latitude", str(latitude)) \
-            .replace("$longitude", str(longitude)) \
-            .replace("$cutoff", str(cutoff)) \
-            .replace("$sens", str(sens)) \
-            .replace("$flickrimage", image_url if "{" in body else "") \
-            .replace("$image", image_url if "{" in body else "") \
-            .replace("$overlap", str(overlap)) \
-            .replace("$reason", reason)
-        return ret
+def notification_reasons(sci_name, com_name):
+    """Evaluate the notification rules for a detection and return the reasons it is notified for.
 
+    The counts are read as they are now, so this is called when the detection is reported.
+    """
     if not should_notify(com_name):
-        return
+        return []
+
+    settings_dict = get_settings()
+    counts = get_species_counts()
+    reasons = []
+    if settings_dict.get('APPRISE_NOTIFY_EACH_DETECTION') == "1":
+        reasons.append("detection")
+
+    APPRISE_NOTIFICATION_NEW_SPECIES_DAILY_COUNT_LIMIT = 1  # Notifies the first N per day.
+    if settings_dict.get('APPRISE_NOTIFY_NEW_SPECIES_EACH_DAY') == "1":
+        numberDetections = counts.today(sci_name) if counts is not None else get_todays_count_for(sci_name)
+        if 0 < numberDetections <= APPRISE_NOTIFICATION_NEW_SPECIES_DAILY_COUNT_LIMIT:
+            reasons.append("first time today")
+
+    if settings_dict.get('APPRISE_NOTIFY_NEW_SPECIES') == "1":
+        numberDetections = counts.this_week(sci_name) if counts is not None else get_this_weeks_count_for(sci_name)
+        if 0 < numberDetections <= 5:
+            reasons.append(f"only seen {numberDetections} times in last 7d")
+
+    if reasons:
+        species_last_notified[com_name] = int(time.time())
+    return reasons
+
+
+def render_notifications(reasons, sci_name, com_name, confidence, confidencepct, path, date, time_of_day, week, latitude, longitude,
+                         cutoff, sens, overlap):
+    """Return the rendered (body, title, image_url) message of each reason."""
+    if not reasons:
+        return []
 
     settings_dict = get_settings()
-    title = html.unescape(settings_dict.get('APPRISE_NOTIFICATION_TITLE'))
-    f = open(APPRISE_BODY, 'r')
-    body = f.read()
+    title = compile_template(html.unescape(settings_dict.get('APPRISE_NOTIFICATION_TITLE')))
+    body = get_body_template()
 
     websiteurl = settings_dict.get('BIRDNETPI_URL')
     if websiteurl is None or len(websiteurl) == 0:
         websiteurl = f"http://{socket.gethostname()}.local"
 
     listenurl = f"{websiteurl}?filename={path}"
-    friendlyurl = f"[Listen here]({listenurl})"
 
     image_url = ""
-    if "$flickrimage" in body or "$image" in body:
-        if com_name not in images:
-            try:
-                url = f"http://localhost/api/v1/image/{sci_name}"
-                resp = requests.get(url=url, timeout=10).json()
-                images[com_name] = resp['data']['image_url']
-            except Exception as e:
-                print("IMAGE API ERROR:", e)
-        image_url = images.get(com_name, "")
+    if "$flickrimage" in body.text or "$image" in body.text:
+        image_url = get_image_url(sci_name, com_name)
 
-    if settings_dict.get('APPRISE_NOTIFY_EACH_DETECTION') == "1":
-        reason = "detection"
-        notify_body = render_template(body, reason)
-        notify_title = render_template(title, reason)
-        notify(notify_body, notify_title, image_url)
-        species_last_notified[com_name] = int(time.time())
+    values = {
+        'sciname': sci_name,
+        'comname': com_name,
+        'confidencepct': str(confidencepct),
+        'confidence': str(confidence),
+        'listenurl': listenurl,
+        'friendlyurl': f"[Listen here]({listenurl})",
+        'date': str(date),
+        'time': str(time_of_day),
+        'week': str(week),
+        'latitude': str(latitude),
+        'longitude': str(longitude),
+        'cutoff': str(cutoff),
+        'sens': str(sens),
+        'flickrimage': image_url if "{" in body.text else "",
+        'image': image_url if "{" in body.text else "",
+        'overlap': str(overlap),
+    }
 
-    APPRISE_NOTIFICATION_NEW_SPECIES_DAILY_COUNT_LIMIT = 1  # Notifies the first N per day.
-    if settings_dict.get('APPRISE_NOTIFY_NEW_SPECIES_EACH_DAY') == "1":
-        numberDetections = get_todays_count_for(sci_name)
-        if 0 < numberDetections <= APPRISE_NOTIFICATION_NEW_SPECIES_DAILY_COUNT_LIMIT:
-            reason = "first time today"
-            notify_body = render_template(body, reason)
-            notify_title = render_template(title, reason)
-            notify(notify_body, notify_title, image_url)
-            species_last_notified[com_name] = int(time.time())
+    messages = []
+    for reason in reasons:
+        values['reason'] = reason
+        messages.append((body.render(values), title.render(values), image_url))
+    return messages
 
-    if settings_dict.get('APPRISE_NOTIFY_NEW_SPECIES') == "1":
-        numberDetections = get_this_weeks_count_for(sci_name)
-        if 0 < numberDetections <= 5:
-            reason = f"only seen {numberDetections} times in last 7d"
-            notify_body = render_template(body, reason)
-            notify_title = render_template(title, reason)
-            notify(notify_body, notify_title, image_url)
-            species_last_notified[com_name] = int(time.time())
+
+def build_notifications(sci_name, com_name, confidence, confidencepct, path, date, time_of_day, week, latitude, longitude, cutoff, sens,
+                        overlap):
+    """Evaluate the notification rules for a detection and return the rendered (body, title, image_url) messages."""
+    return render_notifications(notification_reasons(sci_name, com_name), sci_name, com_name, confidence, confidencepct, path, date,
+                                time_of_day, week, latitude, longitude, cutoff, sens, overlap)
+
+
+def sendAppriseNotifications(sci_name, com_name, confidence, confidencepct, path, date, time_of_day, week, latitude, longitude, cutoff, sens, overlap):
+    for notify_body, notify_title, image_url in build_notifications(sci_name, com_name, confidence, confidencepct, path, date, time_of_day,
+                                                                    week, latitude, longitude, cutoff, sens, overlap):
+        notify(notify_body, notify_title, image_url)
 
 
 def should_notify(com_name):
@@ -151,5 +243,108 @@ def should_notify(com_name):
     return True
 
 
+def get_coalesce_seconds():
+    try:
+        return max(0, int(get_settings().get('APPRISE_COALESCE_SECONDS', '0') or 0))
+    except ValueError:
+        return 0
+
+
+def _describe_window(seconds):
+    if seconds % 60 == 0:
+        minutes = seconds // 60
+        return 'minute' if minutes == 1 else f'{minutes} minutes'
+    return f'{seconds} seconds'
+
+
+class NotificationDispatcher:
+    """Sends Apprise notifications from a background thread.
+
+    The rules are evaluated when a detection is submitted, on the reporting thread, so they see
+    the counts of the detections reported so far however far behind the backend is. The thread
+    renders and sends the messages; when APPRISE_COALESCE_SECONDS is set, the messages produced
+    within that window are sent as a single notification.
+    """
+
+    def __init__(self):
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._run, name='apprise', daemon=True)
+        self._thread.start()
+
+    def submit(self, *args):
+        """Evaluate the rules for the sendAppriseNotifications() arguments of a detection, and queue it if any matched."""
+        try:
+            reasons = notification_reasons(*args[:2])
+        except BaseException as e:
+            log.exception('Error during Apprise:', exc_info=e)
+            return
+        if reasons:
+            self._queue.put((reasons, args))
+
+    def stop(self, timeout=None):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _build(self, item):
+        reasons, args = item
+        try:
+            return [(args[1], *message) for message in render_notifications(reasons, *args)]
+        except BaseException as e:
+            log.exception('Error during Apprise:', exc_info=e)
+            return []
+
+    def _run(self):
+        done = False
+        while not done:
+            item = self._queue.get()
+            if item is None:
+                break
+            pending = self._build(item)
+            window = get_coalesce_seconds() if pending else 0
+            deadline = time.monotonic() + window
+            while window:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                pending.extend(self._build(item))
+            self._send(pending, window)
+
+    def _send(self, pending, window):
+        if not pending:
+            return
+        if len(pending) == 1:
+            _, body, title, image_url = pending[0]
+        else:
+            species = list(dict.fromkeys(com_name for com_name, _, _, _ in pending))
+            title = f'{len(species)} species in the last {_describe_window(window)}'
+            body = '\n'.join(body for _, body, _, _ in pending)
+            image_url = next((image_url for _, _, _, image_url in pending if image_url), "")
+        try:
+            notify(body, title, image_url)
+        except BaseException as e:
+            log.exception('Error during Apprise:', exc_info=e)
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = NotificationDispatcher()
+    return _dispatcher
+
+
+def stop_dispatcher(timeout=None):
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.stop(timeout)
+        _dispatcher = None
+
+
 if __name__ == "__main__":
     print("notfications")
@@ -2,9 +2,12 @@ import glob
 import json
 import logging
 import os
+import queue
 import sqlite3
 import subprocess
 import tempfile
+import threading
+import time
 import io
 import soundfile
 from time import sleep
@@ -14,10 +17,17 @@ from PIL import Image, ImageDraw, ImageFont
 
 from .helpers import get_settings, get_font, DB_PATH
 from .classes import Detection, ParseFileName
-from .notifications import sendAppriseNotifications
+from .counters import get_species_counts
+from .notifications import get_dispatcher
+from .schema import DETECTION_COLUMNS
 
 log = logging.getLogger(__name__)
 
+# named columns: the species key the triggers add follows them
+# the Species_Id of a known species is set here, the insert trigger only looks it up for a new one
+INSERT_SQL = (f"INSERT INTO detections ({', '.join(DETECTION_COLUMNS)}, Species_Id) "
+              f"VALUES ({', '.join('?' * len(DETECTION_COLUMNS))}, (SELECT Species_Id FROM species WHERE Sci_Name = ?))")
+
 
 def extract(in_file, out_file, start, stop):
     result = subprocess.run(['sox', '-V1', f'{in_file}', f'{out_file}', 'trim', f'={start}', f'={stop}'],
@@ -87,37 +97,51 @@ def spectrogram(in_file, title, comment, raw=0):
     os.remove(tmp_file)
 
 
-def extract_detection(file: ParseFileName, detection: Detection):
+def extracted_file_name(file: ParseFileName, detection: Detection):
     conf = get_settings()
     new_file_name = f'{detection.common_name_safe}-{detection.confidence_pct}-{detection.date}-birdnet-{file.RTSP_id}{detection.time}.{conf["AUDIOFMT"]}'
     new_dir = os.path.join(conf['EXTRACTED'], 'By_Date', f'{detection.date}', f'{detection.common_name_safe}')
-    new_file = os.path.join(new_dir, new_file_name)
+    return os.path.join(new_dir, new_file_name)
+
+
+def extract_detection(file: ParseFileName, detection: Detection):
+    conf = get_settings()
+    new_file = extracted_file_name(file, detection)
     if os.path.isfile(new_file):
         log.warning('Extraction exists. Moving on: %s', new_file)
     else:
-        os.makedirs(new_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(new_file), exist_ok=True)
         extract_safe(file.file_name, new_file, detection.start, detection.stop)
         spectrogram(new_file, detection.common_name, new_file.replace(os.path.expanduser('~/'), ''), conf['RAW_SPECTROGRAM'])
     return new_file
 
 
-def write_to_db(file: ParseFileName, detection: Detection):
+def write_to_db(file: ParseFileName, detections: [Detection]):
     conf = get_settings()
+    rows = [(detection.date, detection.time, detection.scientific_name, detection.common_name, detection.confidence,
+             conf['LATITUDE'], conf['LONGITUDE'], conf['CONFIDENCE'], str(detection.week), conf['SENSITIVITY'],
+             conf['OVERLAP'], os.path.basename(detection.file_name_extr))
+            for detection in detections]
+    # (Date, Time, Sci_Name, Com_Name, str(score),
+    # Lat, Lon, Cutoff, Week, Sens,
+    # Overlap, File_Name))
+    if not rows:
+        return
     # Connect to SQLite Database
     for attempt_number in range(3):
         try:
             con = sqlite3.connect(DB_PATH)
-            cur = con.cursor()
-            cur.execute("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (detection.date, detection.time, detection.scientific_name, detection.common_name, detection.confidence,
-                         conf['LATITUDE'], conf['LONGITUDE'], conf['CONFIDENCE'], str(detection.week), conf['SENSITIVITY'],
-                         conf['OVERLAP'], os.path.basename(detection.file_name_extr)))
-            # (Date, Time, Sci_Name, Com_Name, str(score),
-            # Lat, Lon, Cutoff, Week, Sens,
-            # Overlap, File_Name))
-
-            con.commit()
-            con.close()
+            try:
+                with con:
+                    # one transaction, but execute() per row to learn the ids for the event feed
+                    for detection, row in zip(detections, rows):
+                        detection.row_id = con.execute(INSERT_SQL, (*row, detection.scientific_name)).lastrowid
+            finally:
+                con.close()
+            counts = get_species_counts()
+            if counts is not None:
+                for detection in detections:
+                    counts.add(detection.date, detection.scientific_name)
             break
         except BaseException as e:
             log.warning("Database busy: %s", e)
@@ -135,9 +159,9 @@ def summary(file: ParseFileName, detection: Detection):
     return s
 
 
-def write_to_file(file: ParseFileName, detection: Detection):
+def write_to_file(lines: [str]):
     with open(os.path.expanduser('~/BirdNET-Pi/BirdDB.txt'), 'a') as rfile:
-        rfile.write(f'{summary(file, detection)}\n')
+        rfile.writelines(f'{line}\n' for line in lines)
 
 
 def update_json_file(file: ParseFileName, detections: [Detection]):
@@ -170,13 +194,11 @@ def apprise(file: ParseFileName, detections: [Detection]):
     for detection in detections:
         # Apprise of detection if not already alerted this run.
         if detection.species not in species_apprised_this_run:
-            try:
-                sendAppriseNotifications(detection.scientific_name, detection.common_name, str(detection.confidence), str(detection.confidence_pct),
-                                         os.path.basename(detection.file_name_extr), detection.date, detection.time, str(detection.week),
-                                         conf['LATITUDE'], conf['LONGITUDE'], conf['CONFIDENCE'], conf['SENSITIVITY'], conf['OVERLAP'])
-
-            except BaseException as e:
-                log.exception('Error during Apprise:', exc_info=e)
+            # the rules are evaluated now, with the counts of this detection; the dispatcher thread renders
+            # and sends, so a slow backend can't hold up reporting
+            get_dispatcher().submit(detection.scientific_name, detection.common_name, str(detection.confidence), str(detection.confidence_pct),
+                                    os.path.basename(detection.file_name_extr), detection.date, detection.time, str(detection.week),
+                                    conf['LATITUDE'], conf['LONGITUDE'], conf['CONFIDENCE'], conf['SENSITIVITY'], conf['OVERLAP'])
 
             species_apprised_this_run.append(detection.species)
 
@@ -187,10 +209,15 @@ def bird_weather(file: ParseFileName, detections: [Detection]):
         return
     if detections:
         try:
-            data, samplerate = soundfile.read(file.file_name)
-            buf = io.BytesIO()
-            soundfile.write(buf, data, samplerate, format='FLAC')
-            flac_data = buf.getvalue()
+            if file.file_name.endswith('.flac'):
+                # already what BirdWeather wants
+                with open(file.file_name, 'rb') as f:
+                    flac_data = f.read()
+            else:
+                data, samplerate = soundfile.read(file.file_name)
+                buf = io.BytesIO()
+                soundfile.write(buf, data, samplerate, format='FLAC')
+                flac_data = buf.getvalue()
         except Exception as e:
             log.error("Error during FLAC conversion: %s", e)
             return
@@ -231,6 +258,113 @@ def bird_weather(file: ParseFileName, detections: [Detection]):
                 log.error("Cannot POST detection: %s", e)
 
 
+# events waiting for the API, and how long to stop posting after a failed POST
+API_QUEUE_SIZE = 1000
+API_MIN_BACKOFF = 5
+API_MAX_BACKOFF = 300
+
+
+class ApiPublisher:
+    """POSTs to the Field Station API from a background thread.
+
+    post() only queues, so a slow or unreachable API can't hold up the reporting. After a failed
+    POST, events are dropped for a backoff period doubling up to API_MAX_BACKOFF seconds: they are
+    a live feed, late ones are of no use. Events are dropped too while the queue is full.
+    """
+
+    def __init__(self, timeout=2, queue_size=API_QUEUE_SIZE):
+        self.timeout = timeout
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._session = None
+        self._backoff = 0
+        self._retry_at = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def post(self, path, data):
+        if time.monotonic() < self._retry_at:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='api-publisher', daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait((path, data))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while (item := self._queue.get()) is not None:
+            self._send(*item)
+
+    def _send(self, path, data):
+        if time.monotonic() < self._retry_at:
+            self.dropped += 1
+            return
+        base_url = get_settings().get('FIELD_STATION_API_URL', 'http://localhost:8003')
+        if not base_url:
+            return
+        if self._session is None:
+            self._session = requests.Session()
+        try:
+            response = self._session.post(f'{base_url.rstrip("/")}{path}', json=data, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.failed += 1
+            # warn once, not for every detection while the API is down
+            if not self._backoff:
+                log.warning('Cannot POST to the API, pausing the events: %s', e)
+            self._backoff = min(max(self._backoff * 2, API_MIN_BACKOFF), API_MAX_BACKOFF)
+            self._retry_at = time.monotonic() + self._backoff
+            return
+        if self._backoff:
+            log.info('The API is reachable again')
+            self._backoff = 0
+        self.sent += 1
+
+    def close(self, timeout=5):
+        """Send the events queued, for up to timeout seconds."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+
+api_publisher = ApiPublisher()
+
+
+def post_to_api(path, data):
+    """Queue a POST to the Field Station API."""
+    api_publisher.post(path, data)
+
+
+def publish_detections(file: ParseFileName, detections: [Detection]):
+    for detection in detections:
+        # not inserted by this run (a resumed file whose rows are in already, or a failed insert): the
+        # live feed only gets detections it can find by id
+        if detection.row_id is None:
+            continue
+        post_to_api('/api/detections/notify', {
+            'id': detection.row_id, 'com_name': detection.common_name, 'sci_name': detection.scientific_name,
+            'confidence': detection.confidence, 'date': detection.date, 'time': detection.time,
+            'iso8601': detection.iso8601, 'file_name': os.path.basename(detection.file_name_extr)})
+
+
+def publish_media_ready(file: ParseFileName, detections: [Detection]):
+    for detection in detections:
+        if detection.row_id is not None and os.path.isfile(detection.file_name_extr):
+            post_to_api('/api/detections/media-ready', {
+                'id': detection.row_id, 'com_name': detection.common_name,
+                'file_name': os.path.basename(detection.file_name_extr),
+                'spectrogram': os.path.basename(f'{detection.file_name_extr}.png')})
+
+
 def heartbeat():
     conf = get_settings()
     if conf['HEARTBEAT_URL']:
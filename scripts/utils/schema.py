@@ -0,0 +1,394 @@
+"""Versioned upgrades of the detections database.
+
+The schema version is kept in PRAGMA user_version. Every migration runs in its own transaction
+and only adds columns, indexes and tables, or replaces the rollup tables derived from the
+detections, so the analyzer and the web interfaces can keep using the database while it is upgraded.
+"""
+import logging
+import sqlite3
+
+log = logging.getLogger(__name__)
+
+# rollup table, whether it is per hour
+ROLLUPS = [('daily_species', False), ('hourly_species', True)]
+
+
+def _columns(hour):
+    return ['Date', 'Hour', 'Sci_Name', 'Com_Name'] if hour else ['Date', 'Sci_Name', 'Com_Name']
+
+
+def _match(columns, row):
+    return ' AND '.join(f'{column} = {row}.{column}' for column in columns)
+
+
+def _refresh(table, columns, row):
+    # max and first/last can't be taken back: recount the group, it's one index range
+    keys = ', '.join(columns)
+    match = _match(columns, row)
+    return f'''
+        INSERT OR REPLACE INTO {table} ({keys}, Count, Max_Confidence, First_Time, Last_Time)
+        SELECT {', '.join(f'{row}.{column}' for column in columns)}, COUNT(*), MAX(Confidence), MIN(Time), MAX(Time)
+        FROM detections WHERE {match} HAVING COUNT(*) > 0;
+        DELETE FROM {table} WHERE {match}
+            AND NOT EXISTS (SELECT 1 FROM detections WHERE {match});'''
+
+
+def rollup_delete_trigger(table, hour, when=''):
+    return f'''CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON detections {when}
+        BEGIN{_refresh(table, _columns(hour), 'OLD')}
+        END'''
+
+
+def rollup_update_trigger(table, hour, of=''):
+    columns = _columns(hour)
+    return f'''CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE {of} ON detections
+        BEGIN{_refresh(table, columns, 'OLD')}{_refresh(table, columns, 'NEW')}
+        END'''
+
+
+def rollup_statements(table, hour):
+    """The table and triggers keeping count, max confidence and first/last time per species per day (or hour)."""
+    columns = _columns(hour)
+    keys = ', '.join(columns)
+    return [
+        f'''CREATE TABLE IF NOT EXISTS {table} (
+            {' '.join(f'{column} {"INTEGER" if column == "Hour" else "TEXT"} NOT NULL,' for column in columns)}
+            Count INTEGER NOT NULL,
+            Max_Confidence FLOAT,
+            First_Time TEXT,
+            Last_Time TEXT,
+            PRIMARY KEY ({keys})) WITHOUT ROWID''',
+        f'''INSERT OR REPLACE INTO {table} ({keys}, Count, Max_Confidence, First_Time, Last_Time)
+            SELECT {keys}, COUNT(*), MAX(Confidence), MIN(Time), MAX(Time) FROM detections GROUP BY {keys}''',
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON detections BEGIN
+            INSERT INTO {table} ({keys}, Count, Max_Confidence, First_Time, Last_Time)
+            VALUES ({', '.join(f'NEW.{column}' for column in columns)}, 1, NEW.Confidence, NEW.Time, NEW.Time)
+            ON CONFLICT ({keys}) DO UPDATE SET
+                Count = Count + 1,
+                Max_Confidence = max(Max_Confidence, excluded.Max_Confidence),
+                First_Time = min(First_Time, excluded.First_Time),
+                Last_Time = max(Last_Time, excluded.Last_Time);
+        END''',
+        rollup_delete_trigger(table, hour),
+        rollup_update_trigger(table, hour),
+    ]
+
+
+def changes_update_trigger(of=''):
+    return f'''CREATE TRIGGER IF NOT EXISTS detections_changes_update AFTER UPDATE {of} ON detections BEGIN
+            INSERT INTO detections_changes (Op, Detection_Id) SELECT 'delete', OLD.ROWID WHERE OLD.ROWID != NEW.ROWID;
+            INSERT INTO detections_changes (Op, Detection_Id) VALUES ('update', NEW.ROWID);
+        END'''
+
+
+def _species_id(row):
+    return f'(SELECT Species_Id FROM species WHERE Sci_Name = {row}.Sci_Name)'
+
+
+def _species_keys(hour):
+    return ['Date', 'Hour', 'Species_Id'] if hour else ['Date', 'Species_Id']
+
+
+def _species_refresh(table, hour, row):
+    # recount the group; the detections are matched by Sci_Name, one to one with Species_Id, so the
+    # ones not given their Species_Id yet count too, and through the Date or Date, Hour index
+    times = ['Date', 'Hour'] if hour else ['Date']
+    match = f"{_match(times, row)} AND +Sci_Name = {row}.Sci_Name"
+    return f'''
+        INSERT OR REPLACE INTO {table} ({', '.join(_species_keys(hour))}, Count, Max_Confidence, First_Time, Last_Time)
+        SELECT {', '.join(f'{row}.{column}' for column in times)}, {_species_id(row)},
+               COUNT(*), MAX(Confidence), MIN(Time), MAX(Time)
+        FROM detections WHERE {match} HAVING COUNT(*) > 0;
+        DELETE FROM {table} WHERE {_match(times, row)} AND Species_Id = {_species_id(row)}
+            AND NOT EXISTS (SELECT 1 FROM detections WHERE {match});'''
+
+
+def species_rollup_statements(table, hour):
+    """The rollup table keyed by Species_Id, filled from the one keyed by names, and its delete and update triggers.
+
+    Its insert trigger is part of detections_insert.
+    """
+    keys = _species_keys(hour)
+    times = keys[:-1]
+    return [
+        f'DROP TRIGGER IF EXISTS {table}_insert',
+        f'DROP TRIGGER IF EXISTS {table}_delete',
+        f'DROP TRIGGER IF EXISTS {table}_update',
+        f'''CREATE TABLE {table}_by_species (
+            {' '.join(f'{column} {"TEXT" if column == "Date" else "INTEGER"} NOT NULL,' for column in keys)}
+            Count INTEGER NOT NULL,
+            Max_Confidence FLOAT,
+            First_Time TEXT,
+            Last_Time TEXT,
+            PRIMARY KEY ({', '.join(keys)})) WITHOUT ROWID''',
+        # the archived months are only in the rollups, they are converted rather than recounted
+        f'''INSERT INTO {table}_by_species ({', '.join(keys)}, Count, Max_Confidence, First_Time, Last_Time)
+            SELECT {', '.join(f'r.{column}' for column in times)}, s.Species_Id,
+                   SUM(r.Count), MAX(r.Max_Confidence), MIN(r.First_Time), MAX(r.Last_Time)
+            FROM {table} r JOIN species s ON s.Sci_Name = r.Sci_Name
+            GROUP BY {', '.join(f'r.{column}' for column in times)}, s.Species_Id''',
+        f'DROP TABLE {table}',
+        f'ALTER TABLE {table}_by_species RENAME TO {table}',
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON detections
+           WHEN substr(OLD.Date, 1, 7) NOT IN (SELECT Month FROM archived_months)
+           BEGIN{_species_refresh(table, hour, 'OLD')}
+        END''',
+        # the species of a new Sci_Name may not be there yet, detections_species_id_update adds it too
+        f'''CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF Date, Time, Sci_Name, Confidence ON detections
+           BEGIN
+            INSERT OR IGNORE INTO species (Sci_Name, Com_Name) VALUES (NEW.Sci_Name, NEW.Com_Name);{
+            _species_refresh(table, hour, 'OLD')}{_species_refresh(table, hour, 'NEW')}
+        END''',
+    ]
+
+
+def _rollup_upsert(table, hour):
+    keys = _species_keys(hour)
+    values = [f'NEW.{column}' for column in keys[:-1]] + ['COALESCE(NEW.Species_Id, (SELECT Species_Id FROM species WHERE Sci_Name = NEW.Sci_Name))']
+    return f'''
+            INSERT INTO {table} ({', '.join(keys)}, Count, Max_Confidence, First_Time, Last_Time)
+            VALUES ({', '.join(values)}, 1, NEW.Confidence, NEW.Time, NEW.Time)
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                Count = Count + 1,
+                Max_Confidence = max(Max_Confidence, excluded.Max_Confidence),
+                First_Time = min(First_Time, excluded.First_Time),
+                Last_Time = max(Last_Time, excluded.Last_Time);'''
+
+
+# the columns of a detection as written by the analysis, Species_Id is derived from Sci_Name
+# (reporting.INSERT_SQL sets it too, for the species already known)
+DETECTION_COLUMNS = ['Date', 'Time', 'Sci_Name', 'Com_Name', 'Confidence', 'Lat', 'Lon', 'Cutoff', 'Week', 'Sens',
+                     'Overlap', 'File_Name']
+
+SET_SPECIES_ID = '''UPDATE detections SET Species_Id = (SELECT Species_Id FROM species WHERE Sci_Name = NEW.Sci_Name)
+            WHERE ROWID = NEW.ROWID;'''
+
+# the archived months stay in the rollups
+NOT_ARCHIVED = 'substr(Date, 1, 7) NOT IN (SELECT Month FROM archived_months)'
+
+
+def _rollup_counts(hour):
+    times = ', '.join(f'd.{column}' for column in (['Date', 'Hour'] if hour else ['Date']))
+    return f'''SELECT {times}, s.Species_Id, COUNT(*) AS Count, MAX(d.Confidence) AS Max_Confidence,
+                      MIN(d.Time) AS First_Time, MAX(d.Time) AS Last_Time
+               FROM detections d JOIN species s ON s.Sci_Name = d.Sci_Name
+               WHERE {NOT_ARCHIVED} GROUP BY {times}, s.Species_Id'''
+
+
+def rebuild_rollups(con):
+    """Recount the rollup tables from the detections, except for the archived months."""
+    for table, hour in ROLLUPS:
+        con.execute(f'DELETE FROM {table} WHERE {NOT_ARCHIVED}')
+        con.execute(f'''INSERT INTO {table} ({', '.join(_species_keys(hour))}, Count, Max_Confidence, First_Time, Last_Time)
+                       {_rollup_counts(hour)}''')
+
+
+def verify_rollups(con):
+    """The groups whose rollup row doesn't match the detections, per rollup table."""
+    mismatches = {}
+    for table, hour in ROLLUPS:
+        actual = _rollup_counts(hour)
+        stored = f'''SELECT {', '.join(_species_keys(hour))}, Count, Max_Confidence, First_Time, Last_Time FROM {table}
+                     WHERE {NOT_ARCHIVED}'''
+        rows = con.execute(f'SELECT * FROM ({actual} EXCEPT {stored}) UNION ALL SELECT * FROM ({stored} EXCEPT {actual})').fetchall()
+        mismatches[table] = rows
+    return mismatches
+
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, 'epoch timestamp and hour columns, indexes for the API', [
+        # Date and Time are local wall-clock time, so is ts: only use it to order and compare
+        '''ALTER TABLE detections ADD COLUMN ts INTEGER
+           GENERATED ALWAYS AS (CAST(strftime('%s', Date || ' ' || Time) AS INTEGER)) VIRTUAL''',
+        '''ALTER TABLE detections ADD COLUMN Hour INTEGER
+           GENERATED ALWAYS AS (CAST(substr(Time, 1, 2) AS INTEGER)) VIRTUAL''',
+        # the value of a virtual column is stored in the indexes on it
+        'CREATE INDEX IF NOT EXISTS "detections_ts" ON "detections" ("ts")',
+        'CREATE INDEX IF NOT EXISTS "detections_Date_Hour" ON "detections" ("Date", "Hour")',
+        'CREATE INDEX IF NOT EXISTS "detections_Date_Com_Name" ON "detections" ("Date", "Com_Name", "Confidence", "Time")',
+        'CREATE INDEX IF NOT EXISTS "detections_Com_Name_Date" ON "detections" ("Com_Name", "Date")',
+        'CREATE INDEX IF NOT EXISTS "detections_Sci_Name_Confidence" ON "detections" ("Sci_Name", "Confidence")',
+        # covered by the two above
+        'DROP INDEX IF EXISTS "detections_Com_Name"',
+        'DROP INDEX IF EXISTS "detections_Sci_Name"',
+    ]),
+    (2, 'daily and hourly species rollups', [
+        *[statement for table, hour in ROLLUPS for statement in rollup_statements(table, hour)],
+        'CREATE INDEX IF NOT EXISTS "daily_species_Com_Name_Date" ON "daily_species" ("Com_Name", "Date")',
+    ]),
+    (3, 'change feed of the detections', [
+        # AUTOINCREMENT: a Seq is never reused, even after the oldest changes are pruned
+        '''CREATE TABLE IF NOT EXISTS detections_changes (
+            Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            Op TEXT NOT NULL,
+            Detection_Id INTEGER NOT NULL,
+            Changed_At INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)))''',
+        '''CREATE TRIGGER IF NOT EXISTS detections_changes_insert AFTER INSERT ON detections BEGIN
+            INSERT INTO detections_changes (Op, Detection_Id) VALUES ('insert', NEW.ROWID);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS detections_changes_delete AFTER DELETE ON detections BEGIN
+            INSERT INTO detections_changes (Op, Detection_Id) VALUES ('delete', OLD.ROWID);
+        END''',
+        changes_update_trigger(),
+    ]),
+    (4, 'archived months', [
+        # the months moved to the Parquet archive by archive_detections.py
+        '''CREATE TABLE IF NOT EXISTS archived_months (
+            Month TEXT PRIMARY KEY,
+            Rows INTEGER NOT NULL,
+            Archived_At INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)))''',
+        *[statement for table, hour in ROLLUPS for statement in (
+            f'DROP TRIGGER IF EXISTS {table}_delete',
+            rollup_delete_trigger(table, hour, when='WHEN substr(OLD.Date, 1, 7) NOT IN (SELECT Month FROM archived_months)'),
+        )],
+    ]),
+    (5, 'species dimension and name search', [
+        # Com_Name is the name the detections are recorded with
+        '''CREATE TABLE IF NOT EXISTS species (
+            Species_Id INTEGER PRIMARY KEY,
+            Sci_Name TEXT NOT NULL UNIQUE,
+            Com_Name TEXT NOT NULL)''',
+        # Lang is a labels_<lang>.json language (see utils/species_names.py), 'sci' for the
+        # scientific name and '' for the name the species was first recorded with
+        '''CREATE TABLE IF NOT EXISTS species_names (
+            Species_Id INTEGER NOT NULL,
+            Lang TEXT NOT NULL,
+            Name TEXT NOT NULL COLLATE NOCASE,
+            UNIQUE (Species_Id, Lang))''',
+        # name prefixes too short for the trigrams
+        'CREATE INDEX IF NOT EXISTS "species_names_Name" ON "species_names" ("Name")',
+        # an index of every 3 characters of the names, for substring search; load_labels()
+        # rebuilds it, the detections_species trigger adds the species detected since
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS species_search USING fts5(
+            Name, content='species_names', tokenize='trigram')''',
+        # the most recent name of every species detected so far
+        '''INSERT OR IGNORE INTO species (Sci_Name, Com_Name)
+           SELECT Sci_Name, Com_Name FROM (SELECT Sci_Name, Com_Name, MAX(ROWID) FROM detections GROUP BY Sci_Name)''',
+        *[f'''INSERT OR IGNORE INTO species_names (Species_Id, Lang, Name) SELECT Species_Id, '{lang}', {name} FROM species'''
+          for lang, name in (('sci', 'Sci_Name'), ('', 'Com_Name'))],
+        "INSERT INTO species_search (species_search) VALUES ('rebuild')",
+        '''CREATE TRIGGER IF NOT EXISTS detections_species AFTER INSERT ON detections
+           WHEN NOT EXISTS (SELECT 1 FROM species WHERE Sci_Name = NEW.Sci_Name) BEGIN
+            INSERT INTO species (Sci_Name, Com_Name) VALUES (NEW.Sci_Name, NEW.Com_Name);
+            INSERT INTO species_names (Species_Id, Lang, Name)
+                SELECT Species_Id, 'sci', Sci_Name FROM species WHERE Sci_Name = NEW.Sci_Name
+                UNION ALL SELECT Species_Id, '', Com_Name FROM species WHERE Sci_Name = NEW.Sci_Name;
+            INSERT INTO species_search (rowid, Name)
+                SELECT n.rowid, n.Name FROM species_names n JOIN species s ON s.Species_Id = n.Species_Id
+                WHERE s.Sci_Name = NEW.Sci_Name;
+        END''',
+    ]),
+    (6, 'species keys in detections', [
+        # filled in by the triggers below, and for the detections before by utils/species_names.fill_species_ids()
+        'ALTER TABLE detections ADD COLUMN Species_Id INTEGER REFERENCES species (Species_Id)',
+        'CREATE INDEX IF NOT EXISTS "detections_Species_Id_Confidence" ON "detections" ("Species_Id", "Confidence")',
+        # the label index of each species in the output of each model
+        '''CREATE TABLE IF NOT EXISTS species_labels (
+            Model TEXT NOT NULL,
+            Label_Index INTEGER NOT NULL,
+            Species_Id INTEGER NOT NULL REFERENCES species (Species_Id),
+            PRIMARY KEY (Model, Label_Index)) WITHOUT ROWID''',
+        # setting Species_Id isn't a change for the rollups or the change feed
+        *[statement for table, hour in ROLLUPS for statement in (
+            f'DROP TRIGGER IF EXISTS {table}_update',
+            rollup_update_trigger(table, hour, of='OF Date, Time, Sci_Name, Com_Name, Confidence'),
+        )],
+        'DROP TRIGGER IF EXISTS detections_changes_update',
+        changes_update_trigger(of=f'OF {", ".join(DETECTION_COLUMNS)}'),
+        # triggers on the same event fire in no defined order: a new species gets its id from the
+        # trigger that adds it, a known one from detections_species_id
+        'DROP TRIGGER IF EXISTS detections_species',
+        f'''CREATE TRIGGER IF NOT EXISTS detections_species AFTER INSERT ON detections
+           WHEN NOT EXISTS (SELECT 1 FROM species WHERE Sci_Name = NEW.Sci_Name) BEGIN
+            INSERT INTO species (Sci_Name, Com_Name) VALUES (NEW.Sci_Name, NEW.Com_Name);
+            INSERT INTO species_names (Species_Id, Lang, Name)
+                SELECT Species_Id, 'sci', Sci_Name FROM species WHERE Sci_Name = NEW.Sci_Name
+                UNION ALL SELECT Species_Id, '', Com_Name FROM species WHERE Sci_Name = NEW.Sci_Name;
+            INSERT INTO species_search (rowid, Name)
+                SELECT n.rowid, n.Name FROM species_names n JOIN species s ON s.Species_Id = n.Species_Id
+                WHERE s.Sci_Name = NEW.Sci_Name;
+            {SET_SPECIES_ID}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS detections_species_id AFTER INSERT ON detections
+           WHEN NEW.Species_Id IS NULL AND EXISTS (SELECT 1 FROM species WHERE Sci_Name = NEW.Sci_Name) BEGIN
+            {SET_SPECIES_ID}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS detections_species_id_update AFTER UPDATE OF Sci_Name ON detections BEGIN
+            INSERT OR IGNORE INTO species (Sci_Name, Com_Name) VALUES (NEW.Sci_Name, NEW.Com_Name);
+            {SET_SPECIES_ID}
+        END''',
+        # the detections with the names of their species in DATABASE_LANG, whatever language
+        # they were recorded in
+        f'''CREATE VIEW IF NOT EXISTS species_detections AS
+           SELECT d.ROWID AS Id, {", ".join(f"s.{column}" if column in ('Sci_Name', 'Com_Name') else f"d.{column}"
+                                            for column in DETECTION_COLUMNS)}, d.Species_Id, d.ts, d.Hour
+           FROM detections d JOIN species s ON s.Species_Id = d.Species_Id''',
+    ]),
+    (7, 'rollups by species key', [
+        # the species only in the rollups of archived months
+        '''INSERT OR IGNORE INTO species (Sci_Name, Com_Name)
+           SELECT Sci_Name, Com_Name FROM (SELECT Sci_Name, Com_Name, MAX(Date) FROM daily_species GROUP BY Sci_Name)''',
+        *[f'''INSERT OR IGNORE INTO species_names (Species_Id, Lang, Name) SELECT Species_Id, '{lang}', {name} FROM species'''
+          for lang, name in (('sci', 'Sci_Name'), ('', 'Com_Name'))],
+        "INSERT INTO species_search (species_search) VALUES ('rebuild')",
+        *[statement for table, hour in ROLLUPS for statement in species_rollup_statements(table, hour)],
+        # covers the totals of /api/species/stats and the history of a species
+        '''CREATE INDEX IF NOT EXISTS "daily_species_Species_Id_Date"
+           ON "daily_species" ("Species_Id", "Date", "Count", "Max_Confidence")''',
+        # the writer gives the Species_Id of a known species: one trigger, its statements in this
+        # order, adds a new species, sets its Species_Id and counts the detection in the rollups
+        'DROP TRIGGER IF EXISTS detections_species',
+        'DROP TRIGGER IF EXISTS detections_species_id',
+        f'''CREATE TRIGGER IF NOT EXISTS detections_insert AFTER INSERT ON detections BEGIN
+            INSERT INTO species (Sci_Name, Com_Name) SELECT NEW.Sci_Name, NEW.Com_Name
+                WHERE NEW.Species_Id IS NULL AND NOT EXISTS (SELECT 1 FROM species WHERE Sci_Name = NEW.Sci_Name);
+            -- changes(): only for the species just added
+            INSERT INTO species_names (Species_Id, Lang, Name)
+                SELECT Species_Id, 'sci', Sci_Name FROM species WHERE changes() AND Sci_Name = NEW.Sci_Name
+                UNION ALL SELECT Species_Id, '', Com_Name FROM species WHERE changes() AND Sci_Name = NEW.Sci_Name;
+            INSERT INTO species_search (rowid, Name)
+                SELECT n.rowid, n.Name FROM species_names n JOIN species s ON s.Species_Id = n.Species_Id
+                WHERE changes() AND s.Sci_Name = NEW.Sci_Name;
+            UPDATE detections SET Species_Id = (SELECT Species_Id FROM species WHERE Sci_Name = NEW.Sci_Name)
+                WHERE NEW.Species_Id IS NULL AND ROWID = NEW.ROWID;{
+            ''.join(_rollup_upsert(table, hour) for table, hour in ROLLUPS)}
+        END''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(con):
+    return con.execute('PRAGMA user_version').fetchone()[0]
+
+
+def upgrade(con, target=LATEST_VERSION):
+    """Apply the migrations up to target; returns the versions applied."""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version > target or version <= get_version(con):
+            continue
+        log.info('Upgrading the database to version %d: %s', version, description)
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            # another process may have upgraded it in the meantime
+            if get_version(con) < version:
+                for statement in statements:
+                    con.execute(statement)
+                con.execute(f'PRAGMA user_version = {version}')
+            con.execute('COMMIT')
+        except sqlite3.Error:
+            con.execute('ROLLBACK')
+            raise
+        applied.append(version)
+    return applied
+
+
+def upgrade_db(db_path, target=LATEST_VERSION):
+    con = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    try:
+        return upgrade(con, target)
+    finally:
+        con.close()
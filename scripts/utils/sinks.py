@@ -0,0 +1,216 @@
+import logging
+import time
+
+from .classes import Detection, ParseFileName
+from .reporting import apprise, bird_weather, heartbeat, summary, update_json_file, write_to_db, write_to_file, publish_detections, \
+    publish_media_ready, api_publisher
+
+log = logging.getLogger(__name__)
+
+# a sink call taking longer than this is logged as slow
+SLOW_SINK_SECONDS = 2.0
+
+SINKS = []
+
+
+def register_sink(cls):
+    """Class decorator adding a sink to the ones the reporting pipeline feeds."""
+    SINKS.append(cls)
+    return cls
+
+
+class Sink:
+    """Receives the detections of every analyzed file.
+
+    on_detections() is called right after inference, before any clip exists, for the work the UI
+    is waiting on. on_file() is called once the clips and spectrograms have been extracted. Both
+    may buffer: flush() is called every flush_interval seconds (after every file when 0) and on
+    shutdown.
+    """
+
+    name = None
+    flush_interval = 0
+
+    def on_detections(self, file: ParseFileName, detections: [Detection]):
+        pass
+
+    def on_file(self, file: ParseFileName, detections: [Detection]):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class SinkStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def add(self, seconds, failed):
+        self.calls += 1
+        self.errors += int(failed)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+    def as_dict(self):
+        return {'calls': self.calls, 'errors': self.errors, 'total_seconds': round(self.total_seconds, 3),
+                'avg_seconds': round(self.total_seconds / self.calls, 3) if self.calls else 0.0,
+                'max_seconds': round(self.max_seconds, 3), 'last_seconds': round(self.last_seconds, 3)}
+
+
+class SinkManager:
+    """Feeds detections to the sinks, isolating their errors and timing every call."""
+
+    def __init__(self, sinks=None):
+        self.sinks = [cls() for cls in SINKS] if sinks is None else sinks
+        self.stats = {sink.name: SinkStats() for sink in self.sinks}
+        self._last_flush = {sink.name: time.monotonic() for sink in self.sinks}
+
+    def _call(self, sink, method, *args):
+        start = time.perf_counter()
+        failed = False
+        try:
+            getattr(sink, method)(*args)
+        except BaseException as e:
+            failed = True
+            log.exception('Error in %s sink (%s):', sink.name, method, exc_info=e)
+        elapsed = time.perf_counter() - start
+        self.stats[sink.name].add(elapsed, failed)
+        if elapsed > SLOW_SINK_SECONDS:
+            log.warning('%s sink is slow: %s took %.2fs', sink.name, method, elapsed)
+        return not failed
+
+    def _run_stage(self, method, file, detections, journal):
+        # a failed call counts as done, as it would without a restart
+        flushed = []
+        for sink in self.sinks:
+            # skip sinks that don't take part in this stage
+            if getattr(type(sink), method) is getattr(Sink, method):
+                continue
+            step = sink.name if method == 'on_file' else f'{sink.name}.{method}'
+            if journal is not None and journal.is_done(file, step):
+                log.info('%s already done for %s', step, file.file_name)
+                continue
+            self._call(sink, method, file, detections)
+            if journal is None or sink.flush_interval != 0:
+                continue
+            if type(sink).flush is Sink.flush:
+                # nothing to flush: journaled at once, so a crash in a later sink doesn't run it again
+                journal.steps_done(file, [step])
+            else:
+                flushed.append(step)
+        self.flush()
+        if flushed:
+            # only once the unbuffered sinks have flushed
+            journal.steps_done(file, flushed)
+
+    def on_detections(self, file: ParseFileName, detections: [Detection], journal=None):
+        self._run_stage('on_detections', file, detections, journal)
+
+    def on_file(self, file: ParseFileName, detections: [Detection], journal=None):
+        self._run_stage('on_file', file, detections, journal)
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        for sink in self.sinks:
+            if force or now - self._last_flush[sink.name] >= sink.flush_interval:
+                self._call(sink, 'flush')
+                self._last_flush[sink.name] = now
+
+    def close(self):
+        for sink in self.sinks:
+            self._call(sink, 'close')
+        log.info('sink timings: %s', self.get_stats())
+
+    def get_stats(self):
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+
+@register_sink
+class JsonSink(Sink):
+    name = 'json'
+
+    def on_detections(self, file, detections):
+        update_json_file(file, detections)
+
+
+@register_sink
+class BirdDBTextSink(Sink):
+    name = 'birddb_txt'
+
+    def __init__(self):
+        self.lines = []
+
+    def on_file(self, file, detections):
+        self.lines.extend(summary(file, detection) for detection in detections)
+
+    def flush(self):
+        if self.lines:
+            write_to_file(self.lines)
+            self.lines = []
+
+
+@register_sink
+class DatabaseSink(Sink):
+    name = 'db'
+
+    def on_detections(self, file, detections):
+        write_to_db(file, detections)
+
+
+@register_sink
+class EventSink(Sink):
+    """Publishes detections to the API's live feed as soon as they are in the database, and again once their media is ready."""
+
+    name = 'events'
+
+    def on_detections(self, file, detections):
+        publish_detections(file, detections)
+
+    def on_file(self, file, detections):
+        publish_media_ready(file, detections)
+
+    def close(self):
+        api_publisher.close()
+
+
+@register_sink
+class AppriseSink(Sink):
+    name = 'apprise'
+
+    def on_file(self, file, detections):
+        apprise(file, detections)
+
+
+@register_sink
+class BirdWeatherSink(Sink):
+    name = 'birdweather'
+
+    def on_file(self, file, detections):
+        bird_weather(file, detections)
+
+
+@register_sink
+class HeartbeatSink(Sink):
+    """Pings HEARTBEAT_URL at most once a minute while files are being analyzed."""
+
+    name = 'heartbeat'
+    flush_interval = 60
+
+    def __init__(self):
+        self.pending = False
+
+    def on_file(self, file, detections):
+        self.pending = True
+
+    def flush(self):
+        if self.pending:
+            heartbeat()
+            self.pending = False
@@ -0,0 +1,100 @@
+"""The species dimension: names in every language of the label files, label indexes, keys in detections.
+
+The species tables (schema version 5) start with the species already detected. load_labels()
+adds all the species of the models with their names in every model/l18n/labels_<lang>.json;
+a translation that is the same as the English name is left out. load_model_labels() records
+the label index of every species in the output of each model, and fill_species_ids() sets the
+Species_Id of the detections from before schema version 6.
+"""
+import glob
+import json
+import os
+import re
+
+_LANG_RE = re.compile(r'labels_(.+)\.json$')
+_MODEL_RE = re.compile(r'(.+)_Labels\.txt$')
+
+
+def read_labels(l18n_dir):
+    """{language: {Sci_Name: Com_Name}} of the label files in l18n_dir."""
+    labels = {}
+    for path in sorted(glob.glob(os.path.join(l18n_dir, 'labels_*.json'))):
+        with open(path) as f:
+            labels[_LANG_RE.search(path).group(1)] = json.load(f)
+    return labels
+
+
+def load_labels(con, l18n_dir, language='en'):
+    """Add the species and names of the label files, update changed names; returns the species added.
+
+    Com_Name of the species follows language, the DATABASE_LANG of the detections.
+    """
+    labels = read_labels(l18n_dir)
+    english = labels.get('en', {})
+    local = labels.get(language, english)
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        before = con.execute('SELECT COUNT(*) FROM species').fetchone()[0]
+        con.executemany('''INSERT INTO species (Sci_Name, Com_Name) VALUES (?, ?)
+                           ON CONFLICT (Sci_Name) DO UPDATE SET Com_Name = excluded.Com_Name
+                           WHERE Com_Name != excluded.Com_Name''',
+                        [(sci_name, local.get(sci_name, com_name)) for sci_name, com_name in english.items()])
+        species_ids = dict(con.execute('SELECT Sci_Name, Species_Id FROM species'))
+        names = [(species_ids[sci_name], 'sci', sci_name) for sci_name in english]
+        for lang, lang_names in labels.items():
+            names += [(species_ids[sci_name], lang, com_name) for sci_name, com_name in lang_names.items()
+                      if sci_name in species_ids and (lang == 'en' or com_name != english.get(sci_name))]
+        changes = con.total_changes
+        con.executemany('''INSERT INTO species_names (Species_Id, Lang, Name) VALUES (?, ?, ?)
+                           ON CONFLICT (Species_Id, Lang) DO UPDATE SET Name = excluded.Name
+                           WHERE Name != excluded.Name''', names)
+        if con.total_changes != changes:
+            # in one go, much faster than a row at a time
+            con.execute("INSERT INTO species_search (species_search) VALUES ('rebuild')")
+        con.execute('COMMIT')
+    except Exception:
+        con.execute('ROLLBACK')
+        raise
+    return len(species_ids) - before
+
+
+def load_model_labels(con, model_dir):
+    """Record the label index of each species for every model in model_dir; returns the number of models."""
+    models = {}
+    for path in sorted(glob.glob(os.path.join(model_dir, '*_Labels.txt'))):
+        with open(path) as f:
+            labels = [line.strip() for line in f if line.strip()]
+        # Sci_Name_Com_Name in the older label files
+        models[_MODEL_RE.search(os.path.basename(path)).group(1)] = [label.split('_')[0] for label in labels]
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        for model, labels in models.items():
+            con.executemany('INSERT INTO species (Sci_Name, Com_Name) VALUES (?, ?) ON CONFLICT (Sci_Name) DO NOTHING',
+                            [(sci_name, sci_name) for sci_name in labels])
+            con.execute('DELETE FROM species_labels WHERE Model = ?', [model])
+            con.executemany('''INSERT INTO species_labels (Model, Label_Index, Species_Id)
+                               SELECT ?, ?, Species_Id FROM species WHERE Sci_Name = ?''',
+                            [(model, index, sci_name) for index, sci_name in enumerate(labels)])
+        con.execute('COMMIT')
+    except Exception:
+        con.execute('ROLLBACK')
+        raise
+    return len(models)
+
+
+def fill_species_ids(con, batch_size=20000):
+    """Set the Species_Id of the detections without one, a transaction per batch; returns the rows set."""
+    last = con.execute('SELECT COALESCE(MAX(ROWID), 0) FROM detections').fetchone()[0]
+    total = 0
+    for start in range(0, last + 1, batch_size):
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            total += con.execute('''UPDATE detections
+                                    SET Species_Id = (SELECT Species_Id FROM species WHERE Sci_Name = detections.Sci_Name)
+                                    WHERE ROWID BETWEEN ? AND ? AND Species_Id IS NULL''',
+                                 [start, start + batch_size - 1]).rowcount
+            con.execute('COMMIT')
+        except Exception:
+            con.execute('ROLLBACK')
+            raise
+    return total
@@ -0,0 +1,72 @@
+import logging
+import os
+import re
+import shutil
+
+log = logging.getLogger(__name__)
+
+RAM_FS_TYPES = ('tmpfs', 'ramfs')
+
+
+def get_fs_type(path, mounts='/proc/mounts'):
+    """The file system type of the mount holding path, or None when it can't be found."""
+    path = os.path.realpath(path)
+    best, fs_type = '', None
+    try:
+        with open(mounts) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # spaces in mount points are escaped as \040
+                mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                inside = path == mount_point or path.startswith(os.path.join(mount_point, ''))
+                if inside and len(mount_point) > len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+class StagingRing:
+    """Keeps at most `segments` recordings waiting for analysis in StreamData.
+
+    StreamData is meant to be a tmpfs, so segments are recorded, analyzed and deleted without
+    touching the SD card. When the analysis falls behind, new segments are spilled to
+    RECS_DIR/Spill/<date>/ on persistent storage instead of filling up RAM, and analyzed from
+    there in turn. 0 segments means no limit.
+    """
+
+    def __init__(self, recs_dir, segments=0):
+        self.stream_dir = os.path.join(recs_dir, 'StreamData')
+        self.spill_dir = os.path.join(recs_dir, 'Spill')
+        self.segments = segments
+        self.spilling = False
+
+    def check_mount(self):
+        fs_type = get_fs_type(self.stream_dir)
+        if fs_type is not None and fs_type not in RAM_FS_TYPES:
+            log.warning('%s is on %s, not tmpfs: every segment is written to and read from disk', self.stream_dir, fs_type)
+        return fs_type
+
+    def is_staged(self, file_name):
+        return os.path.dirname(file_name) == self.stream_dir
+
+    def is_full(self, staged):
+        full = 0 < self.segments <= staged
+        if full != self.spilling:
+            if full:
+                log.warning('%d segments waiting in StreamData: spilling new ones to %s', staged, self.spill_dir)
+            else:
+                log.info('StreamData has room again')
+            self.spilling = full
+        return full
+
+    def spill(self, file_name):
+        name = os.path.basename(file_name)
+        match = re.search('^[0-9]+-[0-9]+-[0-9]+', name)
+        new_dir = os.path.join(self.spill_dir, match.group() if match else 'unknown')
+        os.makedirs(new_dir, exist_ok=True)
+        new_name = os.path.join(new_dir, name)
+        shutil.move(file_name, new_name)
+        return new_name
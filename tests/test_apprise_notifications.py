@@ -1,9 +1,10 @@
 import os
 import sqlite3
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import patch
 
+from scripts.utils import counters
 from scripts.utils import db
 from scripts.utils import notifications
 from scripts.utils.notifications import sendAppriseNotifications
@@ -15,6 +16,8 @@ class TestAppriseNotifications(unittest.TestCase):
 
     def setUp(self):
         db.DB_PATH = self.db_file
+        # each test creates its own test.db, don't read the one of the test before
+        db._DB = None
 
     @classmethod
     def setUpClass(cls):
@@ -188,6 +191,117 @@ class TestAppriseNotifications(unittest.TestCase):
         sendAppriseNotifications(**self.get_default_params())
         self.assertEqual(mock_notify.call_count, 1)
 
+    @patch('scripts.utils.helpers._load_settings')
+    @patch('scripts.utils.notifications.notify')
+    def test_dispatcher_coalesces(self, mock_notify, mock_load_settings):
+        self.create_test_db()
+        self.create_apprise_config()
+        settings_dict = Settings.with_defaults()
+        settings_dict["APPRISE_NOTIFY_EACH_DETECTION"] = "1"
+        settings_dict["APPRISE_COALESCE_SECONDS"] = "60"
+        mock_load_settings.return_value = settings_dict
+
+        dispatcher = notifications.NotificationDispatcher()
+        params = self.get_default_params()
+        dispatcher.submit(*params.values())
+        params.update(sci_name="Pica pica", com_name="Eurasian Magpie")
+        dispatcher.submit(*params.values())
+        # stop() flushes whatever is pending without waiting for the window to close
+        dispatcher.stop(timeout=5)
+
+        self.assertEqual(mock_notify.call_count, 1)
+        body, title, _ = mock_notify.call_args[0]
+        self.assertEqual(title, "2 species in the last minute")
+        self.assertIn("Great Crested Flycatcher", body)
+        self.assertIn("Eurasian Magpie", body)
+
+    @patch('scripts.utils.helpers._load_settings')
+    @patch('scripts.utils.notifications.notify')
+    def test_dispatcher_single(self, mock_notify, mock_load_settings):
+        self.create_test_db()
+        self.create_apprise_config()
+        settings_dict = Settings.with_defaults()
+        settings_dict["APPRISE_NOTIFY_EACH_DETECTION"] = "1"
+        mock_load_settings.return_value = settings_dict
+
+        dispatcher = notifications.NotificationDispatcher()
+        dispatcher.submit(*self.get_default_params().values())
+        dispatcher.stop(timeout=5)
+
+        self.assertEqual(mock_notify.call_count, 1)
+        self.assertEqual(
+            mock_notify.call_args[0][0],
+            "A Great Crested Flycatcher (Myiarchus crinitus) was just detected with a confidence of 91 (detection)"
+        )
+
+
+    @patch('scripts.utils.helpers._load_settings')
+    @patch('scripts.utils.notifications.notify')
+    def test_dispatcher_rules_use_the_counts_at_submit(self, mock_notify, mock_load_settings):
+        self.create_test_db()
+        self.create_apprise_config()
+        settings_dict = Settings.with_defaults()
+        settings_dict["APPRISE_NOTIFY_NEW_SPECIES_EACH_DAY"] = "1"
+        mock_load_settings.return_value = settings_dict
+
+        dispatcher = notifications.NotificationDispatcher()
+        dispatcher.submit(*self.get_default_params().values())
+        # a later detection, written before the dispatcher got to the first one
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("INSERT INTO detections(Sci_Name, Com_Name, Date) VALUES (?, ?, date('now', 'localtime'))",
+                     ["Myiarchus crinitus", "Great Crested Flycatcher"])
+        conn.commit()
+        conn.close()
+        dispatcher.stop(timeout=5)
+
+        self.assertEqual(mock_notify.call_count, 1)
+        self.assertIn("(first time today)", mock_notify.call_args[0][0])
+
+
+class TestSpeciesCounts(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = "test_counts.db"
+        con = sqlite3.connect(self.db_file)
+        con.execute("CREATE TABLE detections (Sci_Name text NOT NULL, Date date NOT NULL)")
+        today = datetime.now()
+        rows = [("Pica pica", today), ("Pica pica", today - timedelta(days=3)), ("Pica pica", today - timedelta(days=9)),
+                ("Myiarchus crinitus", today - timedelta(days=1))]
+        con.executemany("INSERT INTO detections VALUES (?, ?)", [(sci, day.strftime("%Y-%m-%d")) for sci, day in rows])
+        con.commit()
+        con.close()
+        db.DB_PATH = self.db_file
+        db._DB = None
+
+    def tearDown(self):
+        db._DB.close()
+        db._DB = None
+        os.remove(self.db_file)
+
+    def test_seed_and_add(self):
+        counts = counters.SpeciesCounts()
+        counts.seed()
+        self.assertEqual(counts.today("Pica pica"), db.get_todays_count_for("Pica pica"))
+        self.assertEqual(counts.this_week("Pica pica"), db.get_this_weeks_count_for("Pica pica"))
+        self.assertEqual(counts.today("Myiarchus crinitus"), 0)
+        self.assertEqual(counts.this_week("Myiarchus crinitus"), 1)
+
+        counts.add(datetime.now().strftime("%Y-%m-%d"), "Myiarchus crinitus")
+        self.assertEqual(counts.today("Myiarchus crinitus"), 1)
+        self.assertEqual(counts.this_week("Myiarchus crinitus"), 2)
+
+    def test_quoted_names(self):
+        # used to be pasted into the SQL
+        self.assertEqual(db.get_todays_count_for("O'Brien's Bird"), 0)
+
+
+class TestTemplate(unittest.TestCase):
+
+    def test_render(self):
+        template = notifications.Template('$comname at $time: $confidencepct% ($confidence) $unknown')
+        values = {'comname': 'Eurasian Magpie', 'time': '06:06:06', 'confidencepct': '91', 'confidence': '0.91'}
+        self.assertEqual(template.render(values), 'Eurasian Magpie at 06:06:06: 91% (0.91) $unknown')
+
 
 if __name__ == '__main__':
     unittest.main()
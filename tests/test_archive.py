@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+import pyarrow.parquet as pq
+
+from scripts.utils.archive import archive_month, first_open_month, months_to_archive
+from scripts.utils.schema import upgrade, verify_rollups
+from tests.test_schema import CREATE_SQL
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.tmp.name, 'detections_archive')
+        self.con = sqlite3.connect(os.path.join(self.tmp.name, 'birds.db'), isolation_level=None)
+        self.con.executescript(CREATE_SQL)
+        upgrade(self.con)
+        for day, time, com_name in [('2024-03-31', '23:59:00', 'Blue Jay'), ('2024-04-02', '06:00:00', 'Blue Jay'),
+                                    ('2024-04-01', '07:00:00', 'American Robin'), ('2024-05-01', '06:00:00', 'Blue Jay')]:
+            self.con.execute("INSERT INTO detections (Date, Time, Sci_Name, Com_Name, Confidence, Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name) "
+                             "VALUES (?, ?, 'Genus species', ?, 0.8, 50, 5, 0.7, 18, 1.25, 0.0, 'x.mp3')", [day, time, com_name])
+
+    def tearDown(self):
+        self.con.close()
+        self.tmp.cleanup()
+
+    def test_months_to_archive(self):
+        self.assertEqual(first_open_month(date(2024, 6, 15), 2), '2024-04')
+        self.assertEqual(first_open_month(date(2024, 1, 15), 1), '2023-12')
+        self.assertEqual(months_to_archive(self.con, 2, today=date(2024, 6, 15)), ['2024-03'])
+        self.assertEqual(months_to_archive(self.con, 1, today=date(2024, 6, 15)), ['2024-03', '2024-04'])
+
+    def test_archive_month(self):
+        self.assertEqual(archive_month(self.con, '2024-04', self.archive_dir), 2)
+
+        files = os.listdir(os.path.join(self.archive_dir, 'year=2024', 'month=04'))
+        self.assertEqual(files, ['part-2-3.parquet'])
+        table = pq.read_table(os.path.join(self.archive_dir, 'year=2024', 'month=04', files[0]))
+        # sorted by species
+        self.assertEqual(table.column('Com_Name').to_pylist(), ['American Robin', 'Blue Jay'])
+        self.assertEqual(table.column('Id').to_pylist(), [3, 2])
+
+        self.assertEqual(self.con.execute("SELECT Date FROM detections ORDER BY Date").fetchall(),
+                         [('2024-03-31',), ('2024-05-01',)])
+        self.assertEqual(self.con.execute("SELECT Month, Rows FROM archived_months").fetchall(), [('2024-04', 2)])
+        # the rollups keep the archived month
+        self.assertEqual(self.con.execute("SELECT Date, Sci_Name, Count FROM daily_species JOIN species USING (Species_Id) "
+                                          "WHERE Date LIKE '2024-04%' ORDER BY Date").fetchall(),
+                         [('2024-04-01', 'Genus species', 1), ('2024-04-02', 'Genus species', 1)])
+        self.assertEqual(verify_rollups(self.con), {'daily_species': [], 'hourly_species': []})
+
+        # nothing left to archive
+        self.assertEqual(archive_month(self.con, '2024-04', self.archive_dir), 0)
+
+    def test_failed_archive_keeps_the_detections(self):
+        # a file where the partition directory should be
+        os.makedirs(os.path.join(self.archive_dir, 'year=2024'))
+        open(os.path.join(self.archive_dir, 'year=2024', 'month=04'), 'w').close()
+        with self.assertRaises(OSError):
+            archive_month(self.con, '2024-04', self.archive_dir)
+        self.assertEqual(self.con.execute("SELECT COUNT(*) FROM detections").fetchone()[0], 4)
+        self.assertEqual(self.con.execute("SELECT COUNT(*) FROM archived_months").fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
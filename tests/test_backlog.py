@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from scripts.utils.helpers import BacklogScanner
+
+
+class TestBacklogScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.recs_dir = self.tmp.name
+        self.stream_dir = os.path.join(self.recs_dir, 'StreamData')
+        os.makedirs(self.stream_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def touch(self, *parts, age=60):
+        path = os.path.join(self.recs_dir, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'RIFF')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    @patch('scripts.utils.helpers.get_open_files_in_dir')
+    def test_sorted_by_timestamp(self, get_open_files):
+        get_open_files.return_value = set()
+        later = self.touch('StreamData', '2024-05-01-birdnet-06:15:03.wav')
+        rtsp = self.touch('StreamData', '2024-05-01-birdnet-RTSP_1-06:14:03.flac')
+        old = self.touch('May-2024', 'Tuesday', '2024-04-30-birdnet-23:59:00.wav')
+        self.touch('StreamData', 'analyzing_now.txt')
+
+        self.assertEqual(BacklogScanner(self.recs_dir).scan(), [old, rtsp, later])
+
+    @patch('scripts.utils.helpers.get_open_files_in_dir')
+    def test_open_segment_is_skipped_until_closed(self, get_open_files):
+        done = self.touch('StreamData', '2024-05-01-birdnet-06:15:03.wav')
+        writing = self.touch('StreamData', '2024-05-01-birdnet-06:15:18.wav', age=0)
+        get_open_files.return_value = {os.path.join(os.path.realpath(self.stream_dir), os.path.basename(writing))}
+
+        scanner = BacklogScanner(self.recs_dir)
+        self.assertEqual(scanner.scan(), [done])
+
+        # incremental: only what is new since the previous scan
+        get_open_files.return_value = set()
+        self.assertEqual(scanner.scan(), [writing])
+        self.assertEqual(scanner.scan(), [])
+
+    @patch('scripts.utils.helpers.get_open_files_in_dir')
+    def test_size_check_without_proc(self, get_open_files):
+        get_open_files.return_value = None
+        writing = self.touch('StreamData', '2024-05-01-birdnet-06:15:18.wav', age=0)
+
+        scanner = BacklogScanner(self.recs_dir)
+        self.assertEqual(scanner.scan(), [])
+        # unchanged since the previous scan
+        self.assertEqual(scanner.scan(), [writing])
+
+    @patch('scripts.utils.helpers.get_open_files_in_dir')
+    def test_removed_and_unreadable_directories(self, get_open_files):
+        get_open_files.return_value = set()
+        old = self.touch('May-2024', 'Tuesday', '2024-04-30-birdnet-23:59:00.wav')
+        scanner = BacklogScanner(self.recs_dir)
+        self.assertEqual(scanner.scan(), [old])
+
+        # removed by the cleanup between the listing and the stat
+        new_day = os.path.join(self.recs_dir, 'May-2024', 'Wednesday')
+        os.makedirs(new_day)
+        with patch('scripts.utils.helpers.os.stat', side_effect=OSError):
+            self.assertEqual(scanner.scan(), [])
+
+        shutil.rmtree(os.path.join(self.recs_dir, 'May-2024'))
+        self.assertEqual(scanner.scan(), [])
+        self.assertEqual(set(scanner._returned), {self.stream_dir})
+        self.assertEqual(set(scanner._dir_mtimes), {self.stream_dir})
+
+
+if __name__ == '__main__':
+    unittest.main()
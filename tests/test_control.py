@@ -0,0 +1,49 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from scripts.utils.control import ControlServer
+
+
+class TestControlServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'analysis.sock')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ask(self, *commands):
+        async def run():
+            server = ControlServer({'status': lambda: {'analyzing': None}}, path=self.path)
+            await server.start()
+            replies = []
+            try:
+                for command in commands:
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                    writer.write(command.encode() + b'\n')
+                    replies.append(json.loads(await reader.readline()))
+                    writer.close()
+            finally:
+                await server.stop()
+            return replies
+        return asyncio.run(run())
+
+    def test_status(self):
+        self.assertEqual(self.ask('status'), [{'analyzing': None}])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unknown_command(self):
+        reply, = self.ask('restart')
+        self.assertEqual(reply['commands'], ['status'])
+
+    def test_stale_socket(self):
+        open(self.path, 'w').close()
+        self.assertEqual(self.ask('status'), [{'analyzing': None}])
+
+
+if __name__ == '__main__':
+    unittest.main()
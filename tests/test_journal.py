@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+from scripts.utils.classes import Detection, ParseFileName
+from scripts.utils.journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'journal.jsonl')
+        self.file = ParseFileName('/tmp/StreamData/2024-02-24-birdnet-16:19:37.wav')
+        self.detections = [Detection(self.file.file_date, 3.0, 6.0, 'Pica pica', 'Eurasian Magpie', 0.912)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume_after_restart(self):
+        journal = Journal(self.path)
+        journal.analyzed(self.file, self.detections)
+        journal.steps_done(self.file, ['db'])
+
+        # a new process reads back what the previous one got through
+        journal = Journal(self.path)
+        unfinished = journal.unfinished()
+        self.assertEqual(len(unfinished), 1)
+        file, detections = unfinished[0]
+        self.assertEqual(file.file_name, self.file.file_name)
+        self.assertEqual(len(detections), 1)
+        self.assertEqual(detections[0].scientific_name, 'Pica pica')
+        self.assertEqual(detections[0].time, self.detections[0].time)
+        self.assertEqual(detections[0].confidence, 0.912)
+        self.assertTrue(journal.is_done(file, 'db'))
+        self.assertFalse(journal.is_done(file, 'apprise'))
+
+    def test_analyzed_again_keeps_the_steps_done(self):
+        journal = Journal(self.path)
+        journal.analyzed(self.file, self.detections)
+        journal.steps_done(self.file, ['db.on_detections'])
+        journal.analyzed(self.file, self.detections)
+
+        self.assertTrue(journal.is_done(self.file, 'db.on_detections'))
+        self.assertTrue(Journal(self.path).is_done(self.file, 'db.on_detections'))
+
+    def test_completed_files_are_dropped(self):
+        journal = Journal(self.path)
+        journal.analyzed(self.file, self.detections)
+        journal.completed(self.file)
+
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(Journal(self.path).unfinished(), [])
+
+    def test_damaged_record(self):
+        journal = Journal(self.path)
+        journal.analyzed(self.file, self.detections)
+        with open(self.path, 'a') as f:
+            f.write('{"op": "step", "fi')
+
+        self.assertEqual(len(Journal(self.path).unfinished()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
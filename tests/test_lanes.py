@@ -0,0 +1,40 @@
+import unittest
+
+from scripts.utils.lanes import LaneScheduler
+
+
+class TestLaneScheduler(unittest.TestCase):
+
+    def test_round_robin(self):
+        scheduler = LaneScheduler()
+        # a burst on stream 1 doesn't hold up stream 2 and the sound card
+        for second in range(3):
+            scheduler.put(f'/StreamData/2024-05-01-birdnet-RTSP_1-06:15:0{second}.wav')
+        scheduler.put('/StreamData/2024-05-01-birdnet-RTSP_2-06:15:05.wav')
+        scheduler.put('/StreamData/2024-05-01-birdnet-06:15:06.wav')
+
+        order = [scheduler.get(timeout=0) for _ in range(5)]
+        self.assertEqual(order, [
+            '/StreamData/2024-05-01-birdnet-RTSP_1-06:15:00.wav',
+            '/StreamData/2024-05-01-birdnet-RTSP_2-06:15:05.wav',
+            '/StreamData/2024-05-01-birdnet-06:15:06.wav',
+            '/StreamData/2024-05-01-birdnet-RTSP_1-06:15:01.wav',
+            '/StreamData/2024-05-01-birdnet-RTSP_1-06:15:02.wav',
+        ])
+        self.assertIsNone(scheduler.get(timeout=0))
+
+    def test_stats(self):
+        scheduler = LaneScheduler()
+        scheduler.put('/StreamData/2024-05-01-birdnet-RTSP_1-06:15:00.wav')
+        scheduler.put('/StreamData/2024-05-01-birdnet-RTSP_1-06:15:00.wav')
+        file_name = scheduler.get(timeout=0)
+        scheduler.done(file_name, 2.0)
+
+        stats = scheduler.get_stats()['RTSP_1-']
+        self.assertEqual(stats['processed'], 1)
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['seconds_per_file'], 2.0)
+        self.assertGreater(stats['lag'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
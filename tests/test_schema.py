@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from scripts.utils.reporting import INSERT_SQL
+from scripts.utils.schema import DETECTION_COLUMNS, LATEST_VERSION, get_version, rebuild_rollups, upgrade, upgrade_db, verify_rollups
+
+
+# as created by createdb.sh
+CREATE_SQL = """
+CREATE TABLE detections (
+  Date DATE, Time TIME, Sci_Name VARCHAR(100) NOT NULL, Com_Name VARCHAR(100) NOT NULL, Confidence FLOAT,
+  Lat FLOAT, Lon FLOAT, Cutoff FLOAT, Week INT, Sens FLOAT, Overlap FLOAT, File_Name VARCHAR(100) NOT NULL);
+CREATE INDEX "detections_Com_Name" ON "detections" ("Com_Name");
+CREATE INDEX "detections_Sci_Name" ON "detections" ("Sci_Name");
+CREATE INDEX "detections_Date_Time" ON "detections" ("Date" DESC, "Time" DESC);
+"""
+
+
+class TestSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'birds.db')
+        con = sqlite3.connect(self.db_path)
+        con.executescript(CREATE_SQL)
+        con.execute("INSERT INTO detections VALUES ('2024-05-01', '06:15:03', 'Cyanocitta cristata', 'Blue Jay', 0.85, "
+                    "50, 5, 0.7, 18, 1.25, 0.0, 'Blue_Jay-85-2024-05-01-birdnet-06:15:03.mp3')")
+        con.commit()
+        con.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_upgrade(self):
+        self.assertEqual(upgrade_db(self.db_path), list(range(1, LATEST_VERSION + 1)))
+        # nothing left to do
+        self.assertEqual(upgrade_db(self.db_path), [])
+
+        con = sqlite3.connect(self.db_path)
+        self.assertEqual(get_version(con), LATEST_VERSION)
+        # the writer names its 12 columns, the triggers set the species key
+        con.execute(f"INSERT INTO detections ({', '.join(DETECTION_COLUMNS)}) "
+                    "VALUES ('2024-05-01', '23:59:59', 'Cyanocitta cristata', 'Blue Jay', 0.9, "
+                    "50, 5, 0.7, 18, 1.25, 0.0, 'Blue_Jay-90-2024-05-01-birdnet-23:59:59.mp3')")
+        rows = con.execute('SELECT Hour, ts, Species_Id FROM detections ORDER BY ts').fetchall()
+        # the detections from before the upgrade get theirs from fill_species_ids
+        self.assertEqual(rows, [(6, 1714544103, None), (23, 1714607999, 1)])
+        plan = ' '.join(row[3] for row in con.execute(
+            'EXPLAIN QUERY PLAN SELECT Hour, COUNT(*) FROM detections WHERE Date = ? GROUP BY Hour', ['2024-05-01']))
+        self.assertIn('detections_Date_Hour', plan)
+        con.close()
+
+    def test_rollups(self):
+        upgrade_db(self.db_path)
+        con = sqlite3.connect(self.db_path)
+        insert = (f"INSERT INTO detections ({', '.join(DETECTION_COLUMNS)}) "
+                  "VALUES ('2024-05-01', ?, ?, ?, ?, 50, 5, 0.7, 18, 1.25, 0.0, 'x.mp3')")
+        con.execute(insert, ['06:40:00', 'Cyanocitta cristata', 'Blue Jay', 0.95])
+        con.execute(insert, ['07:05:00', 'Cyanocitta cristata', 'Blue Jay', 0.75])
+        con.execute(insert, ['07:10:00', 'Turdus migratorius', 'American Robin', 0.8])
+        # the backfill counted the detection from setUp
+        self.assertEqual(con.execute("SELECT Count, Max_Confidence, First_Time, Last_Time FROM daily_species "
+                                     "WHERE Species_Id = 1").fetchone(), (3, 0.95, '06:15:03', '07:05:00'))
+        self.assertEqual(con.execute("SELECT Hour, Count FROM hourly_species WHERE Species_Id = 1 "
+                                     "ORDER BY Hour").fetchall(), [(6, 2), (7, 1)])
+
+        # deleting the best detection brings back the next best
+        con.execute("DELETE FROM detections WHERE Confidence = 0.95")
+        self.assertEqual(con.execute("SELECT Count, Max_Confidence FROM daily_species "
+                                     "WHERE Species_Id = 1").fetchone(), (2, 0.85))
+        # as birdnet_changeidentification.sh does
+        con.execute("UPDATE detections SET Sci_Name = 'Turdus migratorius', Com_Name = 'American Robin' "
+                    "WHERE Time = '07:05:00'")
+        self.assertEqual(con.execute("SELECT Com_Name, Hour, Count FROM hourly_species JOIN species USING (Species_Id) "
+                                     "ORDER BY Com_Name, Hour").fetchall(),
+                         [('American Robin', 7, 2), ('Blue Jay', 6, 1)])
+        self.assertEqual(verify_rollups(con), {'daily_species': [], 'hourly_species': []})
+
+        con.execute("DELETE FROM detections")
+        self.assertEqual(con.execute("SELECT COUNT(*) FROM daily_species").fetchone()[0], 0)
+        self.assertEqual(con.execute("SELECT COUNT(*) FROM hourly_species").fetchone()[0], 0)
+        con.close()
+
+    def test_rollups_by_species_key(self):
+        upgrade_db(self.db_path, target=6)
+        con = sqlite3.connect(self.db_path, isolation_level=None)
+        # an archived month: its species is only in the rollups, recorded under two names
+        con.executemany("INSERT INTO daily_species (Date, Sci_Name, Com_Name, Count, Max_Confidence, First_Time, Last_Time) "
+                        "VALUES ('2024-03-01', 'Strix varia', ?, ?, ?, '05:00:00', '05:30:00')",
+                        [('Barred Owl', 2, 0.9), ('Chouette rayée', 1, 0.95)])
+        con.execute("INSERT INTO archived_months (Month, Rows) VALUES ('2024-03', 3)")
+        upgrade(con)
+        self.assertEqual(con.execute("SELECT Date, Sci_Name, Count, Max_Confidence FROM daily_species "
+                                     "JOIN species USING (Species_Id) ORDER BY Date").fetchall(),
+                         [('2024-03-01', 'Strix varia', 3, 0.95), ('2024-05-01', 'Cyanocitta cristata', 1, 0.85)])
+        self.assertEqual(con.execute("SELECT Name FROM species_names JOIN species USING (Species_Id) "
+                                     "WHERE Sci_Name = 'Strix varia' ORDER BY Lang").fetchall()[1:], [('Strix varia',)])
+
+        # the writer gives the key of a known species, the trigger adds a new one
+        con.execute(INSERT_SQL, ['2024-05-01', '07:00:00', 'Cyanocitta cristata', 'Blue Jay', 0.9, 50, 5, 0.7, 18, 1.25, 0.0,
+                                 'a.mp3', 'Cyanocitta cristata'])
+        con.execute(INSERT_SQL, ['2024-05-01', '07:30:00', 'Sitta carolinensis', 'White-breasted Nuthatch', 0.8, 50, 5,
+                                 0.7, 18, 1.25, 0.0, 'b.mp3', 'Sitta carolinensis'])
+        self.assertEqual(con.execute("SELECT Sci_Name, Species_Id FROM detections WHERE Time >= '07:00:00'").fetchall(),
+                         [('Cyanocitta cristata', 1), ('Sitta carolinensis', 3)])
+        self.assertEqual(con.execute("SELECT Species_Id, Count FROM daily_species WHERE Date = '2024-05-01'").fetchall(),
+                         [(1, 2), (3, 1)])
+        self.assertEqual(verify_rollups(con), {'daily_species': [], 'hourly_species': []})
+        con.close()
+
+    def test_rebuild_rollups(self):
+        upgrade_db(self.db_path)
+        con = sqlite3.connect(self.db_path)
+        con.execute("UPDATE daily_species SET Count = 7")
+        self.assertEqual(len(verify_rollups(con)['daily_species']), 2)
+        rebuild_rollups(con)
+        self.assertEqual(verify_rollups(con), {'daily_species': [], 'hourly_species': []})
+        con.close()
+
+    def test_failed_upgrade_is_rolled_back(self):
+        con = sqlite3.connect(self.db_path, isolation_level=None)
+        con.execute('CREATE INDEX "detections_ts" ON "detections" ("Date")')
+        con.execute('ALTER TABLE detections ADD COLUMN Hour INTEGER')
+        with self.assertRaises(sqlite3.OperationalError):
+            upgrade(con)
+        self.assertEqual(get_version(con), 0)
+        columns = [row[1] for row in con.execute('PRAGMA table_xinfo(detections)')]
+        self.assertNotIn('ts', columns)
+        con.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
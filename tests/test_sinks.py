@@ -0,0 +1,190 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import requests
+
+from scripts.utils.reporting import ApiPublisher, publish_detections
+from scripts.utils.sinks import Sink, SinkManager, BirdDBTextSink
+
+
+class RecordingSink(Sink):
+    name = 'recording'
+
+    def __init__(self):
+        self.files = []
+        self.flushes = 0
+
+    def on_file(self, file, detections):
+        self.files.append((file, detections))
+
+    def flush(self):
+        self.flushes += 1
+
+
+class FailingSink(Sink):
+    name = 'failing'
+
+    def on_file(self, file, detections):
+        raise RuntimeError('backend down')
+
+
+class TestSinkManager(unittest.TestCase):
+
+    def test_errors_are_isolated(self):
+        recording = RecordingSink()
+        sinks = SinkManager([FailingSink(), recording])
+        sinks.on_file('file', ['detection'])
+
+        self.assertEqual(recording.files, [('file', ['detection'])])
+        stats = sinks.get_stats()
+        self.assertEqual(stats['failing']['errors'], 1)
+        self.assertEqual(stats['recording']['errors'], 0)
+        # on_file + flush
+        self.assertEqual(stats['recording']['calls'], 2)
+
+    def test_flush_interval(self):
+        recording = RecordingSink()
+        recording.flush_interval = 60
+        sinks = SinkManager([recording])
+        sinks.on_file('file', [])
+        sinks.on_file('file', [])
+        self.assertEqual(recording.flushes, 0)
+
+        sinks.close()
+        self.assertEqual(recording.flushes, 1)
+
+    def test_stages(self):
+        calls = []
+
+        class EarlySink(Sink):
+            name = 'early'
+
+            def on_detections(self, file, detections):
+                calls.append('early.on_detections')
+
+            def on_file(self, file, detections):
+                calls.append('early.on_file')
+
+        class LateSink(Sink):
+            name = 'late'
+
+            def on_file(self, file, detections):
+                calls.append('late.on_file')
+
+        class DoneJournal:
+            def __init__(self):
+                self.steps = []
+
+            def is_done(self, file, step):
+                return step == 'early.on_detections'
+
+            def steps_done(self, file, steps):
+                self.steps.append(steps)
+
+        journal = DoneJournal()
+        file = SimpleNamespace(file_name='file')
+        sinks = SinkManager([EarlySink(), LateSink()])
+        sinks.on_detections(file, [], journal)
+        sinks.on_file(file, [], journal)
+
+        # the early stage was journaled before a restart; late-only sinks don't take part in it
+        self.assertEqual(calls, ['early.on_file', 'late.on_file'])
+        self.assertEqual(journal.steps, [['early'], ['late']])
+
+    def test_steps_are_journaled_as_they_complete(self):
+        steps = []
+        journaled = {}
+
+        class DbSink(Sink):
+            name = 'db'
+
+            def on_detections(self, file, detections):
+                pass
+
+        class TextSink(BirdDBTextSink):
+            def on_detections(self, file, detections):
+                self.lines.append('line')
+
+        class LaterSink(Sink):
+            name = 'later'
+
+            def on_detections(self, file, detections):
+                # what a crash at this point would resume from
+                journaled['later'] = list(steps)
+
+        class Journal:
+            def is_done(self, file, step):
+                return False
+
+            def steps_done(self, file, done):
+                steps.extend(done)
+
+        with patch('scripts.utils.sinks.write_to_file') as mock_write_to_file:
+            SinkManager([DbSink(), TextSink(), LaterSink()]).on_detections(SimpleNamespace(file_name='file'), [], Journal())
+
+        # the rows are committed, a restart doesn't insert them again; the buffered lines aren't written yet
+        self.assertEqual(journaled['later'], ['db.on_detections'])
+        self.assertEqual(steps, ['db.on_detections', 'later.on_detections', 'birddb_txt.on_detections'])
+        mock_write_to_file.assert_called_once_with(['line'])
+
+    @patch('scripts.utils.sinks.write_to_file')
+    @patch('scripts.utils.sinks.summary')
+    def test_text_sink_batches(self, mock_summary, mock_write_to_file):
+        mock_summary.side_effect = lambda file, detection: detection
+        sinks = SinkManager([BirdDBTextSink()])
+        sinks.on_file('file', ['line 1', 'line 2'])
+
+        mock_write_to_file.assert_called_once_with(['line 1', 'line 2'])
+
+
+@patch('scripts.utils.reporting.get_settings', return_value={'FIELD_STATION_API_URL': 'http://api'})
+class TestApiPublisher(unittest.TestCase):
+
+    def test_posts_in_the_background(self, mock_settings):
+        publisher = ApiPublisher()
+        publisher._session = Mock()
+        publisher.post('/api/detections/notify', {'id': 1})
+        publisher.post('/api/detections/notify', {'id': 2})
+        publisher.close()
+
+        self.assertEqual([call.kwargs['json'] for call in publisher._session.post.call_args_list], [{'id': 1}, {'id': 2}])
+        self.assertEqual(publisher.sent, 2)
+
+    def test_backs_off_after_a_failure(self, mock_settings):
+        publisher = ApiPublisher()
+        publisher._session = Mock()
+        publisher._session.post.side_effect = requests.ConnectionError('refused')
+        for i in range(3):
+            publisher.post('/api/detections/notify', {'id': i})
+        publisher.close()
+        # dropped without a POST while backing off, and not even queued once the failure is known
+        publisher.post('/api/detections/notify', {'id': 3})
+
+        self.assertEqual(publisher._session.post.call_count, 1)
+        self.assertEqual((publisher.failed, publisher.dropped), (1, 3))
+
+    def test_full_queue_drops_events(self, mock_settings):
+        publisher = ApiPublisher(queue_size=1)
+        publisher._thread = Mock()
+        publisher.post('/api/detections/notify', {'id': 1})
+        publisher.post('/api/detections/notify', {'id': 2})
+        self.assertEqual(publisher.dropped, 1)
+
+
+
+class TestPublishDetections(unittest.TestCase):
+
+    @patch('scripts.utils.reporting.post_to_api')
+    def test_only_detections_with_a_row_id(self, mock_post_to_api):
+        inserted = SimpleNamespace(row_id=7, common_name='Blue Jay', scientific_name='Cyanocitta cristata', confidence=0.9,
+                                   date='2024-05-01', time='06:15:03', iso8601='2024-05-01T06:15:03', file_name_extr='x.mp3')
+        # inserted before a restart, or the insert failed
+        not_inserted = SimpleNamespace(**{**vars(inserted), 'row_id': None})
+        publish_detections('file', [not_inserted, inserted])
+
+        mock_post_to_api.assert_called_once()
+        self.assertEqual(mock_post_to_api.call_args[0][1]['id'], 7)
+
+if __name__ == '__main__':
+    unittest.main()
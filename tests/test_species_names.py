@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from scripts.utils.schema import upgrade
+from scripts.utils.species_names import fill_species_ids, load_labels, load_model_labels
+from tests.test_schema import CREATE_SQL
+
+LABELS = {
+    'en': {'Cyanocitta cristata': 'Blue Jay', 'Turdus migratorius': 'American Robin'},
+    'fr': {'Cyanocitta cristata': 'Geai bleu', 'Turdus migratorius': 'Merle d\'Amérique'},
+    # untranslated
+    'nl': {'Cyanocitta cristata': 'Blue Jay', 'Turdus migratorius': 'Roodborstlijster'},
+}
+
+
+class TestSpeciesNames(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.l18n_dir = self.tmp.name
+        for lang, names in LABELS.items():
+            with open(os.path.join(self.l18n_dir, f'labels_{lang}.json'), 'w') as f:
+                json.dump(names, f)
+        self.con = sqlite3.connect(':memory:', isolation_level=None)
+        self.con.executescript(CREATE_SQL)
+        self.insert('Cyanocitta cristata', 'Geai bleu')
+        upgrade(self.con)
+
+    def tearDown(self):
+        self.con.close()
+        self.tmp.cleanup()
+
+    def insert(self, sci_name, com_name):
+        self.con.execute("INSERT INTO detections (Date, Time, Sci_Name, Com_Name, Confidence, Lat, Lon, Cutoff, Week, Sens, Overlap, File_Name) "
+                         "VALUES ('2024-05-01', '06:00:00', ?, ?, 0.8, 50, 5, 0.7, 18, 1.25, 0.0, 'x.mp3')", [sci_name, com_name])
+
+    def search(self, text):
+        return sorted(self.con.execute('SELECT n.Lang, n.Name FROM species_search f JOIN species_names n '
+                                       'ON n.rowid = f.rowid WHERE f.Name LIKE ?', [f'%{text}%']).fetchall())
+
+    def test_upgrade_adds_the_detected_species(self):
+        self.assertEqual(self.con.execute('SELECT Sci_Name, Com_Name FROM species').fetchall(),
+                         [('Cyanocitta cristata', 'Geai bleu')])
+        self.assertEqual(self.search('bleu'), [('', 'Geai bleu')])
+
+    def test_load_labels(self):
+        self.assertEqual(load_labels(self.con, self.l18n_dir, 'fr'), 1)
+        self.assertEqual(self.con.execute('SELECT Sci_Name, Com_Name FROM species ORDER BY Species_Id').fetchall(),
+                         [('Cyanocitta cristata', 'Geai bleu'), ('Turdus migratorius', "Merle d'Amérique")])
+        self.assertEqual(self.search('ROBIN'), [('en', 'American Robin')])
+        self.assertEqual(self.search('lijst'), [('nl', 'Roodborstlijster')])
+        self.assertEqual(self.search('turdus'), [('sci', 'Turdus migratorius')])
+        # the untranslated Dutch name is left out
+        self.assertEqual(self.search('blue jay'), [('en', 'Blue Jay')])
+
+        # a changed translation replaces the old one
+        labels_fr = dict(LABELS['fr'], **{'Turdus migratorius': 'Merle migrateur'})
+        with open(os.path.join(self.l18n_dir, 'labels_fr.json'), 'w') as f:
+            json.dump(labels_fr, f)
+        self.assertEqual(load_labels(self.con, self.l18n_dir, 'fr'), 0)
+        self.assertEqual(self.search('merle'), [('fr', 'Merle migrateur')])
+
+    def test_new_species_are_searchable(self):
+        load_labels(self.con, self.l18n_dir)
+        self.insert('Strix varia', 'Barred Owl')
+        self.insert('Strix varia', 'Barred Owl')
+        self.assertEqual(self.search('owl'), [('', 'Barred Owl')])
+        self.assertEqual(self.search('strix'), [('sci', 'Strix varia')])
+
+        self.assertEqual(self.con.execute("SELECT DISTINCT Species_Id FROM detections WHERE Sci_Name = 'Strix varia'").fetchall(),
+                         [(3,)])
+
+    def test_fill_species_ids(self):
+        changes = self.con.execute('SELECT COUNT(*) FROM detections_changes').fetchone()[0]
+        self.assertEqual(fill_species_ids(self.con, batch_size=1), 1)
+        self.assertEqual(fill_species_ids(self.con), 0)
+        self.assertEqual(self.con.execute('SELECT Species_Id FROM detections').fetchall(), [(1,)])
+        # not a change for the change feed or the rollups
+        self.assertEqual(self.con.execute('SELECT COUNT(*) FROM detections_changes').fetchone()[0], changes)
+        self.assertEqual(self.con.execute('SELECT Count FROM daily_species').fetchall(), [(1,)])
+
+        # the names follow the language of the labels loaded last
+        load_labels(self.con, self.l18n_dir, 'en')
+        self.assertEqual(self.con.execute('SELECT Sci_Name, Com_Name FROM species_detections').fetchall(),
+                         [('Cyanocitta cristata', 'Blue Jay')])
+        self.assertEqual(self.con.execute('SELECT Com_Name FROM detections').fetchall(), [('Geai bleu',)])
+
+    def test_load_model_labels(self):
+        with open(os.path.join(self.tmp.name, 'BirdNET_GLOBAL_6K_V2.4_Labels.txt'), 'w') as f:
+            f.write('Turdus migratorius_American Robin\nCyanocitta cristata_Blue Jay\n')
+        self.assertEqual(load_model_labels(self.con, self.tmp.name), 1)
+        self.assertEqual(self.con.execute('SELECT l.Model, l.Label_Index, s.Sci_Name FROM species_labels l '
+                                          'JOIN species s USING (Species_Id) ORDER BY Label_Index').fetchall(),
+                         [('BirdNET_GLOBAL_6K_V2.4', 0, 'Turdus migratorius'),
+                          ('BirdNET_GLOBAL_6K_V2.4', 1, 'Cyanocitta cristata')])
+
+
+if __name__ == '__main__':
+    unittest.main()
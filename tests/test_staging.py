@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from scripts.utils.staging import StagingRing, get_fs_type
+
+
+class TestStagingRing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.recs_dir = self.tmp.name
+        os.makedirs(os.path.join(self.recs_dir, 'StreamData'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_full(self):
+        ring = StagingRing(self.recs_dir, segments=2)
+        self.assertFalse(ring.is_full(1))
+        self.assertTrue(ring.is_full(2))
+        self.assertTrue(ring.spilling)
+        self.assertFalse(ring.is_full(0))
+        self.assertFalse(ring.spilling)
+        # no limit
+        self.assertFalse(StagingRing(self.recs_dir).is_full(1000))
+
+    def test_spill(self):
+        ring = StagingRing(self.recs_dir, segments=1)
+        file_name = os.path.join(ring.stream_dir, '2024-05-01-birdnet-RTSP_1-06:15:00.wav')
+        with open(file_name, 'wb') as f:
+            f.write(b'RIFF')
+        self.assertTrue(ring.is_staged(file_name))
+
+        new_name = ring.spill(file_name)
+        self.assertEqual(new_name, os.path.join(self.recs_dir, 'Spill', '2024-05-01', '2024-05-01-birdnet-RTSP_1-06:15:00.wav'))
+        self.assertFalse(ring.is_staged(new_name))
+        self.assertFalse(os.path.exists(file_name))
+        self.assertTrue(os.path.exists(new_name))
+
+    def test_fs_type(self):
+        mounts = os.path.join(self.recs_dir, 'mounts')
+        with open(mounts, 'w') as f:
+            f.write('/dev/root / ext4 rw 0 0\n')
+            f.write(f'tmpfs {os.path.realpath(self.recs_dir)}/Stream\\040Data tmpfs rw 0 0\n')
+        self.assertEqual(get_fs_type(os.path.join(self.recs_dir, 'Stream Data', 'x.wav'), mounts), 'tmpfs')
+        self.assertEqual(get_fs_type(os.path.join(self.recs_dir, 'StreamData'), mounts), 'ext4')
+
+
+if __name__ == '__main__':
+    unittest.main()